@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+#
+# Drives velo_prov.vco_async.AsyncVcoClient against a local fake VCO (velo_prov.fake_vco)
+#
+# Provisions N edges concurrently, reconfigures their deviceSettings and checks
+# that the fake orchestrator saw exactly what the client was asked to do.
+#   python3 bench/async_vco_harness.py -n 500 -c 100
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from velo_prov.fake_vco import FakeVco
+from velo_prov.vco_async import AsyncVcoClient, provision_edges
+
+
+def _mark_configured(data):
+    data['lan']['networks'][0]['dhcp']['enabled'] = False
+    return data
+
+
+async def run(vco_url, count, concurrency):
+    async with AsyncVcoClient(vco_url, 'Token fake', concurrency=concurrency) as client:
+        eid = (await client.get_enterprise())['id']
+        pid = (await client.clone_enterprise_template(eid, 'AWS-PROFILE'))['id']
+        names = ['AWS-VCE-%04d' % n for n in range(count)]
+        return await provision_edges(client, eid, pid, names, {}, _mark_configured)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--edges", type=int, default=200)
+    parser.add_argument("-c", "--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    with FakeVco() as fake:
+        start = time.monotonic()
+        results = asyncio.run(run(fake.url, args.edges, args.concurrency))
+        elapsed = time.monotonic() - start
+        failed = [r for r in results if 'error' in r]
+        assert not failed, failed[:5]
+        assert len(fake.state.edges) == args.edges
+        assert fake.state.calls['edge/edgeProvision'] == args.edges
+        assert fake.state.calls['configuration/updateConfigurationModule'] == args.edges
+        for r in results:
+            assert fake.state.modules[r['module_id']]['data']['lan']['networks'][0]['dhcp']['enabled'] is False
+    print('%d edges provisioned and configured in %.2fs (%.0f edges/min) at concurrency %d'
+          % (args.edges, elapsed, args.edges / elapsed * 60, args.concurrency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+#
+# VCO side of a fleet rollout: per-edge calls against bulk calls
+#
+# Provisions --edges edges on the local fake VCO (VCO steps only) three ways and
+# reports the time, edges per minute and http requests the VCO received:
+#   per-edge   fleet mode, three calls per edge on -c workers
+#   batch      bulk mode, JSON-RPC batches of --batch-size calls
+#   fallback   bulk mode against a VCO refusing batches, which falls back to
+#              per-edge chains on the shared session
+#   python3 bench/bench_bulk.py --edges 500 -c 16 --vco-latency 0.05
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from velo_prov import config, provision, vco
+from velo_prov.fake_vco import FakeVco
+from velo_prov.vco_bulk import BulkVco
+from velo_prov.vco_cache import VcoMetadataCache
+
+SCENARIOS = ('per-edge', 'batch', 'fallback')
+
+
+def run(args, tmp, scenario):
+    with FakeVco(latency=args.vco_latency, batch=scenario != 'fallback') as fake:
+        os.environ.update({'VCO_TOKEN': 'bench', 'VCO_HOSTNAME': 'fake-vco', 'VCO_URL': fake.url})
+        config.reset()
+        vco.set_metadata_cache(VcoMetadataCache('fake-vco', 'bench', path=os.path.join(tmp, 'cache.json'), ttl=0))
+        inventory = os.path.join(tmp, scenario + '.csv')
+        with open(inventory, 'w') as f:
+            f.write('name\n' + '\n'.join('BULK-%04d' % n for n in range(args.edges)) + '\n')
+        bulk = BulkVco(batch_size=args.batch_size, workers=args.concurrency) if scenario != 'per-edge' else None
+        start = time.monotonic()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = provision.run_fleet_mode(inventory, args.concurrency, False, shared=True, bulk=bulk)
+        elapsed = time.monotonic() - start
+        failed = sum(1 for r in results if r['status'] != 'ok')
+        return {'scenario': scenario, 'seconds': elapsed, 'failed': failed,
+                'edges_per_min': (args.edges - failed) / elapsed * 60, 'requests': fake.state.requests,
+                'edges_on_vco': len(fake.state.edges)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--edges", type=int, default=500)
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--vco-latency", type=float, default=0.05, help="seconds per VCO http request")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='velo-bench-')
+    results = [run(args, tmp, scenario) for scenario in SCENARIOS]
+
+    print('%-10s %9s %7s %12s %9s %9s' % ('SCENARIO', 'SECONDS', 'FAILED', 'EDGES/MIN', 'REQUESTS', 'REQ/EDGE'))
+    for r in results:
+        print('%-10s %9.2f %7d %12.1f %9d %9.2f' % (r['scenario'], r['seconds'], r['failed'], r['edges_per_min'],
+                                                   r['requests'], float(r['requests']) / args.edges))
+        if r['edges_on_vco'] != args.edges:
+            print('  %s left %d edges on the VCO, expected %d' % (r['scenario'], r['edges_on_vco'], args.edges))
+
+
+if __name__ == "__main__":
+    main()
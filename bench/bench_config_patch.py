@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+#
+# Payload size and latency of the deviceSettings update, full round-trip vs patch engine
+#
+# The fixture is a fake_vco deviceSettings module grown to the size of a busy
+# production edge (extra VLANs, static routes, subinterfaces). With --live the
+# updates are also sent to a local fake VCO through vco_client.VcoClient.
+#   python3 bench/bench_config_patch.py --vlans 64 --routes 500 --live
+
+import argparse
+import json
+import os
+import sys
+import time
+from copy import deepcopy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from velo_prov import config_patch
+from velo_prov.fake_vco import device_settings_data
+
+
+def realistic_device_settings(vlans, routes):
+    data = device_settings_data()
+    base = data['lan']['networks'][0]
+    for n in range(2, vlans + 1):
+        net = deepcopy(base)
+        net.update({'name': 'VLAN-%d' % n, 'vlanId': n, 'cidrIp': '10.%d.%d.1' % (n // 256, n % 256)})
+        data['lan']['networks'].append(net)
+    data['segments'] = [{'segment': {'segmentId': 0, 'name': 'Global Segment'},
+                         'routes': {'static': [{'destination': '172.%d.%d.0' % (16 + r // 256, r % 256),
+                                                'netmask': '255.255.255.0', 'gateway': '10.0.1.254',
+                                                'cost': 0, 'preferred': True, 'advertise': False,
+                                                'wanInterface': 'GE3', 'description': 'route %d' % r}
+                                               for r in range(routes)]}}]
+    for iface in data['routedInterfaces']:
+        iface['subinterfaces'] = [{'subinterfaceId': s, 'vlanId': 100 + s, 'addressing': {'type': 'STATIC'}}
+                                  for s in range(8)]
+    return data
+
+
+def legacy_transform(data):
+    # the edits change_edge_config makes, as they were before the patch engine
+    net = data['lan']['networks'][0]
+    net.update({'cidrIp': '127.0.0.10', 'advertise': False, 'cidrPrefix': '30', 'netmask': '255.255.255.252'})
+    net['dhcp']['enabled'] = False
+    routed = data['routedInterfaces']
+    for iface in routed:
+        if iface['name'] == 'GE3':
+            iface.update({'override': True, 'advertise': True, 'natDirect': False, 'wanOverlay': 'DISABLED'})
+    routed.insert(0, deepcopy(routed[0]))
+    routed.insert(1, deepcopy(routed[1]))
+    routed[0]['name'], routed[1]['name'] = 'GE1', 'GE2'
+    routed[1].update({'override': True, 'advertise': False, 'natDirect': True, 'wanOverlay': 'AUTO_DISCOVERED'})
+    data['routedInterfaces'] = deepcopy(routed)
+    return data
+
+
+def timed(fn, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        out = fn()
+    return (time.perf_counter() - start) / rounds * 1000, out
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--vlans", type=int, default=32)
+    parser.add_argument("--routes", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=200)
+    parser.add_argument("--live", action='store_true', help="also time the update against a local fake VCO")
+    args = parser.parse_args()
+
+    current = realistic_device_settings(args.vlans, args.routes)
+    desired = legacy_transform(deepcopy(current))
+    module = {"id": 1, "name": "deviceSettings", "data": desired, "version": "1"}
+
+    old_params = {"id": 1, "returnData": 'true', "_update": {"data": desired}, "name": "deviceSettings"}
+    old_ms, old_body = timed(lambda: json.dumps(old_params), args.rounds)
+    new_ms, (new_params, ops) = timed(lambda: config_patch.module_update_params(1, current, desired), args.rounds)
+    enc_ms, new_body = timed(lambda: json.dumps(new_params, separators=config_patch.COMPACT), args.rounds)
+    noop_ms, (noop_params, _) = timed(lambda: config_patch.module_update_params(1, desired, desired), args.rounds)
+    old_resp = len(json.dumps(module))
+    new_resp = len(json.dumps({"id": 1, "rows": 1}))
+
+    print('fixture: %d vlans, %d static routes, %d ops in diff' % (args.vlans, args.routes, len(ops)))
+    print('%-22s %12s %12s %12s' % ('', 'request B', 'response B', 'cpu ms'))
+    print('%-22s %12d %12d %12.3f' % ('full round-trip', len(old_body), old_resp, old_ms))
+    print('%-22s %12d %12d %12.3f' % ('patch, changed', len(new_body), new_resp, new_ms + enc_ms))
+    print('%-22s %12d %12d %12.3f' % ('patch, unchanged', 0 if noop_params is None else -1, 0, noop_ms))
+
+    if args.live:
+        from velo_prov.fake_vco import FakeVco
+        from velo_prov.vco_client import VcoClient
+        with FakeVco() as fake:
+            vco = VcoClient('Token bench')
+            mid = fake.state._module('deviceSettings', current)['id']
+            old_params['id'] = new_params['id'] = mid
+            for label, params in (('full round-trip', old_params), ('patch, changed', new_params)):
+                ms, _ = timed(lambda: vco.post(fake.url + 'configuration/updateConfigurationModule', params).json(),
+                              max(args.rounds // 10, 5))
+                print('%-22s %10.2f ms per update against fake VCO' % (label, ms))
+            vco.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+#
+# Micro-benchmark: hardcoded GE1/GE2/GE3 edits vs the compiled iface_map transform
+#
+# Applies both to the deviceSettings of N edges for edge models with a growing
+# number of routed interfaces and reports the time per edge.
+#   python3 bench/bench_iface_map.py --edges 500 --interfaces 4 16 64
+
+import argparse
+import os
+import sys
+import time
+from copy import deepcopy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from velo_prov import iface_map
+from bench_config_patch import legacy_transform
+from velo_prov.fake_vco import _interface, device_settings_data
+
+
+def device_settings(interfaces):
+    data = device_settings_data()
+    data['routedInterfaces'] = [_interface('GE%d' % n) for n in range(3, 3 + interfaces)]
+    return data
+
+
+def run(fn, fixtures):
+    start = time.perf_counter()
+    for data in fixtures:
+        fn(data)
+    return (time.perf_counter() - start) / len(fixtures) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--edges", type=int, default=500)
+    parser.add_argument("--interfaces", type=int, nargs='+', default=[4, 16, 64])
+    args = parser.parse_args()
+
+    transform = iface_map.transform_for_instance('c4.xlarge')
+    print('%-12s %14s %14s %9s' % ('interfaces', 'legacy us/edge', 'compiled us/edge', 'speedup'))
+    for count in args.interfaces:
+        base = device_settings(count)
+        # fixtures are copied up front so only the transforms are timed
+        legacy_in = [deepcopy(base) for _ in range(args.edges)]
+        compiled_in = [deepcopy(base) for _ in range(args.edges)]
+        legacy_us = run(legacy_transform, legacy_in)
+        compiled_us = run(transform.apply, compiled_in)
+        assert legacy_in[0] == compiled_in[0]
+        print('%-12d %14.1f %16.1f %8.1fx' % (count, legacy_us, compiled_us, legacy_us / compiled_us))
+
+
+if __name__ == "__main__":
+    main()
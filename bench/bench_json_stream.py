@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+#
+# Full .json() load against streaming extraction of big VCO answers
+#
+# A child process serves a synthetic getEdgeConfigurationStack answer (edge and
+# enterprise profile, each with a deviceSettings module and --rules firewall / QoS
+# rules) and a profile list of --profiles profiles. Each is fetched over http
+# and reduced to what the script uses (the edge's deviceSettings module, the
+# profile id / name pairs) three ways:
+#   full     resp.json(), as before
+#   stdlib   json_stream.py with the raw_decode scanner
+#   ijson    json_stream.py with ijson, when installed
+# and the median latency and the tracemalloc peak of one fetch are reported.
+# First a small stack with floats and exponents at every level is fed to each
+# streaming way with every CHUNK_SIZE from 1 byte up, and the result compared
+# with json.loads, so values split by a read boundary are covered (--no-check skips).
+#   python3 bench/bench_json_stream.py --rules 20000 --profiles 50000 --runs 5
+
+import argparse
+import json
+import multiprocessing
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import requests
+
+from velo_prov import json_stream
+from velo_prov.fake_vco import device_settings_data
+
+
+def rules(n, kind):
+    return [{"name": "%s-%d" % (kind, i), "match": {"appid": i % 300, "dip": "10.%d.%d.0" % (i // 256 % 256, i % 256),
+             "dsm": "255.255.255.0", "dport_low": 1024, "dport_high": 65535, "proto": 6},
+             "action": {"allow_or_deny": "allow", "priority": "normal", "rxbandwidth": -1, "txbandwidth": -1},
+             "loggingEnabled": False} for i in range(n)]
+
+
+def profile(pid, nrules):
+    return {"id": pid, "name": "Profile %d" % pid, "modules": [
+        {"id": pid * 10 + 1, "name": "firewall", "data": {"segments": [{"outbound": rules(nrules, 'fw')}]}},
+        {"id": pid * 10 + 2, "name": "deviceSettings", "data": device_settings_data()},
+        {"id": pid * 10 + 3, "name": "QOS", "data": {"segments": [{"rules": rules(nrules, 'qos')}]}}]}
+
+
+def serve(port, nrules, nprofiles, ready):
+    bodies = {
+        '/stack': json.dumps([profile(1, nrules), profile(2, nrules)]).encode(),
+        '/profiles': json.dumps([{"id": i, "name": "Profile %d" % i, "description": "x" * 40,
+                                  "configurationType": "SEGMENT_BASED", "effective": "2021-01-01 00:00:00",
+                                  "modified": "2021-01-01 00:00:00", "bastionState": "UNCONFIGURED"}
+                                 for i in range(nprofiles)]).encode()}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            body = bodies[self.path]
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+    ready.put((server.server_address[1], dict((k, len(v)) for k, v in bodies.items())))
+    server.serve_forever()
+
+
+######## CHUNK BOUNDARY CHECK
+class BytesResponse(object):
+    # just enough of a streamed requests response for json_stream
+
+    status_code = 200
+
+    def __init__(self, body):
+        self.body = body
+
+    def iter_content(self, size):
+        return (self.body[i:i + size] for i in range(0, len(self.body), size))
+
+    def close(self):
+        pass
+
+
+def check_chunk_boundaries(ways):
+    stack = [{"id": 1, "score": 37.25, "weight": 1e5, "drift": -2.5E-3, "version": 10, "modules": [
+        {"id": 11, "name": "firewall", "data": {"ratio": 0.125, "limit": 12E+2}},
+        {"id": 12, "name": "deviceSettings", "data": {"mtu": 1500, "cost": 3.75e2, "segments": [{"w": -0.5}]}}]},
+        {"id": 2, "score": 1.5, "modules": []}]
+    profiles = [{"id": n, "name": "Profile %d" % n, "weight": n * 1.25, "scale": 1e-3} for n in range(5)]
+    body, plist = json.dumps(stack).encode(), json.dumps(profiles).encode()
+    expected = [m for m in json.loads(body)[0]['modules'] if m['name'] == 'deviceSettings'][0]
+    expected_pairs = [{'id': p['id'], 'name': p['name']} for p in json.loads(plist)]
+    chunk_size = json_stream.CHUNK_SIZE
+    try:
+        for way, use_ijson in ways:
+            if use_ijson is None:
+                continue
+            json_stream.USE_IJSON = use_ijson
+            for size in range(1, max(len(body), len(plist)) + 1):
+                json_stream.CHUNK_SIZE = size
+                if json_stream.edge_module(BytesResponse(body)) != expected:
+                    raise SystemExit('%s: wrong deviceSettings module with CHUNK_SIZE %d' % (way, size))
+                if json_stream.id_name_pairs(BytesResponse(plist)) != expected_pairs:
+                    raise SystemExit('%s: wrong profile pairs with CHUNK_SIZE %d' % (way, size))
+    finally:
+        json_stream.CHUNK_SIZE = chunk_size
+    print('chunk boundary check: %s match json.loads for every CHUNK_SIZE'
+          % ', '.join(way for way, use_ijson in ways if use_ijson is not None))
+
+
+######## WAYS TO GET THE PIECES OUT
+def full_stack(session, url):
+    stack = session.post(url + '/stack', data='{}').json()
+    return [m for m in dict(stack[0])['modules'] if m['name'] == 'deviceSettings'][0]
+
+
+def full_profiles(session, url):
+    return [{'id': p['id'], 'name': p['name']} for p in session.post(url + '/profiles', data='{}').json()]
+
+
+def stream_stack(session, url):
+    return json_stream.edge_module(session.post(url + '/stack', data='{}', stream=True))
+
+
+def stream_profiles(session, url):
+    return json_stream.id_name_pairs(session.post(url + '/profiles', data='{}', stream=True))
+
+
+def measure(fn, session, url, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn(session, url)
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    fn(session, url)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, statistics.median(times), peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rules", type=int, default=20000, help="firewall and QoS rules per profile of the stack")
+    parser.add_argument("--profiles", type=int, default=50000, help="profiles in the profile list")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--no-check", action='store_true', help="skip the chunk boundary check")
+    args = parser.parse_args()
+
+    ready = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve, args=(0, args.rules, args.profiles, ready), daemon=True)
+    server.start()
+    port, sizes = ready.get()
+    url = 'http://127.0.0.1:%d' % port
+    session = requests.Session()
+
+    ways = [('full', None), ('stdlib', False)]
+    if json_stream._backend():
+        ways.append(('ijson', True))
+    if not args.no_check:
+        check_chunk_boundaries(ways)
+    print('%-9s %-7s %10s %12s %12s' % ('ANSWER', 'WAY', 'MB', 'MEDIAN MS', 'PEAK MB'))
+    for answer, full, stream in (('stack', full_stack, stream_stack), ('profiles', full_profiles, stream_profiles)):
+        expected = None
+        for way, use_ijson in ways:
+            if use_ijson is not None:
+                json_stream.USE_IJSON = use_ijson
+            result, median, peak = measure(full if use_ijson is None else stream, session, url, args.runs)
+            if expected is None:
+                expected = result
+            elif result != expected:
+                raise SystemExit('%s %s extracted something else than the full load' % (answer, way))
+            print('%-9s %-7s %10.1f %12.1f %12.1f' % (answer, way, sizes['/' + answer] / 1e6, median * 1e3,
+                                                    peak / 1e6))
+    server.terminate()
+
+
+if __name__ == "__main__":
+    main()
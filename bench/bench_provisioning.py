@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+#
+# End-to-end provisioning benchmark, fully offline
+#
+# Runs the real provisioning code of the velo_prov package against the local fake
+# VCO (velo_prov.fake_vco) and the stub S3 / CloudFormation clients (velo_prov.fake_aws), with
+# configurable latency and error injection, and reports edges per minute for:
+#   single    one edge at a time, enterprise and profile looked up for every edge
+#   fleet     fleet mode on a worker pool (-c)
+#   pipeline  fleet mode with the VCO and AWS steps as pipeline stages (-c / -p)
+#
+# Before the timings, fleet, pipeline and shared-template runs with -w are checked
+# against a fake VCO failing --check-error-rate of the edge calls: the run has to
+# finish with a result row per edge. Then teardown by edge prefix and by run id and
+# reconcile --fix are run against failing VCO calls and throttled stack creates and
+# deletes, and rerun
+# until nothing is left: every run has to report its failed deletes / fixes, keep
+# journal rows of the failed edges only, and retry just what the previous run left
+# (--no-check skips both checks).
+#
+# --save FILE keeps the results, --baseline FILE compares against saved results
+# and exits non-zero when a scenario got slower than --tolerance.
+#   python3 bench/bench_provisioning.py --edges 100 -c 16 -p 16 --vco-latency 0.05 --aws-latency 0.1
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from velo_prov import aws, cf_deploy, cf_inventory, config, provision, reconcile, s3_store, teardown, vco
+from velo_prov.fake_aws import StubAws
+from velo_prov.fake_vco import ENTERPRISE_ID, FakeVco
+from velo_prov.journal import Journal
+from velo_prov.vco_cache import VcoMetadataCache
+
+
+def point_at(vco_url):
+    os.environ.update({'VCO_TOKEN': 'bench', 'VCO_HOSTNAME': 'fake-vco', 'VCO_URL': vco_url})
+    config.reset()
+
+
+def fresh_aws(tmp, latency):
+    # new stub account, and drop every per-process cache that points at the previous one
+    stubs = StubAws(latency=latency, settle_after=0)
+    cf_deploy.cf_clients.factory = s3_store.s3_clients.factory = stubs.client_factory
+    cf_deploy.cf_clients.clients.clear()
+    s3_store.s3_clients.clients.clear()
+    cf_inventory._inventories.clear()
+    s3_store._stores.clear()
+    aws.shared_template_url = None
+    vco.set_metadata_cache(VcoMetadataCache('fake-vco', 'bench', path=os.path.join(tmp, 'cache.json'), ttl=0))
+    return stubs
+
+
+def write_inventory(path, names):
+    with open(path, 'w') as f:
+        f.write('name\n' + '\n'.join(names) + '\n')
+
+
+def run_scenario(tmp, scenario, args):
+    stubs = fresh_aws(tmp, args.aws_latency)
+    journal = Journal(os.path.join(tmp, '%s.db' % scenario))
+    names = ['%s-%04d' % (scenario.upper(), n) for n in range(args.edges)]
+    start = time.monotonic()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if scenario == 'single':
+            defaults = {'contact_name': 'bench', 'contact_email': 'bench@example.com', 'key_name': config.KeyName,
+                        'region': config.CfRegion, 'az': config.region, 'instance_type': config.DefaultInstanceType}
+            results = []
+            for name in names:
+                eid = vco.find_velo_enterpriseId()
+                pid = vco.create_velo_profile(eid, config.ProfileName)
+                edge = dict(defaults, name=name, stack_name='VELO-STACK-' + name)
+                results.append(provision.provision_edge_steps(eid, pid, edge, True, True, journal, scenario))
+        else:
+            inventory = os.path.join(tmp, scenario + '.csv')
+            write_inventory(inventory, names)
+            results = provision.run_fleet_mode(inventory, args.concurrency, True, False, True, journal, scenario,
+                                               args.aws_workers if scenario == 'pipeline' else None)
+    elapsed = time.monotonic() - start
+    journal.close()
+    failed = sum(1 for r in results if r.get('status', 'ok') != 'ok')
+    return {'scenario': scenario, 'edges': args.edges, 'failed': failed, 'seconds': elapsed,
+            'edges_per_min': (args.edges - failed) / elapsed * 60, 'aws_calls': sum(stubs.calls.values())}
+
+
+def check_failures(tmp, args):
+    # failed edges have no stack_name in their row, the -w wait has to skip them
+    problems = []
+    with FakeVco(error_rate=args.check_error_rate, error_status=400, seed=2) as fake:
+        point_at(fake.url)
+        for mode, shared, aws_workers in (('fleet', False, None), ('pipeline', False, args.aws_workers),
+                                          ('shared', True, None)):
+            fresh_aws(tmp, 0.0).settle_after = 0
+            # names of their own, the edges an earlier mode left on the fake VCO would be adopted
+            names = ['FAIL-%s-%04d' % (mode.upper(), n) for n in range(args.edges)]
+            inventory = os.path.join(tmp, 'failures-%s.csv' % mode)
+            write_inventory(inventory, names)
+            # enterprise and profile known, so the injected errors hit the edge listing and the per-edge calls
+            cache = VcoMetadataCache('fake-vco', 'bench', path=os.path.join(tmp, 'check-cache.json'))
+            cache.set_enterprise_id(ENTERPRISE_ID)
+            cache.set_profiles([{'id': 10, 'name': config.ProfileName}])
+            vco.set_metadata_cache(cache)
+            journal = Journal(os.path.join(tmp, 'check-%s.db' % mode))
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    results = provision.run_fleet_mode(inventory, args.concurrency, True, True, shared, journal,
+                                                       'check-' + mode, aws_workers)
+            except Exception as e:
+                problems.append('%s: %s: %s' % (mode, e.__class__.__name__, e))
+                continue
+            finally:
+                journal.close()
+            failed = sum(1 for r in results if r['status'] != 'ok')
+            if len(results) != len(names) or not failed:
+                problems.append('%s: %d rows, %d failed' % (mode, len(results), failed))
+    if problems:
+        raise SystemExit('failure check: ' + '; '.join(problems))
+    print('failure check: fleet, pipeline and shared runs with -w survive failed edges')
+
+
+CLEANUP_RERUNS = 10
+
+
+def cleanup_runs(label, run, left, selects, problems, kept=None):
+    # reruns a teardown until nothing is left; run() raises SystemExit with the failed deletes,
+    # left() is (edge names, names of stacks) still there, selects(before) what a rerun has to pick
+    # up and kept() the edges in the journal, which must be exactly those with a failed delete
+    failed, error = 0, None
+    for attempt in range(CLEANUP_RERUNS):
+        before = left()
+        if not any(before) and not (kept and kept()):
+            break
+        expected = selects(before)
+        out = io.StringIO()
+        cf_inventory._inventories.clear()
+        try:
+            with contextlib.redirect_stdout(out):
+                run()
+            reported = 0
+        except SystemExit as e:
+            reported = int(str(e.code).split()[0])
+        except Exception as e:
+            # the listing failed, nothing may have been deleted
+            error = '%s: %s' % (e.__class__.__name__, e)
+            if left() != before:
+                problems.append('%s: %s changed the fleet' % (label, error))
+                return
+            continue
+        edges, stacks = left()
+        selected = re.search(r'selects (\d+) stacks and (\d+) edges', out.getvalue())
+        if not selected or tuple(int(n) for n in selected.groups()) != expected:
+            problems.append('%s: rerun %d selected %s, expected %d stacks and %d edges'
+                            % (label, attempt, selected and selected.group(0), *expected))
+            return
+        # a stack already gone still fails when its delete call does, so left is only a subset
+        rows = re.findall(r'^(stack|edge) +(\S+) .* failed ', out.getvalue(), re.M)
+        failed_names = dict((kind, set(name for k, name in rows if k == kind)) for kind in ('stack', 'edge'))
+        if reported != len(rows) or not (edges <= failed_names['edge'] and stacks <= failed_names['stack']):
+            problems.append('%s: rerun %d reported %d failed deletes for %d failed rows, %d edges and %d stacks left'
+                            % (label, attempt, reported, len(rows), len(edges), len(stacks)))
+            return
+        if kept and kept() != failed_names['edge'] | failed_names['stack']:
+            problems.append('%s: rerun %d left %d edges in the journal, %d had a failed delete'
+                            % (label, attempt, len(kept()), len(failed_names['edge'] | failed_names['stack'])))
+            return
+        failed += reported
+    else:
+        problems.append('%s: still %d edges and %d stacks after %d reruns (%s)'
+                        % (label, len(left()[0]), len(left()[1]), CLEANUP_RERUNS, error))
+        return
+    if not failed:
+        problems.append('%s: no delete failed, nothing checked' % label)
+
+
+def check_cleanup(tmp, args):
+    # teardown and reconcile --fix under failing calls, see the module header
+    problems = []
+    with FakeVco(error_status=400, seed=3) as fake:
+        point_at(fake.url)
+        stubs = fresh_aws(tmp, 0.0)
+        # only stack creates and deletes are throttled, a throttled stack wait would just back off for seconds
+        stubs.throttle_operations = {'CreateStack', 'DeleteStack'}
+        stubs.random.seed(3)
+        cache = VcoMetadataCache('fake-vco', 'bench', path=os.path.join(tmp, 'cleanup-cache.json'))
+        cache.set_enterprise_id(ENTERPRISE_ID)
+        cache.set_profiles([{'id': 10, 'name': config.ProfileName}])
+        vco.set_metadata_cache(cache)
+        journal = Journal(os.path.join(tmp, 'cleanup.db'))
+        cf = stubs.client_factory('cloudformation', config.CfRegion)
+        for group in ('TDP-', 'TDR-', 'RECON-'):
+            inventory = os.path.join(tmp, group + 'cleanup.csv')
+            write_inventory(inventory, ['%s%04d' % (group, n) for n in range(args.edges)])
+            with contextlib.redirect_stdout(io.StringIO()):
+                provision.run_fleet_mode(inventory, args.concurrency, True, False, True, journal, group + 'run')
+
+        def left(prefix):
+            edges = set(e['name'] for e in list(fake.state.edges.values()) if e['name'].startswith(prefix))
+            with stubs.lock:
+                stacks = set(n[len('VELO-STACK-'):] for n, st in cf.stacks.items()
+                             if st['StackStatus'] != 'DELETE_COMPLETE' and n.startswith('VELO-STACK-' + prefix))
+            return edges, stacks
+
+        fake.faults.error_rate = stubs.throttle_rate = args.check_error_rate
+        cleanup_runs('prefix teardown', lambda: teardown.run_teardown([config.CfRegion], 'TDP-', yes=True,
+                                                                      concurrency=args.concurrency),
+                     lambda: left('TDP-'), lambda before: (len(before[1]), len(before[0])), problems)
+        # the run id selection comes from the journal: both the edge and the stack of each edge left
+        cleanup_runs('run id teardown', lambda: teardown.run_teardown([config.CfRegion], journal=journal,
+                                                                      run_id='TDR-run', yes=True,
+                                                                      concurrency=args.concurrency),
+                     lambda: left('TDR-'), lambda before: (len(journal.edges('TDR-run')),) * 2, problems,
+                     lambda: set(journal.edges('TDR-run')))
+
+        # drift: half of the stacks gone, and as many stacks of edges the VCO does not know
+        fake.faults.error_rate = stubs.throttle_rate = 0.0
+        with stubs.lock:
+            for n in range(0, args.edges, 2):
+                cf.stacks['VELO-STACK-RECON-%04d' % n]['StackStatus'] = 'DELETE_COMPLETE'
+        for n in range(max(10, args.edges // 2)):
+            cf.create_stack('VELO-STACK-RECON-GONE-%d' % n, Tags=cf_deploy.edge_tags('RECON-GONE-%d' % n))
+        fake.faults.error_rate = stubs.throttle_rate = args.check_error_rate
+        # the same throttles whatever the teardowns drew
+        stubs.random.seed(3)
+        todo, failed = None, 0
+        for attempt in range(CLEANUP_RERUNS):
+            out = io.StringIO()
+            cf_inventory._inventories.clear()
+            try:
+                with contextlib.redirect_stdout(out):
+                    drift = reconcile.run_reconcile([config.CfRegion], 'RECON-', True, args.concurrency)
+            except Exception:
+                # the edge listing failed, nothing was fixed
+                continue
+            rows = set((r['kind'], r['name'], r['stack_name']) for r in drift if r['action'])
+            applied = re.search(r'(\d+)/(\d+) fixes applied', out.getvalue())
+            applied, tried = (int(applied.group(1)), int(applied.group(2))) if applied else (0, 0)
+            if todo is not None and not (rows <= todo[0] and len(rows) == len(todo[0]) - todo[1]):
+                problems.append('reconcile --fix: rerun %d has %d fixes to do, %d of %d were left'
+                                % (attempt, len(rows), len(todo[0]) - todo[1], len(todo[0])))
+                break
+            if tried != len(rows):
+                problems.append('reconcile --fix: rerun %d tried %d of %d fixes' % (attempt, tried, len(rows)))
+                break
+            if not rows:
+                break
+            todo, failed = (rows, applied), failed + tried - applied
+        else:
+            problems.append('reconcile --fix: drift left after %d reruns' % CLEANUP_RERUNS)
+        if todo is None:
+            problems.append('reconcile --fix: no drift found')
+        elif not failed:
+            problems.append('reconcile --fix: no fix failed, nothing checked')
+        journal.close()
+    if problems:
+        raise SystemExit('cleanup check: ' + '; '.join(problems))
+    print('cleanup check: teardown by prefix and run id and reconcile --fix rerun until done')
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--edges", type=int, default=50)
+    parser.add_argument("-c", "--concurrency", type=int, default=16)
+    parser.add_argument("-p", "--aws-workers", type=int, default=16)
+    parser.add_argument("--vco-latency", type=float, default=0.05, help="seconds per VCO call")
+    parser.add_argument("--aws-latency", type=float, default=0.1, help="seconds per AWS call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of VCO calls answered with 503, retried except for the edge creates, which fail")
+    parser.add_argument("--scenarios", nargs='+', default=['single', 'fleet', 'pipeline'])
+    parser.add_argument("--check-error-rate", type=float, default=0.15, help="failure check: fraction of VCO calls failing")
+    parser.add_argument("--no-check", action='store_true', help="skip the failure check")
+    parser.add_argument("--save", metavar="FILE")
+    parser.add_argument("--baseline", metavar="FILE")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='velo-bench-')
+    cwd = os.getcwd()
+    os.chdir(tmp)
+    if not args.no_check:
+        check_failures(tmp, args)
+        check_cleanup(tmp, args)
+    with FakeVco(latency=args.vco_latency, error_rate=args.error_rate, seed=1) as fake:
+        point_at(fake.url)
+        results = [run_scenario(tmp, s, args) for s in args.scenarios]
+    os.chdir(cwd)
+
+    print('%-10s %6s %7s %9s %12s %10s' % ('SCENARIO', 'EDGES', 'FAILED', 'SECONDS', 'EDGES/MIN', 'AWS CALLS'))
+    for r in results:
+        print('%-10s %6d %7d %9.2f %12.1f %10d' % (r['scenario'], r['edges'], r['failed'], r['seconds'],
+                                                   r['edges_per_min'], r['aws_calls']))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=1)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = dict((r['scenario'], r) for r in json.load(f)['results'])
+        regressions = [r['scenario'] for r in results if r['scenario'] in baseline and
+                       r['edges_per_min'] < baseline[r['scenario']]['edges_per_min'] * (1 - args.tolerance)]
+        if regressions:
+            print('slower than baseline: ' + ', '.join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+#
+# Fleet provisioning against a rate limited VCO, with and without the adaptive limiter
+#
+# The fake VCO accepts --vco-rate calls per second and answers the rest with 429 +
+# Retry-After. The VCO steps of a fleet (provision + deviceSettings) run at -c
+# workers, once with the process wide limiter off and once on, and the edges per
+# minute, 429 answers and failed edges of both runs are compared.
+#   python3 bench/bench_ratelimit.py --edges 200 -c 32 --vco-rate 60
+
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from velo_prov import config, provision, vco
+from velo_prov.fake_vco import FakeVco
+from velo_prov.ratelimit import limiter
+from velo_prov.vco_cache import VcoMetadataCache
+
+
+def run(args, tmp, enabled):
+    limiter.enabled = enabled
+    limiter.reset()
+    with FakeVco(latency=args.vco_latency, rate_limit=args.vco_rate, seed=1) as fake:
+        os.environ.update({'VCO_TOKEN': 'bench', 'VCO_HOSTNAME': 'fake-vco', 'VCO_URL': fake.url})
+        config.reset()
+        vco.set_metadata_cache(VcoMetadataCache('fake-vco', 'bench', path=os.path.join(tmp, 'cache.json'), ttl=0))
+        inventory = os.path.join(tmp, 'edges.csv')
+        with open(inventory, 'w') as f:
+            f.write('name\n' + '\n'.join('RL-%04d' % n for n in range(args.edges)) + '\n')
+        start = time.monotonic()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = provision.run_fleet_mode(inventory, args.concurrency, False, shared=True)
+        elapsed = time.monotonic() - start
+        failed = sum(1 for r in results if r['status'] != 'ok')
+        return {'limiter': 'on' if enabled else 'off', 'seconds': elapsed, 'failed': failed,
+                'edges_per_min': (args.edges - failed) / elapsed * 60, 'calls': sum(fake.state.calls.values()),
+                'throttled': sum(fake.state.throttled.values())}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--edges", type=int, default=200)
+    parser.add_argument("-c", "--concurrency", type=int, default=32)
+    parser.add_argument("--vco-rate", type=float, default=60.0, help="calls per second the fake VCO accepts")
+    parser.add_argument("--vco-latency", type=float, default=0.02, help="seconds per VCO call")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='velo-bench-')
+    results = [run(args, tmp, enabled) for enabled in (False, True)]
+
+    print('%-8s %9s %7s %12s %7s %10s' % ('LIMITER', 'SECONDS', 'FAILED', 'EDGES/MIN', 'CALLS', '429s'))
+    for r in results:
+        print('%-8s %9.2f %7d %12.1f %7d %10d' % (r['limiter'], r['seconds'], r['failed'], r['edges_per_min'],
+                                                 r['calls'], r['throttled']))
+    limiter.print_summary()
+
+
+if __name__ == "__main__":
+    main()
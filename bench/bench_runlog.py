@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+#
+# Worker-side cost of an event: print, synchronous JSON logging, runlog queue
+#
+# --threads workers each emit --events per-call style events, the way fleet mode
+# workers print and log, and the time until every worker is done is reported:
+#   print     print() of a line to the output file, as the script's progress output
+#   sync      logging with the JSON formatter and a FileHandler on the worker thread
+#   runlog    runlog.setup(): workers only queue, the listener thread formats and writes
+# --sink-delay adds a pause per written line to stand for a slow terminal or disk.
+# For runlog the time to drain the queue afterwards is shown separately.
+#   python3 bench/bench_runlog.py --threads 16 --events 2000 --sink-delay 0 0.0002
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from velo_prov import runlog
+
+
+class SlowFile(object):
+    # file whose writes take delay seconds each, like a terminal that cannot keep up
+
+    def __init__(self, path, delay):
+        self.f = open(path, 'w')
+        self.delay = delay
+
+    def write(self, text):
+        if self.delay:
+            time.sleep(self.delay)
+        return self.f.write(text)
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        self.f.close()
+
+
+def workers(threads, events, emit):
+    def work(n):
+        runlog.bind(run_id='bench', edge='EDGE-%03d' % n)
+        for i in range(events):
+            emit(n, i)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(work, range(threads)))
+    return time.perf_counter() - start
+
+
+def run(way, args, delay, tmp):
+    path = os.path.join(tmp, way + '.out')
+    if way == 'print':
+        out = SlowFile(path, delay)
+        seconds = workers(args.threads, args.events, lambda n, i: print(
+            'VCO call vco.edge/edgeProvision of EDGE-%03d done in %.4fs' % (n, 0.05), file=out))
+        out.close()
+        return seconds, 0.0
+    if way == 'sync':
+        handler = logging.StreamHandler(SlowFile(path, delay))
+        handler.setFormatter(runlog.JsonFormatter())
+        logger = logging.getLogger('bench.sync')
+        logger.handlers, logger.propagate = [handler], False
+        logger.setLevel(logging.INFO)
+        seconds = workers(args.threads, args.events, lambda n, i: logger.info(
+            'call', extra={'fields': {'run_id': 'bench', 'edge': 'EDGE-%03d' % n, 'call': 'vco.edge/edgeProvision',
+                                      'duration_s': 0.05}}))
+        handler.stream.close()
+        return seconds, 0.0
+    runlog.setup(path, 'DEBUG')
+    if delay:
+        # same slow sink behind the listener
+        target = runlog._listener.handlers[0]
+        target.stream.close()
+        target.stream = SlowFile(path, delay)
+    seconds = workers(args.threads, args.events, lambda n, i: runlog.event(
+        runlog.calls, runlog.DEBUG, 'call', call='vco.edge/edgeProvision', duration_s=0.05))
+    start = time.perf_counter()
+    runlog.shutdown()
+    return seconds, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--events", type=int, default=2000, help="events per worker")
+    parser.add_argument("--sink-delay", type=float, nargs='+', default=[0.0, 0.0002], help="seconds per written line")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix='velo-runlog-')
+    total = args.threads * args.events
+    print('%-8s %-11s %12s %14s %10s' % ('WAY', 'SINK DELAY', 'WORKERS S', 'US/EVENT', 'DRAIN S'))
+    for delay in args.sink_delay:
+        for way in ('print', 'sync', 'runlog'):
+            seconds, drain = run(way, args, delay, tmp)
+            print('%-8s %-11g %12.3f %14.2f %10.3f' % (way, delay, seconds, seconds / total * 1e6, drain))
+
+
+if __name__ == "__main__":
+    main()
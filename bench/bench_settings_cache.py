@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+#
+# Micro-benchmark: deviceSettings update per edge, recomputed vs settings_cache
+#
+# Builds the updateConfigurationModule params for N fetched edge modules of one
+# profile, once recomputing deepcopy + iface_map transform + diff for every edge
+# (the cache emptied before each) and once through the cache, for edge models
+# with a growing number of routed interfaces.
+#   python3 bench/bench_settings_cache.py --edges 500 --interfaces 4 16 64
+
+import argparse
+import os
+import sys
+import time
+from copy import deepcopy
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from velo_prov.fake_vco import _interface, device_settings_data
+from velo_prov.settings_cache import DeviceSettingsCache
+
+
+def edge_modules(interfaces, edges):
+    data = device_settings_data()
+    data['routedInterfaces'] = [_interface('GE%d' % n) for n in range(3, 3 + interfaces)]
+    # every edge fetches its own copy of the profile's settings, with its own module id
+    return [{'id': 1000 + n, 'name': 'deviceSettings', 'data': deepcopy(data)} for n in range(edges)]
+
+
+def run(modules, cached):
+    cache = DeviceSettingsCache()
+    results = []
+    start = time.perf_counter()
+    for module in modules:
+        if not cached:
+            cache.reset()
+        results.append(cache.update_params(module, 'c4.xlarge', 10))
+    return (time.perf_counter() - start) / len(modules) * 1e6, results, cache
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--edges", type=int, default=500)
+    parser.add_argument("--interfaces", type=int, nargs='+', default=[4, 16, 64])
+    args = parser.parse_args()
+
+    print('%-12s %18s %15s %9s %6s %7s' % ('interfaces', 'recompute us/edge', 'cached us/edge', 'speedup', 'hits',
+                                           'misses'))
+    for count in args.interfaces:
+        modules = edge_modules(count, args.edges)
+        recompute_us, expected, _ = run(modules, False)
+        cached_us, results, cache = run(modules, True)
+        assert results == expected
+        s = cache.summary()
+        print('%-12d %18.1f %15.1f %8.1fx %6d %7d' % (count, recompute_us, cached_us, recompute_us / cached_us,
+                                                      s['hits'], s['misses']))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+#
+# Startup time budget of the command line
+#
+# Times fresh interpreters running `api_vco-aws-prov.py --help` and importing
+# velo_prov.cli, against a bare `python3 -c pass` baseline, and checks that neither
+# loads boto3/botocore/requests or needs the VCO environment variables.
+# Exits non-zero when the median overhead over the baseline exceeds --budget-ms.
+#   python3 bench/bench_startup.py --runs 20 --budget-ms 150
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+HEAVY = ('boto3', 'botocore', 'requests', 'urllib3', 'aiohttp')
+
+CASES = {
+    'baseline': [sys.executable, '-c', 'pass'],
+    'help': [sys.executable, os.path.join(ROOT, 'api_vco-aws-prov.py'), '--help'],
+    'import': [sys.executable, '-c', 'import velo_prov.cli'],
+}
+
+CHECK = ('import sys, velo_prov.cli; '
+         'print(" ".join(m for m in %r if m in sys.modules))' % (HEAVY,))
+
+
+def clean_env():
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    for name in ('VCO_TOKEN', 'VCO_HOSTNAME', 'VCO_URL'):
+        env.pop(name, None)
+    return env
+
+
+def time_case(cmd, runs, env):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, env=env, cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), min(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, default=150.0,
+                        help="allowed median startup over a bare interpreter")
+    args = parser.parse_args()
+    env = clean_env()
+
+    loaded = subprocess.run([sys.executable, '-c', CHECK], env=env, cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout.split()
+
+    results = dict((name, time_case(cmd, args.runs, env)) for name, cmd in CASES.items())
+    base = results['baseline'][0]
+    print('%-10s %10s %10s %12s' % ('CASE', 'MEDIAN MS', 'MIN MS', 'OVERHEAD MS'))
+    for name, (median, fastest) in results.items():
+        print('%-10s %10.1f %10.1f %12.1f' % (name, median, fastest, median - base))
+
+    failed = False
+    if loaded:
+        print('loaded at import: ' + ', '.join(loaded))
+        failed = True
+    over = [name for name in ('help', 'import') if results[name][0] - base > args.budget_ms]
+    if over:
+        print('over the %.0f ms budget: %s' % (args.budget_ms, ', '.join(over)))
+        failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+#
+# VMware SD-WAN edge provisioning on AWS
+#
+# Kept empty on purpose: importing the package (or python3 -m velo_prov --help)
+# must not load requests, boto3 or read the VCO environment variables.
@@ -0,0 +1,78 @@
+#
+# Region -> software version -> AMI index of the virtual edge images
+#
+# Loaded once from a versioned data file (data/ami_index.json, "format" is the
+# file layout, "revision" the date of the AMI list) and feeds the RegionMap of the
+# cf template. check() validates a region / AZ / version target against it with
+# dict and set lookups only, so bad targets are rejected before any api call
+# instead of minutes into a stack create and its rollback.
+#
+# To publish new images, add them to the data file and bump its revision.
+
+import json
+import os
+import re
+
+DEFAULT_INDEX = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'ami_index.json')
+FORMAT = 1
+# an availability zone is its region plus one zone letter, e.g. us-east-1b
+AZ_PATTERN = re.compile(r'^(?P<region>[a-z]{2}(-gov)?-[a-z]+-\d+)[a-z]$')
+AMI_PATTERN = re.compile(r'^ami-[0-9a-f]{8}([0-9a-f]{9})?$')
+
+
+class AmiIndex(object):
+
+    def __init__(self, data, source='<data>'):
+        if data.get('format') != FORMAT:
+            raise ValueError('%s: unsupported AMI index format %r, expected %d' % (source, data.get('format'), FORMAT))
+        self.source = source
+        self.revision = data.get('revision', '')
+        self.regions = {}
+        for region, images in data['regions'].items():
+            bad = [ami for ami in images.values() if not AMI_PATTERN.match(ami)]
+            if bad:
+                raise ValueError('%s: %s has malformed AMI ids %s' % (source, region, ', '.join(bad)))
+            self.regions[region] = dict((str(v), ami) for v, ami in images.items())
+        self.versions = sorted(set(v for images in self.regions.values() for v in images))
+        self.default_version = str(data.get('default_version') or self.versions[-1])
+        if self.default_version not in self.versions:
+            raise ValueError('%s: default version %s has no AMI' % (source, self.default_version))
+
+    def image(self, region, version=None):
+        return self.regions.get(region, {}).get(str(version or self.default_version))
+
+    def region_map(self):
+        # the cf template's Mappings.RegionMap
+        return dict((region, dict(images)) for region, images in self.regions.items())
+
+    def check(self, region, az=None, version=None):
+        # list of problems with the target, empty when it can be launched
+        errors = []
+        images = self.regions.get(region)
+        if images is None:
+            errors.append('no AMI in region %s' % region)
+        if az:
+            m = AZ_PATTERN.match(az)
+            if m is None:
+                errors.append('%s is not an availability zone name' % az)
+            elif m.group('region') != region:
+                errors.append('availability zone %s is not in region %s' % (az, region))
+        version = str(version or self.default_version)
+        if images is not None and version not in images:
+            errors.append('software version %s has no AMI in %s (available: %s)'
+                          % (version, region, ', '.join(sorted(images))))
+        return errors
+
+
+_index = None
+
+
+def load(path=None):
+    global _index
+    if path is not None:
+        with open(path) as f:
+            return AmiIndex(json.load(f), path)
+    if _index is None:
+        with open(DEFAULT_INDEX) as f:
+            _index = AmiIndex(json.load(f), DEFAULT_INDEX)
+    return _index
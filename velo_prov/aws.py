@@ -0,0 +1,93 @@
+#
+# AWS side of the provisioning: S3 template upload and CloudFormation stacks
+#
+# boto3 is only imported when the first client is created (cf_deploy.boto3_client_factory),
+# so runs without -a never pay for it.
+
+import json
+
+from . import runlog
+from . import template
+from .cf_deploy import cf_client, edge_tags, stack_parameters
+from .cf_inventory import stack_inventory
+from .cf_watch import StackWatcher, wait_deleted
+from .s3_store import template_store
+
+##############################   /////   #######################
+####                          AWS FUNCTIONS
+##############################   /////   #######################
+############# Create S3 bucket and upload file to it
+def upload_file_to_s3(bucketname,file2upload):
+	# check if bucket alread exists if not create one and
+	# upload new cloud formation template to S3 bucket named 'velocf'
+	# make file public
+	# templates are keyed by content hash, an identical template already in the bucket is not uploaded again
+	store = template_store(bucketname)
+	s3FileUrl,uploaded = store.put_file(file2upload)
+	if not uploaded:
+		print('Template '+file2upload+' already in bucket '+bucketname+', upload skipped')
+	print('File URL = '+s3FileUrl)
+	return s3FileUrl
+############# Deploy CF Stack
+def deploy_aws_cf_stack(stackname,awsregion,s3fileurl,parameters=None,edgename=None):
+	cf_template_url=s3fileurl
+	cf_region=awsregion
+	#-- Connect to AWS region specified in parameters file, one client per region is shared by all stacks
+	print("Connecting to region: " + cf_region)
+	lo_cf_client = cf_client(cf_region)
+	cf_stack_name = stackname
+	#-- Check if this stack name already exists, by name or from the run wide index when prefetched
+	lo_inventory = stack_inventory(cf_region)
+	ll_stack_exists = lo_inventory.exists(cf_stack_name)
+	#-- If  stack  exists, delete it first
+	if ll_stack_exists:
+		print("Stack " + cf_stack_name + " already exists.")
+		print(" Delete existing Stack  " + cf_stack_name)
+		lo_cf_client.delete_stack(StackName=cf_stack_name)
+		#-- the name stays taken until the delete completes, block before recreating
+		wait_deleted(cf_region, [cf_stack_name])
+		lo_inventory.record(cf_stack_name, None)
+	#-- per-stack values when the template is the shared parameterized one, empty when they are baked in
+	la_create_stack_parameters = stack_parameters(parameters or {})
+	#-- tagged with the edge name so reconcile can match the stack to its VCO edge
+	la_create_stack_tags = edge_tags(edgename)
+	#-- Call CloudFormation API and create the stack
+	print(" ")
+	print("Creating Stack : " + cf_stack_name)
+	cf_cur_status = ""
+	apiresult = lo_cf_client.create_stack(StackName=cf_stack_name, DisableRollback=False, TemplateURL=cf_template_url, Parameters=la_create_stack_parameters, Tags=la_create_stack_tags, Capabilities=["CAPABILITY_IAM"])
+	lo_inventory.record(cf_stack_name, 'CREATE_IN_PROGRESS')
+	#-- only the stack id on the console, the full answer goes to the run log
+	print("Stack Id: " + apiresult['StackId'])
+	runlog.event(runlog.steps,runlog.DEBUG,'create_stack answer',step='stack',stack_name=cf_stack_name,region=cf_region,answer=apiresult)
+	return apiresult
+
+############# Delete CF Stack, returns without waiting for the delete to complete
+def delete_aws_cf_stack(stackname,awsregion):
+	lo_cf_client = cf_client(awsregion)
+	#-- deleting a stack that does not exist is a no-op for CloudFormation, so reruns are safe
+	lo_cf_client.delete_stack(StackName=stackname)
+	stack_inventory(awsregion).record(stackname, 'DELETE_IN_PROGRESS')
+	print("Deleting Stack : " + stackname + " in " + awsregion)
+
+############# Block until the stacks are up, polling them together
+def wait_for_stacks(stacks):
+	watcher = StackWatcher()
+	for awsregion,stackname in stacks:
+		watcher.watch(awsregion, stackname)
+	status = watcher.wait()
+	for (awsregion,stackname),stackstatus in sorted(status.items()):
+		print('Stack '+stackname+' in '+awsregion+': '+stackstatus)
+	return status
+
+#### The unmodified velocf template, serialized and uploaded once per run and shared by every stack
+SharedTemplateFile='velo-cf.json'
+shared_template_url = None
+
+def upload_shared_template(bucketname):
+	global shared_template_url
+	if shared_template_url is None:
+		with open(SharedTemplateFile, 'w') as outfile:
+			outfile.write(json.dumps(template.velocf(), sort_keys=True))
+		shared_template_url = upload_file_to_s3(bucketname,SharedTemplateFile)
+	return shared_template_url
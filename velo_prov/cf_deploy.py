@@ -0,0 +1,166 @@
+#
+# Parallel multi-region CloudFormation deployment engine
+#
+# Takes a list of (region, AZ, stack name, parameters) targets and creates the
+# stacks in parallel, with one boto3 client per region reused across stacks and
+# a progress line per finished stack. Targets are first checked against the
+# AMI index and the edge template (template.validate_target), an invalid one
+# fails right away without any AWS call; validate=False skips that for other
+# templates.
+#
+# Clients come from a factory(service, region) so the engine can run against
+# the stub backend in fake_aws.py instead of a real AWS account.
+#
+#   python3 -m velo_prov.cf_deploy targets.yaml --template-url https://bucket.s3.amazonaws.com/velo-cf.json -c 16
+
+import argparse
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+DEFAULT_WORKERS = 16
+
+StackTarget = namedtuple('StackTarget', 'region az stack_name parameters template_url')
+
+
+def boto3_client_factory(service, region):
+    import boto3
+    from .metrics import metrics
+    from .ratelimit import limiter
+    return limiter.instrument_boto3(metrics.instrument_boto3(boto3.client(service, region)))
+
+
+class RegionClients(object):
+    # boto3 clients are thread safe once built, building them is not, hence the lock
+
+    def __init__(self, service, factory=boto3_client_factory):
+        self.service = service
+        self.factory = factory
+        self.lock = threading.Lock()
+        self.clients = {}
+
+    def get(self, region):
+        client = self.clients.get(region)
+        if client is None:
+            with self.lock:
+                client = self.clients.get(region)
+                if client is None:
+                    client = self.clients[region] = self.factory(self.service, region)
+        return client
+
+
+#### process wide cloudformation clients, shared by deploy_aws_cf_stack and the engine
+cf_clients = RegionClients('cloudformation')
+
+
+def cf_client(region):
+    return cf_clients.get(region)
+
+
+def stack_parameters(params):
+    return [{'ParameterKey': k, 'ParameterValue': str(v)} for k, v in sorted(params.items())]
+
+
+#### every edge stack is tagged with its edge name, reconcile.py joins stacks to VCO edges on it
+EDGE_TAG = 'VeloCloudEdgeName'
+
+
+def edge_tags(edge_name):
+    return [{'Key': EDGE_TAG, 'Value': edge_name}] if edge_name else []
+
+
+class CfDeployEngine(object):
+
+    def __init__(self, clients=None, max_workers=DEFAULT_WORKERS, validate=True):
+        self.clients = clients or cf_clients
+        self.max_workers = max_workers
+        self.validate = validate
+        self.lock = threading.Lock()
+
+    def _check(self, target):
+        # the edge template's launch constraints, checked locally so a bad target costs no api call
+        if not self.validate:
+            return []
+        from .template import validate_target
+        params = target.parameters or {}
+        return validate_target(target.region, target.az or params.get('AvailabilityZone'),
+                               params.get('SoftwareVersion'), params.get('EC2InstanceType'))
+
+    def _create(self, target):
+        params = dict(target.parameters or {})
+        if target.az:
+            params.setdefault('AvailabilityZone', target.az)
+        client = self.clients.get(target.region)
+        return client.create_stack(StackName=target.stack_name, DisableRollback=False,
+                                   TemplateURL=target.template_url, Parameters=stack_parameters(params),
+                                   Tags=edge_tags(params.get(EDGE_TAG)), Capabilities=["CAPABILITY_IAM"])
+
+    def _deploy_one(self, target):
+        start = time.monotonic()
+        result = {'region': target.region, 'stack_name': target.stack_name, 'status': 'created',
+                  'stack_id': '', 'error': ''}
+        try:
+            errors = self._check(target)
+            if errors:
+                raise ValueError('invalid target: ' + '; '.join(errors))
+            result['stack_id'] = self._create(target)['StackId']
+        except Exception as e:
+            result['status'] = 'failed'
+            result['error'] = str(e)
+        result['seconds'] = time.monotonic() - start
+        return result
+
+    def deploy(self, targets):
+        # results are returned in target order, progress is printed in completion order
+        targets = list(targets)
+        results = [None] * len(targets)
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            futures = {pool.submit(self._deploy_one, t): n for n, t in enumerate(targets)}
+            for f in as_completed(futures):
+                r = results[futures[f]] = f.result()
+                done += 1
+                print('[%d/%d] %s %s %s (%.2fs)%s' % (done, len(targets), r['region'], r['stack_name'],
+                      r['status'], r['seconds'], ' ' + r['error'] if r['error'] else ''))
+        failed = sum(1 for r in results if r['status'] != 'created')
+        print('%d stacks created in %d regions, %d failed'
+              % (len(results) - failed, len(set(t.region for t in targets)), failed))
+        return results
+
+
+######## TARGET FILES
+# YAML or CSV, one target per entry with region, az, stack_name, optional template_url and
+# any other key passed through as a stack parameter
+def load_targets(path, template_url=None):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.yml', '.yaml'):
+        import yaml
+        with open(path) as f:
+            rows = yaml.safe_load(f) or []
+        if isinstance(rows, dict):
+            rows = rows.get('targets', [])
+    else:
+        import csv
+        with open(path, newline='') as f:
+            rows = list(csv.DictReader(f))
+    targets = []
+    for row in rows:
+        row = dict(row)
+        region, az, name = row.pop('region'), row.pop('az', None), row.pop('stack_name')
+        url = row.pop('template_url', None) or template_url
+        if not url:
+            raise ValueError('no template url for stack ' + name)
+        targets.append(StackTarget(region, az, name, {k: v for k, v in row.items() if v not in (None, '')}, url))
+    return targets
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("targets", help="CSV or YAML file of stack targets")
+    parser.add_argument("--template-url", help="Template used by targets that do not set their own")
+    parser.add_argument("-c", "--concurrency", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--no-validate", action='store_true', help="Skip the edge template target checks")
+    args = parser.parse_args()
+    CfDeployEngine(max_workers=args.concurrency, validate=not args.no_validate).deploy(load_targets(args.targets, args.template_url))
@@ -0,0 +1,86 @@
+#
+# Stack existence checks without scanning describe_stacks()
+#
+# By default a stack is looked up by name with describe_stacks(StackName=...),
+# one small call regardless of how many stacks the account has. When a run is
+# about to deploy many stacks into a region, prefetch() builds a name -> status
+# index from a paginated list_stacks instead, once per region and per process,
+# and every deployment in the process shares it. Creates and deletes done by
+# this process are written back into the index so it stays usable for the run.
+
+import threading
+
+from .cf_deploy import cf_clients
+
+# every status except DELETE_COMPLETE, the name is free again once a stack is deleted
+LIVE_STATUSES = [
+    'CREATE_IN_PROGRESS', 'CREATE_FAILED', 'CREATE_COMPLETE',
+    'ROLLBACK_IN_PROGRESS', 'ROLLBACK_FAILED', 'ROLLBACK_COMPLETE',
+    'DELETE_IN_PROGRESS', 'DELETE_FAILED',
+    'UPDATE_IN_PROGRESS', 'UPDATE_COMPLETE_CLEANUP_IN_PROGRESS', 'UPDATE_COMPLETE',
+    'UPDATE_FAILED', 'UPDATE_ROLLBACK_IN_PROGRESS', 'UPDATE_ROLLBACK_FAILED',
+    'UPDATE_ROLLBACK_COMPLETE_CLEANUP_IN_PROGRESS', 'UPDATE_ROLLBACK_COMPLETE',
+    'REVIEW_IN_PROGRESS', 'IMPORT_IN_PROGRESS', 'IMPORT_COMPLETE',
+    'IMPORT_ROLLBACK_IN_PROGRESS', 'IMPORT_ROLLBACK_FAILED', 'IMPORT_ROLLBACK_COMPLETE',
+]
+
+
+class StackInventory(object):
+
+    def __init__(self, client):
+        self.client = client
+        self.lock = threading.Lock()
+        self.index = None
+
+    def prefetch(self):
+        with self.lock:
+            if self.index is not None:
+                return self.index
+            index = {}
+            kw = {'StackStatusFilter': LIVE_STATUSES}
+            while True:
+                resp = self.client.list_stacks(**kw)
+                for s in resp['StackSummaries']:
+                    index[s['StackName']] = s['StackStatus']
+                if not resp.get('NextToken'):
+                    break
+                kw['NextToken'] = resp['NextToken']
+            self.index = index
+            return index
+
+    def status(self, stack_name):
+        # None when no live stack has that name
+        if self.index is not None:
+            return self.index.get(stack_name)
+        try:
+            return self.client.describe_stacks(StackName=stack_name)['Stacks'][0]['StackStatus']
+        except Exception as e:
+            if getattr(e, 'response', {}).get('Error', {}).get('Code') == 'ValidationError' \
+                    and 'does not exist' in str(e):
+                return None
+            raise
+
+    def exists(self, stack_name):
+        return self.status(stack_name) is not None
+
+    def record(self, stack_name, status):
+        with self.lock:
+            if self.index is not None:
+                if status is None or status == 'DELETE_COMPLETE':
+                    self.index.pop(stack_name, None)
+                else:
+                    self.index[stack_name] = status
+
+
+#### one inventory per region, shared by every deployment in the process
+_inventories = {}
+_inventories_lock = threading.Lock()
+
+
+def stack_inventory(region, clients=None):
+    clients = clients or cf_clients
+    with _inventories_lock:
+        inv = _inventories.get((id(clients), region))
+        if inv is None:
+            inv = _inventories[(id(clients), region)] = StackInventory(clients.get(region))
+        return inv
@@ -0,0 +1,135 @@
+#
+# Stack completion watcher
+#
+# Tracks many CloudFormation stacks at once and streams their state transitions
+# as they happen. Instead of one describe_stacks call per stack per tick, each
+# region is polled with a single paginated describe_stacks listing once more than
+# batch_threshold stacks are tracked there. The poll interval adapts: it resets
+# to min_interval after a transition, grows while nothing changes and doubles
+# when AWS throttles us.
+
+import time
+
+from .cf_deploy import cf_clients
+from .ratelimit import THROTTLE_CODES
+
+FAILED_SUFFIXES = ('_FAILED', 'ROLLBACK_COMPLETE')
+
+
+def is_final(status):
+    return not status.endswith('_IN_PROGRESS')
+
+
+def is_failed(status):
+    return status.endswith(FAILED_SUFFIXES)
+
+
+def _error_code(e):
+    return getattr(e, 'response', {}).get('Error', {}).get('Code', '')
+
+
+def print_transition(region, stack_name, old, new, reason):
+    print('%s %s: %s -> %s%s' % (region, stack_name, old or 'UNKNOWN', new, ' (' + reason + ')' if reason else ''))
+
+
+class StackWatcher(object):
+
+    def __init__(self, clients=None, min_interval=2.0, max_interval=30.0, batch_threshold=10,
+                 on_change=print_transition):
+        self.clients = clients or cf_clients
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.batch_threshold = batch_threshold
+        self.on_change = on_change
+        self.status = {}
+        self.pending = {}
+
+    def watch(self, region, stack_name, status=None):
+        self.status[(region, stack_name)] = status
+        self.pending.setdefault(region, set()).add(stack_name)
+
+    def _list_region(self, client):
+        # one paginated listing for every stack in the region
+        stacks = {}
+        kw = {}
+        while True:
+            resp = client.describe_stacks(**kw)
+            for s in resp['Stacks']:
+                stacks[s['StackName']] = s['StackStatus']
+            if not resp.get('NextToken'):
+                return stacks
+            kw['NextToken'] = resp['NextToken']
+
+    def _describe_one(self, client, stack_name):
+        try:
+            return client.describe_stacks(StackName=stack_name)['Stacks'][0]['StackStatus']
+        except Exception as e:
+            if _error_code(e) == 'ValidationError' and 'does not exist' in str(e):
+                return 'DELETE_COMPLETE'
+            raise
+
+    def _failure_reason(self, client, stack_name):
+        # only looked up for failed stacks, the first failed resource event carries the cause
+        try:
+            events = client.describe_stack_events(StackName=stack_name)['StackEvents']
+        except Exception:
+            return ''
+        for ev in events:
+            if ev.get('ResourceStatus', '').endswith('_FAILED') and ev.get('ResourceStatusReason'):
+                return '%s: %s' % (ev['LogicalResourceId'], ev['ResourceStatusReason'])
+        return ''
+
+    def poll(self):
+        # one round over every region with pending stacks, returns the number of transitions
+        changes = 0
+        for region, names in list(self.pending.items()):
+            client = self.clients.get(region)
+            if len(names) > self.batch_threshold:
+                listed = self._list_region(client)
+                # stacks gone from the listing have been deleted
+                current = {n: listed.get(n, 'DELETE_COMPLETE') for n in names}
+            else:
+                current = {n: self._describe_one(client, n) for n in names}
+            for name, new in current.items():
+                old = self.status[(region, name)]
+                if new == old:
+                    continue
+                changes += 1
+                self.status[(region, name)] = new
+                reason = self._failure_reason(client, name) if is_failed(new) else ''
+                if self.on_change:
+                    self.on_change(region, name, old, new, reason)
+                if is_final(new):
+                    names.discard(name)
+            if not names:
+                del self.pending[region]
+        return changes
+
+    def wait(self, timeout=3600):
+        # block until every watched stack reaches a final state, returns {(region, name): status}
+        deadline = time.monotonic() + timeout
+        interval = self.min_interval
+        while self.pending:
+            try:
+                interval = self.min_interval if self.poll() else min(interval * 1.5, self.max_interval)
+            except Exception as e:
+                if _error_code(e) not in THROTTLE_CODES:
+                    raise
+                interval = min(interval * 2, self.max_interval)
+            if not self.pending:
+                break
+            if time.monotonic() + interval > deadline:
+                raise RuntimeError('timed out waiting for stacks: ' + ', '.join(
+                    '%s/%s' % (r, n) for r, names in sorted(self.pending.items()) for n in sorted(names)))
+            time.sleep(interval)
+        return dict(self.status)
+
+
+def wait_deleted(region, stack_names, clients=None, timeout=1800):
+    watcher = StackWatcher(clients)
+    for name in stack_names:
+        watcher.watch(region, name, 'DELETE_IN_PROGRESS')
+    status = watcher.wait(timeout)
+    failed = [n for (r, n), s in status.items() if s != 'DELETE_COMPLETE']
+    if failed:
+        raise RuntimeError('stack delete failed: ' + ', '.join(failed))
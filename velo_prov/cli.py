@@ -0,0 +1,154 @@
+#
+# Command line entry point, also run by api_vco-aws-prov.py and python3 -m velo_prov
+#
+# Only the modules that argument parsing needs are imported up front; the
+# provisioning code, requests and boto3 are loaded once a run actually starts.
+
+import argparse
+import os
+
+from . import config
+from .fleet import DEFAULT_CONCURRENCY
+from .journal import DEFAULT_JOURNAL
+
+#### latency / retries / payload summary of every VCO and AWS call made during the run
+def report_metrics(args):
+	from .metrics import metrics
+	from .ratelimit import limiter
+	from .settings_cache import settings_cache
+	if(args.metrics):
+		metrics.print_summary()
+		limiter.print_summary()
+		settings_cache.print_summary()
+	if(args.metrics_json):
+		with open(args.metrics_json, 'w') as outfile:
+			outfile.write(metrics.to_json())
+	if(args.metrics_prom):
+		with open(args.metrics_prom, 'w') as outfile:
+			outfile.write(metrics.to_prometheus())
+
+#### JSON lines run log, written by a background thread
+def start_log(args):
+	from . import runlog
+	if(args.log_json):
+		runlog.setup(args.log_json,args.log_level,runlog.parse_sample(args.log_sample),args.quiet)
+
+def stop_log(args):
+	from . import runlog
+	if(args.log_json):
+		dropped = runlog.sampled_out()
+		runlog.shutdown()
+		if dropped:
+			print('%d call events sampled out of the run log' %(dropped))
+
+def run(args):
+        from . import aws, vco
+        from .journal import Journal
+        from .provision import provision_edge_steps, run_fleet_mode
+        config.vco_settings()
+        if(args.refresh_cache):
+        	vco.metadata_cache().clear()
+        if(args.reconcile):
+        	from .reconcile import run_reconcile
+        	run_reconcile(args.region or [config.CfRegion],args.prefix,args.fix,args.concurrency)
+        	return
+        journal = Journal(args.journal)
+        if(args.teardown):
+        	from .teardown import run_teardown
+        	run_teardown(args.region or [config.CfRegion],args.prefix,args.stack_prefix,journal,args.run_id,args.yes,args.concurrency)
+        	return
+        if(args.apply):
+        	from . import plan
+        	plan.apply_plan(plan.load_plan(args.apply),journal)
+        	return
+        if(args.fleet and args.plan):
+        	#### dry run: nothing is called, the plan is written for a later --apply
+        	from . import plan
+        	run_id = args.run_id or os.path.splitext(os.path.basename(args.fleet))[0]
+        	options = {'aws': args.aws, 'wait': args.wait, 'shared': args.shared_template, 'concurrency': args.concurrency,
+        		'aws_concurrency': args.pipeline, 'bulk': args.bulk, 'batch_size': args.batch_size}
+        	fleet_plan = plan.build_plan(args.fleet,options,journal,run_id)
+        	profile = plan.load_latency_profile(args.latency_profile) if args.latency_profile else None
+        	fleet_plan['estimate'] = plan.estimate(fleet_plan,profile)
+        	plan.save_plan(fleet_plan,args.plan)
+        	plan.print_plan(fleet_plan,fleet_plan['estimate'])
+        	print('Plan written to '+args.plan+', run it with --apply '+args.plan)
+        	return
+        if(args.fleet):
+        	run_id = args.run_id or os.path.splitext(os.path.basename(args.fleet))[0]
+        	bulk = None
+        	if(args.bulk):
+        		from .vco_bulk import BulkVco
+        		bulk = BulkVco(batch_size=args.batch_size,workers=args.concurrency)
+        	run_fleet_mode(args.fleet,args.concurrency,args.aws,args.wait,args.shared_template,journal,run_id,args.pipeline,bulk)
+        	return
+        run_id = args.run_id or 'single'
+        from .template import validate_target
+        errors = validate_target(config.CfRegion,config.region,None,config.DefaultInstanceType)
+        if errors:
+        	raise SystemExit('Invalid launch target: '+'; '.join(errors))
+        eid = vco.find_velo_enterpriseId()
+        pid = vco.create_velo_profile(eid,config.ProfileName)
+        #### same per-edge steps as fleet mode, baked template still written to File2Upload
+        edge = {'name': args.edge_name, 'contact_name': config.EdgeContactName, 'contact_email': config.EdgeContactEmail,
+        	'key_name': config.KeyName, 'stack_name': 'VELO-STACK-'+args.edge_name, 'region': config.CfRegion, 'az': config.region,
+        	'instance_type': config.DefaultInstanceType, 'cf_file': config.File2Upload}
+        provision_edge_steps(eid,pid,edge,args.aws,args.shared_template,journal,run_id)
+
+        ################ ////////////////// ##############################################
+        # AWS PART:
+        ################ ////////////////// ##############################################
+        if(args.aws):
+        	if(args.wait):
+        		aws.wait_for_stacks([(config.CfRegion,edge['stack_name'])])
+        else:
+            print("edge not provisioned in aws, use option -a if you want to deploy it")
+
+######################### Main Program #####################
+#### MAIN BODY
+######################### Main Program #####################
+def main():
+        parser = argparse.ArgumentParser()
+        parser.add_argument("-a", "--aws", action='store_true', help="Deploy CF stack in AWS",required=False)
+        parser.add_argument("-f", "--fleet", metavar="INVENTORY", help="Provision every edge listed in a CSV or YAML inventory",required=False)
+        parser.add_argument("-w", "--wait", action='store_true', help="Wait until the CF stacks finish creating",required=False)
+        parser.add_argument("-s", "--shared-template", action='store_true', help="Upload one parameterized CF template and pass edge values as stack parameters",required=False)
+        parser.add_argument("-r", "--reconcile", action='store_true', help="Compare the VCO edge list with the edge CF stacks and report drift",required=False)
+        parser.add_argument("--fix", action='store_true', help="Reconcile: delete orphan stacks and (re)create the stacks of never activated edges",required=False)
+        parser.add_argument("-t", "--teardown", action='store_true', help="Delete the CF stacks and VCO edges selected by --prefix, --stack-prefix or --run-id",required=False)
+        parser.add_argument("--yes", action='store_true', help="Teardown: delete the selection instead of only listing it",required=False)
+        parser.add_argument("--region", action='append', help="Reconcile / teardown: AWS region to look for stacks in, repeatable (default: "+config.CfRegion+")",required=False)
+        parser.add_argument("--prefix", help="Reconcile / teardown: only edges and stacks whose edge name starts with this",required=False)
+        parser.add_argument("--stack-prefix", help="Teardown: stacks whose name starts with this, and their edges",required=False)
+        parser.add_argument("-n", "--edge-name", default=config.EdgeName, help="Edge name in single edge mode, the stack is named VELO-STACK-<edge name>",required=False)
+        parser.add_argument("--run-id", help="Journal run id, rerunning with the same id resumes it (default: inventory file name, or 'single')",required=False)
+        parser.add_argument("--journal", default=DEFAULT_JOURNAL, help="SQLite file recording the completed steps of each edge",required=False)
+        parser.add_argument("-m", "--metrics", action='store_true', help="Print p50/p95/p99 latency, retries and payload sizes per VCO and AWS call",required=False)
+        parser.add_argument("--metrics-json", metavar="FILE", help="Write the call metrics as JSON",required=False)
+        parser.add_argument("--metrics-prom", metavar="FILE", help="Write the call metrics in Prometheus text format",required=False)
+        parser.add_argument("--refresh-cache", action='store_true', help="Ignore cached enterprise and profile ids and fetch them again",required=False)
+        parser.add_argument("-c", "--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Number of edges provisioned in parallel in fleet mode (VCO workers when pipelined)",required=False)
+        parser.add_argument("-p", "--pipeline", metavar="AWS_WORKERS", type=int, help="Fleet mode: run the VCO and AWS steps as pipeline stages, with this many AWS workers",required=False)
+        parser.add_argument("-b", "--bulk", action='store_true', help="Fleet mode: send the VCO calls of all edges in JSON-RPC batches (per-edge calls if the VCO takes no batches), then run the AWS steps with -p or -c workers",required=False)
+        parser.add_argument("--batch-size", type=int, default=50, help="Bulk mode: VCO calls per JSON-RPC batch; the rate limiter counts a batch as one request",required=False)
+        parser.add_argument("--plan", metavar="FILE", help="Fleet mode: write the VCO and AWS calls of the run and a wall clock estimate to FILE instead of running it",required=False)
+        parser.add_argument("--apply", metavar="FILE", help="Run the edges of a plan written by --plan, with the options it was made with",required=False)
+        parser.add_argument("--log-json", metavar="FILE", help="Write a JSON lines run log (run id, edge, step, duration per event) to FILE, - for stderr",required=False)
+        parser.add_argument("--log-level", default='INFO', choices=['DEBUG','INFO','WARNING','ERROR'], help="Run log level, DEBUG adds an event per VCO and AWS call",required=False)
+        parser.add_argument("--log-sample", metavar="LEVEL=RATE", action='append', help="Run log: keep only this fraction of the per-call events of a level, e.g. DEBUG=0.1, repeatable",required=False)
+        parser.add_argument("-q", "--quiet", action='store_true', help="With --log-json: what the fleet workers print goes to the run log instead of the console",required=False)
+        parser.add_argument("--latency-profile", metavar="FILE", help="Plan: --metrics-json file of an earlier run to price the calls with",required=False)
+
+        args = parser.parse_args()
+        if(args.teardown and len([s for s in (args.prefix,args.stack_prefix,args.run_id) if s]) != 1):
+        	parser.error("--teardown needs exactly one of --prefix, --stack-prefix or --run-id")
+        if(args.plan and not args.fleet):
+        	parser.error("--plan needs an inventory (-f)")
+        if(args.quiet and not args.log_json):
+        	parser.error("--quiet needs --log-json")
+        start_log(args)
+        try:
+        	run(args)
+        finally:
+        	report_metrics(args)
+        	stop_log(args)
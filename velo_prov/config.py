@@ -0,0 +1,102 @@
+#
+# Settings of the provisioning run
+#
+# The lab defaults below are plain constants. Everything taken from the environment
+# (VCO token, hostname, api url) is read on first use by vco_settings(), not at
+# import time, so --help and the offline tools work without a VCO configured.
+
+import os
+import sys
+
+########## VCO info and credentials
+# Prefer to use OS environments to hold token variable:
+#   VCO_TOKEN     user api token
+#   VCO_HOSTNAME  orchestrator fqdn, also written into the cf template
+#   VCO_URL       overrides the full api url, e.g. to run against velo_prov.fake_vco
+ProfileName = 'AWS-PROFILE'
+#### names are deterministic so a rerun finds the edge and stack of the previous run in the journal
+EdgeName = 'AWS-VCE-1'
+EdgeContactName = 'Vladimir'
+EdgeContactEmail = 'vfrancadesou-aws@vmware.com'
+
+######## AWS variable and inputs
+#aws ec2 keypair name
+#KeyName='AWS-EC2-FRA' ### must already exist
+KeyName = 'AWS-VIRG-KEY'
+BucketName = 'vm-velocf'
+File2Upload = 'new-velo-cf.json'
+CfRegion = 'us-east-1'  ### if CFRegion is different make sure to change region in the template as well
+region = "us-east-1b"
+
+#! make sure to watch to not duplicate VPC Subnets
+#### instance type decides the NIC layout the edge device settings are mapped to
+DefaultInstanceType = 'c4.xlarge'
+
+### EDGE contact information
+site = {
+    "contactName": EdgeContactName,
+    "contactEmail": EdgeContactEmail,
+    "streetAddress": None,
+    "streetAddress2": None,
+    "city": None,
+    "state": None,
+    "postalCode": None,
+    "country": None,
+    "lat": None,
+    "lon": None,
+    "timezone": None,
+    "locale": None,
+    "shippingSameAsLocation": 1,
+    "shippingContactName": None,
+    "shippingAddress": None,
+    "shippingAddress2": None,
+    "shippingCity": None,
+    "shippingState": None,
+    "shippingPostalCode": None,
+    "shippingCountry": None,
+    "modified": None
+}
+
+######## VCO API methods, relative to the api url
+get_enterprise = 'enterprise/getEnterprise'
+get_edgelist = 'enterprise/getEnterpriseEdgeList'
+get_edgeconfig = 'edge/getEdgeConfigurationStack'
+update_edgeconfig = 'configuration/updateConfigurationModule'
+edge_prov = 'edge/edgeProvision'
+get_profiles = 'enterprise/getEnterpriseConfigurationsPolicies'
+create_profile = 'configuration/cloneEnterpriseTemplate'
+delete_edge = 'edge/deleteEdge'
+#### safe to send again when an attempt may have reached the VCO (5xx, dropped connection);
+#### edgeProvision and cloneEnterpriseTemplate would create a second edge / profile
+idempotent_methods = (get_enterprise, get_edgelist, get_edgeconfig, update_edgeconfig, get_profiles, delete_edge)
+
+_settings = None
+
+
+def vco_settings():
+    """token, fqdn and url of the VCO, read from the environment on first use."""
+    global _settings
+    if _settings is None:
+        missing = [name for name in ('VCO_TOKEN', 'VCO_HOSTNAME') if not os.environ.get(name)]
+        if missing:
+            sys.exit('Missing environment variable(s): ' + ', '.join(missing))
+        fqdn = os.environ['VCO_HOSTNAME']
+        _settings = {'token': "Token %s" % (os.environ['VCO_TOKEN']), 'fqdn': fqdn,
+                     'url': os.environ.get('VCO_URL') or 'https://' + fqdn + '/portal/rest/'}
+    return _settings
+
+
+def endpoint(method):
+    return vco_settings()['url'] + method
+
+
+def portal_url():
+    """JSON-RPC endpoint of the VCO, the api url without its rest/ suffix."""
+    url = vco_settings()['url']
+    return url[:-len('rest/')] if url.endswith('rest/') else url
+
+
+def reset():
+    """Forget the settings so the next call reads the environment again."""
+    global _settings
+    _settings = None
@@ -0,0 +1,67 @@
+#
+# deviceSettings patch engine
+#
+# Computes a structural diff between the fetched and the desired configuration
+# module data, so an update is only sent when something actually differs, and
+# builds the updateConfigurationModule request without asking the VCO to echo
+# the whole module back (returnData).
+#
+# The v1 api replaces a module's data as a whole, so when there is a change the
+# request still carries the full desired data, compactly encoded. The diff is
+# what decides whether to call at all, and what gets reported.
+
+import json
+
+COMPACT = (',', ':')
+
+
+def _escape(key):
+    return str(key).replace('~', '~0').replace('/', '~1')
+
+
+def diff(old, new, path=''):
+    # list of (op, json pointer, value) with op in add / remove / replace
+    if type(old) is not type(new):
+        return [('replace', path, new)]
+    ops = []
+    if isinstance(old, dict):
+        for k, v in old.items():
+            p = path + '/' + _escape(k)
+            if k not in new:
+                ops.append(('remove', p, None))
+            elif v != new[k]:
+                ops.extend(diff(v, new[k], p))
+        for k, v in new.items():
+            if k not in old:
+                ops.append(('add', path + '/' + _escape(k), v))
+    elif isinstance(old, list):
+        for i in range(min(len(old), len(new))):
+            if old[i] != new[i]:
+                ops.extend(diff(old[i], new[i], '%s/%d' % (path, i)))
+        for i in range(len(old), len(new)):
+            ops.append(('add', '%s/%d' % (path, i), new[i]))
+        # removals from the tail backwards so the indexes stay valid when applied in order
+        for i in range(len(old) - 1, len(new) - 1, -1):
+            ops.append(('remove', '%s/%d' % (path, i), None))
+    elif old != new:
+        ops.append(('replace', path, new))
+    return ops
+
+
+def describe(ops, limit=10):
+    lines = ['%s %s' % (op, p or '/') for op, p, v in ops[:limit]]
+    if len(ops) > limit:
+        lines.append('... %d more' % (len(ops) - limit))
+    return ', '.join(lines)
+
+
+def module_update_params(module_id, old_data, new_data, name='deviceSettings'):
+    # returns (params, ops), params is None when the module is already in the desired state
+    ops = diff(old_data, new_data)
+    if not ops:
+        return None, ops
+    return {"id": module_id, "_update": {"data": new_data}, "name": name}, ops
+
+
+def payload_size(params):
+    return len(json.dumps(params, separators=COMPACT))
@@ -0,0 +1,195 @@
+#
+# In-memory stand-ins for the boto3 clients used by the provisioning code
+#
+# Just enough of the CloudFormation and S3 client apis for the deployment code to run
+# offline. Every call can be slowed down (latency) and a fraction of them rejected
+# with a Throttling error (throttle_rate), like an account hitting its api limits;
+# throttle_operations limits that to the named operations (e.g. {'DeleteStack'}).
+#
+# Pass StubAws().client_factory wherever a factory(service, region) is taken:
+#   engine = CfDeployEngine(RegionClients('cloudformation', StubAws().client_factory))
+
+import itertools
+import random
+import threading
+import time
+
+try:
+    from botocore.exceptions import ClientError
+except ImportError:
+    class ClientError(Exception):
+        # same shape as botocore's ClientError so callers can inspect response['Error']['Code']
+        def __init__(self, error_response, operation_name):
+            self.response = error_response
+            self.operation_name = operation_name
+            err = error_response.get('Error', {})
+            Exception.__init__(self, 'An error occurred (%s) when calling the %s operation: %s'
+                               % (err.get('Code'), operation_name, err.get('Message')))
+
+
+def _error(code, message, operation):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+class _StubClient(object):
+
+    def __init__(self, aws):
+        self.aws = aws
+
+    def _call(self, operation):
+        with self.aws.lock:
+            self.aws.calls[operation] = self.aws.calls.get(operation, 0) + 1
+            throttled = (self.aws.throttle_rate and (self.aws.throttle_operations is None or
+                                                     operation in self.aws.throttle_operations)
+                         and self.aws.random.random() < self.aws.throttle_rate)
+        if self.aws.latency:
+            time.sleep(self.aws.latency)
+        if throttled:
+            raise _error('Throttling', 'Rate exceeded', operation)
+
+
+class StubCloudFormation(_StubClient):
+
+    def __init__(self, aws, region):
+        _StubClient.__init__(self, aws)
+        self.region = region
+        self.stacks = {}
+
+    def create_stack(self, StackName, TemplateURL=None, Parameters=(), Tags=(), **kw):
+        self._call('CreateStack')
+        with self.aws.lock:
+            live = self.stacks.get(StackName)
+            if live and live['StackStatus'] != 'DELETE_COMPLETE':
+                raise _error('AlreadyExistsException', 'Stack [%s] already exists' % StackName, 'CreateStack')
+            stack_id = 'arn:aws:cloudformation:%s:123456789012:stack/%s/%d' % (
+                self.region, StackName, next(self.aws.ids))
+            self.stacks[StackName] = {'StackName': StackName, 'StackId': stack_id,
+                                      'StackStatus': 'CREATE_IN_PROGRESS', 'TemplateURL': TemplateURL,
+                                      'Parameters': list(Parameters), 'Tags': list(Tags), 'since': time.time()}
+        return {'StackId': stack_id}
+
+    def delete_stack(self, StackName):
+        self._call('DeleteStack')
+        with self.aws.lock:
+            stack = self.stacks.get(StackName)
+            if stack:
+                stack['StackStatus'] = 'DELETE_IN_PROGRESS'
+                stack['since'] = time.time()
+        return {}
+
+    def _advance(self):
+        # with settle_after set, in-progress stacks complete on their own after that many seconds
+        if self.aws.settle_after is None:
+            return
+        now = time.time()
+        for s in self.stacks.values():
+            if s['StackStatus'].endswith('_IN_PROGRESS') and now - s['since'] >= self.aws.settle_after:
+                s['StackStatus'] = s['StackStatus'].replace('_IN_PROGRESS', '_COMPLETE')
+
+    def _public(self, stack):
+        return {k: v for k, v in stack.items() if k != 'since'}
+
+    def describe_stacks(self, StackName=None, NextToken=None):
+        self._call('DescribeStacks')
+        with self.aws.lock:
+            self._advance()
+            if StackName is not None:
+                stack = self.stacks.get(StackName)
+                if stack is None or stack['StackStatus'] == 'DELETE_COMPLETE':
+                    raise _error('ValidationError', 'Stack with id %s does not exist' % StackName, 'DescribeStacks')
+                return {'Stacks': [self._public(stack)]}
+            live = [self._public(s) for s in self.stacks.values() if s['StackStatus'] != 'DELETE_COMPLETE']
+        # paged like the real api
+        start = int(NextToken or 0)
+        resp = {'Stacks': live[start:start + self.aws.page_size]}
+        if start + self.aws.page_size < len(live):
+            resp['NextToken'] = str(start + self.aws.page_size)
+        return resp
+
+    def list_stacks(self, StackStatusFilter=None, NextToken=None):
+        self._call('ListStacks')
+        with self.aws.lock:
+            self._advance()
+            summaries = [{'StackName': s['StackName'], 'StackId': s['StackId'], 'StackStatus': s['StackStatus']}
+                         for s in self.stacks.values()
+                         if not StackStatusFilter or s['StackStatus'] in StackStatusFilter]
+        start = int(NextToken or 0)
+        resp = {'StackSummaries': summaries[start:start + self.aws.page_size]}
+        if start + self.aws.page_size < len(summaries):
+            resp['NextToken'] = str(start + self.aws.page_size)
+        return resp
+
+    def describe_stack_events(self, StackName, NextToken=None):
+        self._call('DescribeStackEvents')
+        with self.aws.lock:
+            stack = self.stacks.get(StackName)
+            if stack is None:
+                raise _error('ValidationError', 'Stack [%s] does not exist' % StackName, 'DescribeStackEvents')
+            return {'StackEvents': [{'StackName': StackName, 'LogicalResourceId': StackName,
+                                     'ResourceType': 'AWS::CloudFormation::Stack',
+                                     'ResourceStatus': stack['StackStatus'], 'ResourceStatusReason': ''}]}
+
+    #### test helper: move every in-progress stack to its final state
+    def settle(self):
+        with self.aws.lock:
+            for s in self.stacks.values():
+                if s['StackStatus'].endswith('_IN_PROGRESS'):
+                    s['StackStatus'] = s['StackStatus'].replace('_IN_PROGRESS', '_COMPLETE')
+
+
+class StubS3(_StubClient):
+
+    def __init__(self, aws):
+        _StubClient.__init__(self, aws)
+        self.buckets = {}
+
+    def head_bucket(self, Bucket):
+        self._call('HeadBucket')
+        if Bucket not in self.buckets:
+            raise _error('404', 'Not Found', 'HeadBucket')
+        return {}
+
+    def create_bucket(self, Bucket, **kw):
+        self._call('CreateBucket')
+        with self.aws.lock:
+            self.buckets.setdefault(Bucket, {})
+        return {'Location': '/' + Bucket}
+
+    def head_object(self, Bucket, Key):
+        self._call('HeadObject')
+        if Key not in self.buckets.get(Bucket, {}):
+            raise _error('404', 'Not Found', 'HeadObject')
+        return {'ContentLength': len(self.buckets[Bucket][Key])}
+
+    def put_object(self, Bucket, Key, Body, **kw):
+        self._call('PutObject')
+        if Bucket not in self.buckets:
+            raise _error('NoSuchBucket', 'The specified bucket does not exist', 'PutObject')
+        with self.aws.lock:
+            self.buckets[Bucket][Key] = Body
+        return {'ETag': '"stub"'}
+
+
+class StubAws(object):
+
+    def __init__(self, latency=0.0, settle_after=None, page_size=100, throttle_rate=0.0, seed=None,
+                 throttle_operations=None):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.throttle_operations = throttle_operations
+        self.random = random.Random(seed)
+        self.settle_after = settle_after
+        self.page_size = page_size
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.calls = {}
+        self.clients = {}
+
+    def client_factory(self, service, region):
+        with self.lock:
+            if service == 'cloudformation':
+                return self.clients.setdefault((service, region), StubCloudFormation(self, region))
+            if service == 's3':
+                # buckets are global, every region shares one stub
+                return self.clients.setdefault((service, None), StubS3(self))
+        raise ValueError('no stub for service ' + service)
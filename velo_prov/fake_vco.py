@@ -0,0 +1,358 @@
+#
+# Local stand-in for the VCO rest api
+#
+# Implements the orchestrator methods used by the provisioning code with in-memory
+# state, so the provisioning path can be exercised without a live orchestrator:
+#   enterprise/getEnterprise, enterprise/getEnterpriseConfigurationsPolicies,
+#   configuration/cloneEnterpriseTemplate, edge/edgeProvision,
+#   edge/getEdgeConfigurationStack, configuration/updateConfigurationModule,
+#   enterprise/getEnterpriseEdgeList, edge/deleteEdge
+#
+# Latency and errors can be injected to model a distant or overloaded orchestrator:
+# every call sleeps latency +- jitter seconds (per-method overrides in method_latency),
+# and error_rate of the calls are answered with error_status (503 by default, or 429
+# with a Retry-After header) before any state changes. With rate_limit, calls over
+# that many per second are answered 429 with a Retry-After header.
+#
+# The same methods are served as JSON-RPC 2.0 on /portal/, a single request object
+# or, unless batch=False, an array of them answered with an array of responses in
+# one round trip. Injected latency, errors and the rate limit then apply to the
+# whole http request, state.requests counts the http requests of either api.
+#
+# Run standalone:  python3 -m velo_prov.fake_vco --port 8080 --latency 0.08 --error-rate 0.01
+# then point the script at it with VCO_URL=http://127.0.0.1:8080/portal/rest/
+# or embed it:      with FakeVco(latency=0.05) as fake: ... fake.url ...
+
+import argparse
+import json
+import random
+import threading
+import time
+from copy import deepcopy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ENTERPRISE_ID = 1
+
+
+def _interface(name):
+    return {"name": name, "disabled": False, "addressing": {"type": "DHCP", "cidrIp": None, "cidrPrefix": None,
+            "netmask": None, "gateway": None, "username": None, "password": None},
+            "wanOverlay": "AUTO_DISCOVERED", "natDirect": True, "advertise": False, "override": False,
+            "ospf": {"enabled": False, "area": "", "authentication": False, "authId": 0, "authPassphrase": "",
+                     "helloTimer": 10, "deadTimer": 40, "md5Authentication": False, "cost": 1, "MTU": 1380,
+                     "passiveInterface": True, "inboundRouteLearning": {"defaultAction": "LEARN", "filters": []},
+                     "outboundRouteAdvertisement": {"defaultAction": "IGNORE", "filters": []}},
+            "vlanId": None, "l2": {"autonegotiation": True, "speed": "100M", "duplex": "FULL", "MTU": 1500},
+            "underlayAccounting": True, "trusted": False, "rpf": "SPECIFIC", "subinterfaces": []}
+
+
+def device_settings_data():
+    # shape of a fresh virtual edge deviceSettings module, trimmed to what the script touches
+    return {
+        "lan": {"networks": [{"name": "Corporate", "vlanId": 1, "cidrIp": "10.0.1.1", "cidrPrefix": 24,
+                              "netmask": "255.255.255.0", "advertise": True, "override": False,
+                              "dhcp": {"enabled": True, "leaseTimeSeconds": 86400, "dhcpRelay": None,
+                                       "options": []}}],
+                "interfaces": [{"name": "GE%d" % n, "space": "lan", "disabled": False} for n in (1, 2)]},
+        "routedInterfaces": [_interface('GE3'), _interface('GE4'), _interface('GE5'), _interface('GE6')],
+        "dns": {"primaryProvider": {"ref": "deviceSettings:dns:primaryProvider"}},
+        "snmp": {"port": 161, "snmpv2c": {"enabled": False}},
+    }
+
+
+class FakeVcoState(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.next_id = 100
+        self.profiles = {10: {"id": 10, "name": "Quick Start Profile", "enterpriseId": ENTERPRISE_ID,
+                              "modified": "2021-01-01 00:00:00"}}
+        self.edges = {}
+        self.modules = {}
+        self.calls = {}
+        self.errors = {}
+        self.throttled = {}
+        self.requests = 0
+        self.batches = 0
+
+    def _new_id(self):
+        self.next_id += 1
+        return self.next_id
+
+    def _module(self, name, data):
+        mid = self._new_id()
+        self.modules[mid] = {"id": mid, "name": name, "data": data, "version": "0"}
+        return self.modules[mid]
+
+    #### one method per VCO endpoint, returning (status, body)
+    def get_enterprise(self, params):
+        return 200, {"id": ENTERPRISE_ID, "name": "Fake Enterprise", "domain": "fake.example"}
+
+    def get_profiles(self, params):
+        return 200, [dict(p) for p in self.profiles.values()]
+
+    def clone_template(self, params):
+        pid = self._new_id()
+        self.profiles[pid] = {"id": pid, "name": params['name'], "enterpriseId": params.get('id', ENTERPRISE_ID),
+                              "modified": "2021-01-01 00:00:00"}
+        return 200, {"id": pid}
+
+    def edge_provision(self, params):
+        if params.get('configurationId') not in self.profiles:
+            return 400, {"error": {"code": -32603, "message": "configurationId not found"}}
+        edid = self._new_id()
+        key = '%04X-%04X-%04X-%04X' % (edid, params['configurationId'], edid * 7 % 65536, edid * 13 % 65536)
+        settings = self._module('deviceSettings', device_settings_data())
+        self.edges[edid] = {"id": edid, "name": params['name'], "activationKey": key, "edgeState": "NEVER_ACTIVATED",
+                            "activationState": "UNASSIGNED", "modelNumber": params.get('modelNumber'),
+                            "configurationId": params['configurationId'], "site": params.get('site'),
+                            "deviceSettings": settings['id']}
+        return 200, {"id": edid, "activationKey": key}
+
+    def edge_config_stack(self, params):
+        edge = self.edges.get(params.get('edgeId'))
+        if edge is None:
+            return 400, {"error": {"code": -32603, "message": "edge not found"}}
+        profile = self.profiles[edge['configurationId']]
+        edge_profile = {"id": edge['id'] + 100000, "name": "Edge Specific Profile", "edgeId": edge['id'],
+                        "modules": [deepcopy(self.modules[edge['deviceSettings']])]}
+        ent_profile = {"id": profile['id'], "name": profile['name'], "modified": profile['modified'],
+                       "modules": [{"id": profile['id'] + 200000, "name": "deviceSettings", "version": "0",
+                                    "data": device_settings_data()}]}
+        return 200, [edge_profile, ent_profile]
+
+    def update_module(self, params):
+        module = self.modules.get(params.get('id'))
+        if module is None:
+            return 400, {"error": {"code": -32603, "message": "configuration module not found"}}
+        update = params.get('_update', {})
+        if 'data' in update:
+            module['data'] = update['data']
+        module['version'] = str(int(module['version']) + 1)
+        if str(params.get('returnData')).lower() == 'true':
+            return 200, deepcopy(module)
+        return 200, {"id": module['id'], "rows": 1}
+
+    def delete_edge(self, params):
+        # like the VCO, an unknown id is not an error, it just deletes no row
+        edge = self.edges.pop(params.get('id'), None)
+        if edge is not None:
+            self.modules.pop(edge['deviceSettings'], None)
+        return 200, [{"id": params.get('id'), "rows": 1 if edge else 0, "error": None}]
+
+    def edge_list(self, params):
+        # base edge rows, the site only with "with": ["site"]; paged like VCO 4.x when a limit is given
+        expand = params.get('with') or []
+        rows = []
+        for e in self.edges.values():
+            row = {k: e[k] for k in ('id', 'name', 'edgeState', 'activationState', 'activationKey',
+                                     'modelNumber', 'configurationId')}
+            row.update({"enterpriseId": ENTERPRISE_ID, "serialNumber": None, "softwareVersion": "3.3.1",
+                        "description": None, "created": "2021-01-01 00:00:00", "isLive": 0})
+            if 'site' in expand:
+                row['site'] = e['site']
+            rows.append(row)
+        limit = params.get('limit')
+        if not limit:
+            return 200, rows
+        start = int(params.get('nextPageLink') or 0)
+        more = start + limit < len(rows)
+        return 200, {"metaData": {"limit": limit, "more": more, "nextPageLink": str(start + limit) if more else None},
+                     "data": rows[start:start + limit]}
+
+
+METHODS = {
+    'enterprise/getEnterprise': FakeVcoState.get_enterprise,
+    'enterprise/getEnterpriseConfigurationsPolicies': FakeVcoState.get_profiles,
+    'configuration/cloneEnterpriseTemplate': FakeVcoState.clone_template,
+    'edge/edgeProvision': FakeVcoState.edge_provision,
+    'edge/getEdgeConfigurationStack': FakeVcoState.edge_config_stack,
+    'configuration/updateConfigurationModule': FakeVcoState.update_module,
+    'enterprise/getEnterpriseEdgeList': FakeVcoState.edge_list,
+    'edge/deleteEdge': FakeVcoState.delete_edge,
+}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out in separate writes, without this keep-alive clients stall on delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def _reply(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        if status == 429:
+            self.send_header('Retry-After', '1')
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        state = self.server.state
+        with state.lock:
+            state.requests += 1
+        if not self.headers.get('Authorization', '').startswith('Token '):
+            return self._reply(401, {"error": {"code": -32000, "message": "tokenError"}})
+        if self.path.rstrip('/') == '/portal':
+            return self._rpc(raw)
+        method = self.path.split('/portal/rest/', 1)[-1]
+        handler = METHODS.get(method)
+        if handler is None:
+            return self._reply(404, {"error": {"code": -32601, "message": "method not found: " + method}})
+        try:
+            params = json.loads(raw) if raw.strip() else {}
+        except ValueError:
+            return self._reply(400, {"error": {"code": -32700, "message": "parse error"}})
+        faults = self.server.faults
+        delay = faults.delay(method)
+        if delay:
+            time.sleep(delay)
+        with state.lock:
+            state.calls[method] = state.calls.get(method, 0) + 1
+            if faults.over_limit():
+                state.throttled[method] = state.throttled.get(method, 0) + 1
+                status, body = 429, {"error": {"code": -32000, "message": "rate limit exceeded"}}
+            elif faults.fail():
+                state.errors[method] = state.errors.get(method, 0) + 1
+                status, body = faults.error_status, {"error": {"code": -32603, "message": "injected error"}}
+            else:
+                status, body = handler(state, params)
+        self._reply(status, body)
+
+    #### JSON-RPC 2.0 on /portal/, one request object or a batch array
+    def _rpc(self, raw):
+        state = self.server.state
+        try:
+            body = json.loads(raw)
+        except ValueError:
+            return self._reply(400, {"jsonrpc": "2.0", "id": None, "error": {"code": -32700, "message": "parse error"}})
+        batch = isinstance(body, list)
+        if batch and (not self.server.batch or not body):
+            return self._reply(400, {"jsonrpc": "2.0", "id": None,
+                                     "error": {"code": -32600, "message": "invalid request"}})
+        faults = self.server.faults
+        delay = faults.delay('jsonrpc')
+        if delay:
+            time.sleep(delay)
+        with state.lock:
+            if faults.over_limit():
+                state.throttled['jsonrpc'] = state.throttled.get('jsonrpc', 0) + 1
+                return self._reply(429, {"jsonrpc": "2.0", "id": None,
+                                         "error": {"code": -32000, "message": "rate limit exceeded"}})
+            if faults.fail():
+                state.errors['jsonrpc'] = state.errors.get('jsonrpc', 0) + 1
+                return self._reply(faults.error_status, {"jsonrpc": "2.0", "id": None,
+                                                         "error": {"code": -32603, "message": "injected error"}})
+            if batch:
+                state.batches += 1
+            answers = [self._rpc_one(state, r) for r in (body if batch else [body])]
+        self._reply(200, answers if batch else answers[0])
+
+    def _rpc_one(self, state, request):
+        rid = request.get('id') if isinstance(request, dict) else None
+        handler = METHODS.get(request.get('method')) if isinstance(request, dict) else None
+        if handler is None:
+            return {"jsonrpc": "2.0", "id": rid, "error": {"code": -32601, "message": "method not found"}}
+        method = request['method']
+        state.calls[method] = state.calls.get(method, 0) + 1
+        status, body = handler(state, request.get('params') or {})
+        if status != 200:
+            return {"jsonrpc": "2.0", "id": rid, "error": body.get('error', {"code": -32603, "message": str(status)})}
+        return {"jsonrpc": "2.0", "id": rid, "result": body}
+
+
+class Faults(object):
+
+    def __init__(self, latency=0.0, jitter=0.0, method_latency=None, error_rate=0.0, error_status=503, seed=None,
+                 rate_limit=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.method_latency = method_latency or {}
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        # calls per second accepted over all methods, like the per-user api limit of a VCO
+        self.rate_limit = rate_limit
+        self.tokens = rate_limit or 0.0
+        self.updated = time.monotonic()
+
+    def delay(self, method):
+        base = self.method_latency.get(method, self.latency)
+        if self.jitter:
+            base += self.random.uniform(-self.jitter, self.jitter)
+        return max(base, 0.0)
+
+    def fail(self):
+        return self.error_rate > 0 and self.random.random() < self.error_rate
+
+    def over_limit(self):
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        self.tokens = min(self.rate_limit, self.tokens + (now - self.updated) * self.rate_limit)
+        self.updated = now
+        if self.tokens < 1:
+            return True
+        self.tokens -= 1
+        return False
+
+
+class FakeVco(object):
+
+    def __init__(self, host='127.0.0.1', port=0, batch=True, **faults):
+        self.state = FakeVcoState()
+        self.faults = Faults(**faults)
+        self.server = ThreadingHTTPServer((host, port), _Handler)
+        self.server.daemon_threads = True
+        self.server.batch = batch
+        self.server.state = self.state
+        self.server.faults = self.faults
+        self.thread = None
+
+    @property
+    def hostname(self):
+        return '%s:%d' % self.server.server_address[:2]
+
+    @property
+    def url(self):
+        return 'http://%s/portal/rest/' % self.hostname
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default='127.0.0.1')
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="+- seconds of random latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls that fail")
+    parser.add_argument("--error-status", type=int, default=503, help="http status of injected failures")
+    parser.add_argument("--rate-limit", type=float, help="calls per second accepted, the rest get 429")
+    parser.add_argument("--no-batch", action='store_true', help="reject JSON-RPC batch requests")
+    args = parser.parse_args()
+    fake = FakeVco(args.host, args.port, not args.no_batch, latency=args.latency, jitter=args.jitter,
+                   error_rate=args.error_rate, error_status=args.error_status, rate_limit=args.rate_limit)
+    print('Fake VCO listening on ' + fake.url)
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        fake.stop()
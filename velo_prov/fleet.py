@@ -0,0 +1,137 @@
+#
+# Fleet mode helpers
+#
+# Reads an inventory of edges (CSV or YAML) and runs the per-edge provisioning
+# pipeline on a bounded worker pool, collecting a result row with timings per edge.
+#
+# Inventory columns / keys (only "name" is mandatory, the rest fall back to the
+# script defaults):
+#   name, contact_name, contact_email, key_name, stack_name, region, az, instance_type,
+#   software_version
+
+import csv
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import runlog
+from .pipeline import Pipeline
+
+DEFAULT_CONCURRENCY = 8
+INVENTORY_FIELDS = ('name', 'contact_name', 'contact_email', 'key_name', 'stack_name', 'region', 'az',
+                    'instance_type', 'software_version')
+
+
+######## INVENTORY
+def _read_yaml(path):
+    try:
+        import yaml
+    except ImportError:
+        raise SystemExit('PyYAML is required to read YAML inventories (pip install pyyaml)')
+    with open(path) as f:
+        data = yaml.safe_load(f) or []
+    # accept either a plain list of edges or {"edges": [...]}
+    if isinstance(data, dict):
+        data = data.get('edges', [])
+    return data
+
+
+def _read_csv(path):
+    with open(path, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def load_inventory(path, defaults=None):
+    defaults = defaults or {}
+    ext = os.path.splitext(path)[1].lower()
+    if ext in ('.yml', '.yaml'):
+        rows = _read_yaml(path)
+    else:
+        rows = _read_csv(path)
+
+    edges = []
+    seen = set()
+    for n, row in enumerate(rows, 1):
+        edge = {}
+        for field in INVENTORY_FIELDS:
+            value = row.get(field)
+            if isinstance(value, str):
+                value = value.strip()
+            edge[field] = value if value not in (None, '') else defaults.get(field)
+        if not edge['name']:
+            raise ValueError('%s: entry %d has no edge name' % (path, n))
+        if edge['name'] in seen:
+            raise ValueError('%s: edge %s is listed more than once' % (path, edge['name']))
+        seen.add(edge['name'])
+        if not edge['stack_name']:
+            edge['stack_name'] = 'VELO-STACK-' + edge['name']
+        edges.append(edge)
+    return edges
+
+
+######## WORKER POOL
+def _run_one(worker, edge):
+    start = time.monotonic()
+    result = {'name': edge['name'], 'status': 'ok', 'error': ''}
+    try:
+        result.update(worker(edge) or {})
+    # the VCO functions call sys.exit() on errors, keep that from killing the whole run
+    except (Exception, SystemExit) as e:
+        result['status'] = 'failed'
+        result['error'] = str(e) or e.__class__.__name__
+    result['seconds'] = time.monotonic() - start
+    _log_edge(result)
+    return result
+
+
+def _log_edge(result):
+    failed = result['status'] != 'ok'
+    runlog.event(runlog.edges, runlog.WARNING if failed else runlog.INFO, 'edge ' + result['status'],
+                 edge=result['name'], duration_s=round(result['seconds'], 4), error=result['error'] or None)
+
+
+def run_fleet(edges, worker, concurrency=DEFAULT_CONCURRENCY):
+    # worker(edge) runs the whole pipeline for one edge and returns a dict of extra result columns
+    # results come back in inventory order
+    if concurrency < 1:
+        raise ValueError('concurrency must be at least 1')
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(_run_one, worker, edge) for edge in edges]
+        return [f.result() for f in futures]
+
+
+def run_pipeline(edges, stages, queue_size=None):
+    # stages are pipeline.Stage objects, the first one gets the inventory entry and
+    # the last one returns the extra result columns, each stage's time gets its own column
+    results = []
+    for edge, r in zip(edges, Pipeline(stages, queue_size).run(edges)):
+        result = {'name': edge['name'], 'status': 'failed' if r['error'] else 'ok',
+                  'error': '%s: %s' % (r['stage'], r['error']) if r['error'] else ''}
+        result.update(r['value'] or {})
+        for stage, seconds in r['timings'].items():
+            result[stage + '_s'] = seconds
+        result['seconds'] = sum(r['timings'].values())
+        _log_edge(result)
+        results.append(result)
+    return results
+
+
+def print_table(results, columns):
+    rows = []
+    for r in results:
+        row = []
+        for c in columns:
+            v = r.get(c, '')
+            row.append('%.2f' % v if isinstance(v, float) else str(v if v is not None else ''))
+        rows.append(row)
+    widths = [max([len(c)] + [len(row[i]) for row in rows]) for i, c in enumerate(columns)]
+    print('  '.join(c.upper().ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print('  '.join(v.ljust(w) for v, w in zip(row, widths)))
+
+
+def print_results_table(results, columns=('name', 'status', 'edge_id', 'stack_name', 'seconds', 'error')):
+    print_table(results, columns)
+    ok = sum(1 for r in results if r['status'] == 'ok')
+    total = sum(r['seconds'] for r in results)
+    print('%d/%d edges provisioned, %.2fs of edge time' % (ok, len(results), total))
@@ -0,0 +1,114 @@
+#
+# Declarative interface mapping for the edge deviceSettings
+#
+# What change_edge_config used to hardcode (VLAN1 address, GE1/GE2/GE3 roles) is
+# described as a spec per NIC layout, and each AWS instance type points at the
+# layout it is deployed with. A spec is compiled once into a transform that
+# updates a deviceSettings data dict in place in a single pass: the routed
+# interfaces are indexed by name once, existing interfaces are updated in place
+# and only interfaces that have to be created are copied (one deepcopy each).
+# Applying a transform twice gives the same result as applying it once.
+#
+# Spec format:
+#   lan_networks:  [{"index": n, "set": {field: value}}]
+#   interfaces:    [{"name": "GEx", "copy_from": "GEy", "position": p, "set": {field: value}}]
+# Fields may be dotted paths ("dhcp.enabled"). copy_from / position only matter
+# when the interface does not exist yet; the copy is taken from the source after
+# its own "set" has been applied.
+
+from copy import deepcopy
+
+#### 3 NICs, as created by the velocf template: GE1 management, GE2 WAN, GE3 LAN
+THREE_NIC = {
+    "lan_networks": [
+        {"index": 0, "set": {"cidrIp": "127.0.0.10", "advertise": False, "cidrPrefix": "30",
+                             "netmask": "255.255.255.252", "dhcp.enabled": False}},
+    ],
+    "interfaces": [
+        {"name": "GE3", "set": {"override": True, "advertise": True, "natDirect": False,
+                                "wanOverlay": "DISABLED"}},
+        {"name": "GE1", "copy_from": "GE3", "position": 0},
+        {"name": "GE2", "copy_from": "GE3", "position": 1,
+         "set": {"override": True, "advertise": False, "natDirect": True, "wanOverlay": "AUTO_DISCOVERED"}},
+    ],
+}
+
+LAYOUTS = {"3nic": THREE_NIC}
+
+# every instance type allowed by the template's EC2InstanceType parameter
+INSTANCE_LAYOUTS = {
+    "c4.large": "3nic", "c4.xlarge": "3nic", "c4.2xlarge": "3nic", "c4.4xlarge": "3nic",
+    "c5.large": "3nic", "c5.xlarge": "3nic", "c5.2xlarge": "3nic", "c5.4xlarge": "3nic",
+}
+
+
+def _compile_set(fields):
+    return [(tuple(k.split('.')), v) for k, v in sorted((fields or {}).items())]
+
+
+def _apply_set(target, compiled):
+    for path, value in compiled:
+        obj = target
+        for key in path[:-1]:
+            obj = obj.setdefault(key, {})
+        obj[path[-1]] = value
+
+
+class InterfaceTransform(object):
+
+    def __init__(self, spec):
+        self.lan = [(rule['index'], _compile_set(rule.get('set'))) for rule in spec.get('lan_networks', [])]
+        self.interfaces = []
+        for rule in spec.get('interfaces', []):
+            self.interfaces.append((rule['name'], rule.get('copy_from'), rule.get('position'),
+                                    _compile_set(rule.get('set'))))
+
+    def apply(self, data):
+        networks = data['lan']['networks']
+        for index, compiled in self.lan:
+            _apply_set(networks[index], compiled)
+
+        routed = data['routedInterfaces']
+        by_name = {iface['name']: iface for iface in routed}
+        inserts = []
+        for name, copy_from, position, compiled in self.interfaces:
+            iface = by_name.get(name)
+            if iface is None:
+                if copy_from is None:
+                    raise KeyError('interface %s not found and no copy_from given' % name)
+                iface = deepcopy(by_name[copy_from])
+                iface['name'] = name
+                by_name[name] = iface
+                inserts.append((len(routed) if position is None else position, iface))
+            _apply_set(iface, compiled)
+
+        if inserts:
+            # rebuild the list once instead of one list.insert per new interface
+            inserts.sort(key=lambda item: item[0])
+            out = []
+            existing = iter(routed)
+            for position, iface in inserts:
+                while len(out) < position:
+                    nxt = next(existing, None)
+                    if nxt is None:
+                        break
+                    out.append(nxt)
+                out.append(iface)
+            out.extend(existing)
+            data['routedInterfaces'] = out
+        return data
+
+
+_compiled = {}
+
+
+def transform_for_layout(layout):
+    if layout not in _compiled:
+        _compiled[layout] = InterfaceTransform(LAYOUTS[layout])
+    return _compiled[layout]
+
+
+def transform_for_instance(instance_type):
+    if instance_type not in INSTANCE_LAYOUTS:
+        raise KeyError('no interface layout for instance type ' + instance_type)
+    return transform_for_layout(INSTANCE_LAYOUTS[instance_type])
@@ -0,0 +1,68 @@
+#
+# Local state journal for resumable provisioning runs
+#
+# Every completed step of an edge (provision, config, template, stack) is written
+# to a SQLite file together with its outputs (edge id, activation key, module id,
+# template url, stack id). Rerunning with the same run id reads them back and
+# skips what is already done, instead of creating a second edge and stack.
+#
+# Rows are keyed by (run id, edge name, step); recording a step again replaces it.
+
+import json
+import sqlite3
+import threading
+import time
+
+DEFAULT_JOURNAL = 'velo-prov-journal.db'
+
+STEPS = ('provision', 'config', 'template', 'stack')
+
+
+class Journal(object):
+
+    def __init__(self, path=DEFAULT_JOURNAL):
+        self.path = path
+        self.lock = threading.Lock()
+        # shared by the fleet workers, every access goes through the lock
+        self.db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS steps ('
+                        ' run_id TEXT NOT NULL, edge TEXT NOT NULL, step TEXT NOT NULL,'
+                        ' outputs TEXT NOT NULL, ts REAL NOT NULL,'
+                        ' PRIMARY KEY (run_id, edge, step))')
+
+    def record(self, run_id, edge, step, **outputs):
+        with self.lock:
+            self.db.execute('INSERT OR REPLACE INTO steps VALUES (?, ?, ?, ?, ?)',
+                            (run_id, edge, step, json.dumps(outputs), time.time()))
+
+    def steps(self, run_id, edge):
+        # {step: outputs} for the completed steps of one edge
+        with self.lock:
+            rows = self.db.execute('SELECT step, outputs FROM steps WHERE run_id = ? AND edge = ?',
+                                   (run_id, edge)).fetchall()
+        return {step: json.loads(outputs) for step, outputs in rows}
+
+    def edges(self, run_id):
+        # {edge: merged outputs of all its steps}
+        with self.lock:
+            rows = self.db.execute('SELECT edge, outputs FROM steps WHERE run_id = ? ORDER BY edge, ts',
+                                   (run_id,)).fetchall()
+        result = {}
+        for edge, outputs in rows:
+            result.setdefault(edge, {}).update(json.loads(outputs))
+        return result
+
+    def runs(self):
+        with self.lock:
+            return [r[0] for r in self.db.execute('SELECT DISTINCT run_id FROM steps ORDER BY run_id')]
+
+    def forget(self, run_id, edge=None):
+        with self.lock:
+            if edge is None:
+                self.db.execute('DELETE FROM steps WHERE run_id = ?', (run_id,))
+            else:
+                self.db.execute('DELETE FROM steps WHERE run_id = ? AND edge = ?', (run_id, edge))
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,238 @@
+#
+# Streaming extraction from large VCO answers
+#
+# getEdgeConfigurationStack and getEnterpriseConfigurationsPolicies can run into
+# megabytes on big enterprises, and .json() keeps the raw body, its text and the
+# whole parsed document in memory at once, per worker. The functions below read a
+# streamed response (post(..., stream=True)) chunk by chunk and only build what
+# the caller needs:
+#   edge_module(resp, name)   a module of the first (edge specific) profile of the
+#                             configuration stack, parsing stops once it is found
+#   id_name_pairs(resp)       [{id, name}] of a profile list, one profile at a time
+#
+# ijson is used when installed (pip install 'ijson>=3.1'). Without it a small scanner
+# walks the outer arrays / objects itself and decodes one value at a time with the
+# stdlib json raw_decode, so at most one module or profile is held as objects.
+
+import codecs
+import json
+
+CHUNK_SIZE = 64 * 1024
+# set to False to always use the stdlib scanner
+USE_IJSON = True
+
+_ijson = None
+
+
+def _backend():
+    global _ijson
+    if _ijson is None:
+        try:
+            import ijson
+            _ijson = ijson
+        except ImportError:
+            _ijson = False
+    return _ijson if USE_IJSON else False
+
+
+def _check(resp, what):
+    # error answers are small json objects, read them whole for the message
+    if resp.status_code >= 400:
+        try:
+            message = resp.json().get('error', {}).get('message')
+        except (ValueError, AttributeError):
+            message = None
+        raise RuntimeError('%s failed: %s' % (what, message or 'HTTP %d' % resp.status_code))
+
+
+class _Chunks(object):
+    # file-like read() over the body chunks of a streamed response
+
+    def __init__(self, resp):
+        self.chunks = resp.iter_content(CHUNK_SIZE)
+        self.rest = b''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.rest) < size:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                break
+            self.rest += chunk
+        if size < 0:
+            data, self.rest = self.rest, b''
+        else:
+            data, self.rest = self.rest[:size], self.rest[size:]
+        return data
+
+
+######## STDLIB SCANNER
+# characters that can still follow the part of a number raw_decode has accepted
+_NUMBER_TAIL = '0123456789.eE+-'
+
+
+class _Scanner(object):
+    # walks arrays and objects token by token, values are decoded whole with raw_decode
+
+    def __init__(self, reader):
+        self.reader = reader
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json = json.JSONDecoder()
+        self.buf = ''
+        self.pos = 0
+        self.eof = False
+
+    def _more(self, want):
+        # read until want more characters are buffered past pos, or the body ends
+        if self.pos > len(self.buf) // 2:
+            self.buf, self.pos = self.buf[self.pos:], 0
+        while not self.eof and len(self.buf) - self.pos < want:
+            data = self.reader.read(CHUNK_SIZE)
+            if not data:
+                self.eof = True
+                self.buf += self.decoder.decode(b'', True)
+            else:
+                self.buf += self.decoder.decode(data)
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                raise ValueError('unexpected end of JSON')
+            self._more(1)
+
+    def expect(self, chars):
+        c = self.peek()
+        if c not in chars:
+            raise ValueError('expected %s at %r' % (' or '.join(chars), self.buf[self.pos:self.pos + 40]))
+        self.pos += 1
+        return c
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.json.raw_decode(self.buf, self.pos)
+                # a number may continue in the next chunk: at the buffer end, or cut before
+                # its fraction / exponent ('37.' of 37.25, '1e' of 1e5 decode as 37 and 1)
+                if self.eof or (end < len(self.buf) and self.buf[end] not in _NUMBER_TAIL):
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            # grow the window geometrically so a big value is retried O(log n) times, not once per chunk
+            self._more(max(2 * (len(self.buf) - self.pos), CHUNK_SIZE))
+
+    def array(self):
+        # yields once per element, the caller consumes it (value(), array() or members())
+        self.expect('[')
+        if self.peek() == ']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.expect(',]') == ']':
+                return
+
+    def members(self):
+        # yields each key, the caller consumes its value
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+
+def _scan_edge_module(reader, name):
+    scanner = _Scanner(reader)
+    for _ in scanner.array():
+        for key in scanner.members():
+            if key != 'modules':
+                scanner.value()
+                continue
+            for _ in scanner.array():
+                module = scanner.value()
+                if module.get('name') == name:
+                    return module
+        # only the first profile is the edge's own
+        return None
+    return None
+
+
+def _scan_id_name_pairs(reader):
+    scanner = _Scanner(reader)
+    for _ in scanner.array():
+        p = scanner.value()
+        yield {'id': p['id'], 'name': p['name']}
+
+
+######## IJSON
+def _ijson_edge_module(ijson, reader, name):
+    # modules are built from the parse events, a module whose name comes up different
+    # is dropped on the spot (the VCO sends name before data) and its events skipped
+    builder, skip = None, False
+    for prefix, event, value in ijson.parse(reader, use_float=True):
+        if prefix == '' and event not in ('start_array', 'end_array'):
+            raise ValueError('expected a JSON array')
+        if prefix == 'item' and event == 'end_map':
+            return None
+        if prefix == 'item.modules.item' and event == 'start_map':
+            builder, skip = ijson.ObjectBuilder(), False
+        elif skip:
+            if prefix == 'item.modules.item' and event == 'end_map':
+                skip = False
+            continue
+        elif builder is None:
+            continue
+        elif prefix == 'item.modules.item.name' and value != name:
+            builder, skip = None, True
+            continue
+        builder.event(event, value)
+        if prefix == 'item.modules.item' and event == 'end_map':
+            if builder.value.get('name') == name:
+                return builder.value
+            builder = None
+    return None
+
+
+def _ijson_id_name_pairs(ijson, reader):
+    # profiles are small, building each one in ijson's C backend beats filtering its events in python
+    for p in ijson.items(reader, 'item', use_float=True):
+        yield {'id': p['id'], 'name': p['name']}
+
+
+######## API
+def edge_module(resp, name='deviceSettings'):
+    """The named module of the edge specific profile of a streamed getEdgeConfigurationStack answer."""
+    _check(resp, 'getEdgeConfigurationStack')
+    ijson = _backend()
+    reader = _Chunks(resp)
+    try:
+        module = _ijson_edge_module(ijson, reader, name) if ijson else _scan_edge_module(reader, name)
+        # the rest of the stack is read and thrown away unparsed, so the keep-alive connection goes back to the pool
+        for _ in reader.chunks:
+            pass
+    finally:
+        resp.close()
+    if module is None:
+        raise KeyError('no %s module in the edge configuration stack' % name)
+    return module
+
+
+def id_name_pairs(resp):
+    """[{id, name}] of a streamed profile list answer."""
+    _check(resp, 'getEnterpriseConfigurationsPolicies')
+    ijson = _backend()
+    try:
+        reader = _Chunks(resp)
+        return list(_ijson_id_name_pairs(ijson, reader) if ijson else _scan_id_name_pairs(reader))
+    finally:
+        resp.close()
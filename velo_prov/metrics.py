@@ -0,0 +1,164 @@
+#
+# Per-call latency instrumentation
+#
+# Records latency, retries, errors and payload sizes for every VCO endpoint
+# (vco_client.VcoClient) and every boto3 call made through the shared client
+# factories (cf_deploy / s3_store), and reports p50/p95/p99 per call at the end
+# of a run, as a table, JSON or Prometheus text exposition format.
+#
+# Samples are kept per call name: a run makes at most a few thousand calls per
+# endpoint, so exact percentiles are cheaper than maintaining a sketch.
+
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+from . import runlog
+
+# upper bounds in seconds for the Prometheus histogram buckets
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def percentile(sorted_samples, q):
+    if not sorted_samples:
+        return 0.0
+    # nearest rank
+    k = int(math.ceil(q / 100.0 * len(sorted_samples))) - 1
+    return sorted_samples[max(0, min(k, len(sorted_samples) - 1))]
+
+
+class Metrics(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = {}
+        self.started = time.time()
+
+    def _entry(self, name):
+        entry = self.calls.get(name)
+        if entry is None:
+            entry = self.calls[name] = {'latency': [], 'retries': 0, 'errors': 0,
+                                        'request_bytes': 0, 'response_bytes': 0}
+        return entry
+
+    def observe(self, name, seconds, retries=0, request_bytes=0, response_bytes=0, error=False):
+        with self.lock:
+            entry = self._entry(name)
+            entry['latency'].append(seconds)
+            entry['retries'] += retries
+            entry['errors'] += 1 if error else 0
+            entry['request_bytes'] += request_bytes
+            entry['response_bytes'] += response_bytes
+        runlog.event(runlog.calls, runlog.WARNING if error else runlog.DEBUG, 'call', call=name,
+                     duration_s=round(seconds, 4), retries=retries, error=error)
+
+    @contextmanager
+    def timed(self, name):
+        start = time.monotonic()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.observe(name, time.monotonic() - start, error=error)
+
+    def reset(self):
+        with self.lock:
+            self.calls = {}
+            self.started = time.time()
+
+    #### boto3: time every api call of a client through botocore's event hooks
+    def instrument_boto3(self, client):
+        service = client.meta.service_model.service_name
+        events = client.meta.events
+
+        def before_call(context, **kw):
+            context['metrics_start'] = time.monotonic()
+            context['metrics_attempts'] = 0
+            context['metrics_request_bytes'] = 0
+
+        def before_send(request, **kw):
+            # fires once per attempt, so it also counts the retries
+            ctx = getattr(request, 'context', None)
+            if ctx is not None and 'metrics_start' in ctx:
+                ctx['metrics_attempts'] += 1
+                body = request.body or b''
+                ctx['metrics_request_bytes'] += len(body) if not hasattr(body, 'read') else 0
+
+        def after_call(http_response, parsed, model, context, **kw):
+            if 'metrics_start' not in context:
+                return
+            status = getattr(http_response, 'status_code', 200)
+            self.observe('%s.%s' % (service, model.name), time.monotonic() - context['metrics_start'],
+                         retries=max(context['metrics_attempts'] - 1, 0),
+                         request_bytes=context['metrics_request_bytes'],
+                         response_bytes=int(getattr(http_response, 'headers', {}).get('content-length') or 0),
+                         error=status >= 400 or 'Error' in (parsed or {}))
+
+        events.register('before-call.*.*', before_call)
+        events.register('before-send.*.*', before_send)
+        events.register('after-call.*.*', after_call)
+        return client
+
+    #### reports
+    def summary(self):
+        rows = []
+        with self.lock:
+            items = [(name, dict(entry, latency=sorted(entry['latency']))) for name, entry in self.calls.items()]
+        for name, entry in sorted(items):
+            lat = entry['latency']
+            rows.append({'call': name, 'count': len(lat), 'errors': entry['errors'], 'retries': entry['retries'],
+                         'total_s': sum(lat), 'p50_s': percentile(lat, 50), 'p95_s': percentile(lat, 95),
+                         'p99_s': percentile(lat, 99), 'max_s': lat[-1] if lat else 0.0,
+                         'request_bytes': entry['request_bytes'], 'response_bytes': entry['response_bytes']})
+        return rows
+
+    def print_summary(self):
+        rows = self.summary()
+        if not rows:
+            return
+        width = max(len(r['call']) for r in rows)
+        print('%s %6s %6s %7s %9s %9s %9s %9s %11s %11s' % ('CALL'.ljust(width), 'COUNT', 'ERRORS', 'RETRIES',
+              'TOTAL s', 'P50 ms', 'P95 ms', 'P99 ms', 'SENT B', 'RECV B'))
+        for r in sorted(rows, key=lambda r: -r['total_s']):
+            print('%s %6d %6d %7d %9.2f %9.1f %9.1f %9.1f %11d %11d' % (
+                r['call'].ljust(width), r['count'], r['errors'], r['retries'], r['total_s'],
+                r['p50_s'] * 1000, r['p95_s'] * 1000, r['p99_s'] * 1000, r['request_bytes'], r['response_bytes']))
+
+    def to_json(self):
+        return json.dumps({'started': self.started, 'elapsed_s': time.time() - self.started,
+                           'calls': self.summary()}, indent=1)
+
+    def to_prometheus(self):
+        lines = ['# HELP velo_prov_call_seconds Latency of VCO and AWS api calls',
+                 '# TYPE velo_prov_call_seconds histogram']
+        with self.lock:
+            items = sorted((name, sorted(e['latency'])) for name, e in self.calls.items())
+            counters = dict((name, e) for name, e in self.calls.items())
+        for name, lat in items:
+            label = 'call="%s"' % name
+            n = 0
+            for bound in BUCKETS:
+                while n < len(lat) and lat[n] <= bound:
+                    n += 1
+                lines.append('velo_prov_call_seconds_bucket{%s,le="%s"} %d' % (label, bound, n))
+            lines.append('velo_prov_call_seconds_bucket{%s,le="+Inf"} %d' % (label, len(lat)))
+            lines.append('velo_prov_call_seconds_sum{%s} %f' % (label, sum(lat)))
+            lines.append('velo_prov_call_seconds_count{%s} %d' % (label, len(lat)))
+        for metric, key, text in (('velo_prov_call_retries_total', 'retries', 'Retried attempts'),
+                                  ('velo_prov_call_errors_total', 'errors', 'Failed calls'),
+                                  ('velo_prov_call_request_bytes_total', 'request_bytes', 'Request payload bytes'),
+                                  ('velo_prov_call_response_bytes_total', 'response_bytes', 'Response payload bytes')):
+            lines.append('# HELP %s %s' % (metric, text))
+            lines.append('# TYPE %s counter' % metric)
+            for name, _ in items:
+                lines.append('%s{call="%s"} %d' % (metric, name, counters[name][key]))
+        return '\n'.join(lines) + '\n'
+
+
+#### process wide registry used by the clients
+metrics = Metrics()
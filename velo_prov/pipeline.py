@@ -0,0 +1,87 @@
+#
+# Staged pipeline connected by bounded queues
+#
+# Each stage has its own worker threads, so every stage gets its own concurrency
+# limit (VCO rate limits and AWS throttling are respected separately), and an
+# item moves on to the next stage as soon as it leaves the previous one: edge N's
+# stack can be launching while edge N+1 is still being provisioned on the VCO.
+# Throughput is bounded by the slowest stage instead of the sum of all stages.
+# The bounded queues give backpressure, a fast stage cannot run far ahead of a
+# slow one.
+#
+# An item that fails in a stage skips the remaining stages and is reported with
+# the failing stage name.
+
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+class Stage(object):
+
+    def __init__(self, name, fn, workers=1):
+        if workers < 1:
+            raise ValueError('stage %s needs at least one worker' % name)
+        self.name = name
+        self.fn = fn
+        self.workers = workers
+
+
+class Pipeline(object):
+
+    def __init__(self, stages, queue_size=None):
+        self.stages = list(stages)
+        self.queue_size = queue_size
+
+    def run(self, items):
+        # returns one result per item in input order:
+        # {'value': output of the last stage, 'error': '', 'stage': failing stage or '', 'timings': {stage: s}}
+        items = list(items)
+        results = [None] * len(items)
+        queues = [queue.Queue(maxsize=self.queue_size or max(s.workers, 1) * 2) for s in self.stages]
+        remaining = [s.workers for s in self.stages]
+        lock = threading.Lock()
+
+        def finish(index, value, timings, error='', stage=''):
+            results[index] = {'value': value, 'error': error, 'stage': stage, 'timings': timings}
+
+        def worker(n):
+            stage = self.stages[n]
+            while True:
+                job = queues[n].get()
+                if job is _DONE:
+                    break
+                index, value, timings = job
+                start = time.monotonic()
+                try:
+                    value = stage.fn(value)
+                except (Exception, SystemExit) as e:
+                    timings[stage.name] = time.monotonic() - start
+                    finish(index, None, timings, str(e) or e.__class__.__name__, stage.name)
+                    continue
+                timings[stage.name] = time.monotonic() - start
+                if n + 1 < len(self.stages):
+                    queues[n + 1].put((index, value, timings))
+                else:
+                    finish(index, value, timings)
+            # the last worker out of a stage closes the next one
+            with lock:
+                remaining[n] -= 1
+                last = remaining[n] == 0
+            if last and n + 1 < len(self.stages):
+                for _ in range(self.stages[n + 1].workers):
+                    queues[n + 1].put(_DONE)
+
+        threads = [threading.Thread(target=worker, args=(n,), daemon=True)
+                   for n, stage in enumerate(self.stages) for _ in range(stage.workers)]
+        for t in threads:
+            t.start()
+        for index, item in enumerate(items):
+            queues[0].put((index, item, {}))
+        for _ in range(self.stages[0].workers):
+            queues[0].put(_DONE)
+        for t in threads:
+            t.join()
+        return results
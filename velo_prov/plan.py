@@ -0,0 +1,250 @@
+#
+# Dry-run planner: every VCO and AWS call of a fleet run, before making any
+#
+# build_plan() resolves the inventory the way fleet mode does (defaults, stack
+# names, launch target checks) and walks the steps of each edge against the
+# journal, the metadata cache and the options, without any api call:
+#   run level   enterprise / profile lookup (find_velo_enterpriseId, create_velo_profile),
+#               bucket check, shared template upload, stack listing per region;
+#               made once for the whole run however many edges use them
+#   per edge    provision_velo_edge, change_edge_config, upload_file_to_s3 and
+#               deploy_aws_cf_stack calls of the steps the journal has not seen yet
+# Call names are the ones metrics.py records, so the latency profile of an earlier
+# run (--metrics-json) prices them: estimate() simulates the worker pool (or the
+# VCO / AWS pipeline stages, or the bulk batches) at the given concurrency and
+# returns the expected (mean latency) and slow (p95) wall-clock time. Calls the
+# profile has never seen use DEFAULT_LATENCY and are flagged. Rate limiting and
+# the stack create time waited for with -w are not part of the estimate.
+#
+# A plan is plain JSON; apply_plan() runs its edges with its options through the
+# fleet mode code without loading or checking the inventory again. Steps done
+# in between are still skipped through the journal.
+
+import heapq
+import json
+import math
+import time
+
+from . import config
+from .provision import INVENTORY_PREFETCH_MIN, load_fleet, run_fleet_edges
+
+FORMAT = 1
+# seconds per call by service when the latency profile has no sample of it
+DEFAULT_LATENCY = {'vco': 0.3, 'cloudformation': 0.4, 's3': 0.15}
+
+# calls of each step and the function making them
+STEP_CALLS = {
+    'provision': ('provision_velo_edge', ['vco.' + config.edge_prov]),
+    'config': ('change_edge_config', ['vco.' + config.get_edgeconfig, 'vco.' + config.update_edgeconfig]),
+    'template': ('upload_file_to_s3', ['s3.HeadObject', 's3.PutObject']),
+    'stack': ('deploy_aws_cf_stack', ['cloudformation.DescribeStacks', 'cloudformation.CreateStack']),
+}
+VCO_STEPS = ('provision', 'config')
+AWS_STEPS = ('template', 'stack')
+
+
+######## BUILD
+def build_plan(inventory, options, journal=None, run_id=None):
+    from .vco import metadata_cache
+    edges, rejected = load_fleet(inventory)
+    valid = [e for e in edges if e['name'] not in rejected]
+    runaws, shared = options.get('aws'), options.get('shared')
+    cache = metadata_cache()
+    eid, pid = cache.enterprise_id(), cache.profile_id(config.ProfileName)
+
+    run_calls = []
+    if valid:
+        if eid is None:
+            run_calls.append({'call': 'vco.' + config.get_enterprise, 'function': 'find_velo_enterpriseId',
+                              'for': 'enterprise id'})
+        if pid is None:
+            # the clone only happens when the profile is not on the VCO, which only a lookup can tell
+            run_calls.append({'call': 'vco.' + config.get_profiles, 'function': 'create_velo_profile',
+                              'for': 'profile ' + config.ProfileName})
+            run_calls.append({'call': 'vco.' + config.create_profile, 'function': 'create_velo_profile',
+                              'for': 'profile ' + config.ProfileName + ' if missing'})
+        # edges provisioned by a killed run without a journal entry are adopted from this listing,
+        # made only while some edge has its provision step ahead
+        if journal is None or any('provision' not in journal.steps(run_id, e['name']) for e in valid):
+            run_calls.append({'call': 'vco.' + config.get_edgelist, 'function': 'existing_velo_edges',
+                              'for': 'edges already on the VCO'})
+        if options.get('bulk'):
+            run_calls.append({'call': 'vco.jsonrpc[probe]', 'function': 'BulkVco.supports_batch', 'for': 'batch support'})
+
+    plan_edges = []
+    regions = {}
+    for e in valid:
+        done = journal.steps(run_id, e['name']) if journal else {}
+        steps = [s for s in VCO_STEPS if s not in done]
+        if runaws:
+            steps += [s for s in AWS_STEPS if s not in done and not (s == 'template' and shared)]
+            if 'stack' not in done:
+                regions[e['region']] = regions.get(e['region'], 0) + 1
+        plan_edges.append({'edge': e, 'done': sorted(done), 'steps': steps})
+
+    if runaws and valid:
+        run_calls.append({'call': 's3.HeadBucket', 'function': 'template_store.ensure_bucket', 'for': 'bucket ' + config.BucketName})
+        if shared:
+            run_calls += [{'call': c, 'function': 'upload_shared_template', 'for': 'shared template'}
+                          for c in ('s3.HeadObject', 's3.PutObject')]
+        # same rule as fleet mode: a listing per busy region replaces the per-stack describe
+        for region, count in sorted(regions.items()):
+            if count > INVENTORY_PREFETCH_MIN:
+                run_calls.append({'call': 'cloudformation.ListStacks', 'function': 'stack_inventory.prefetch',
+                                  'for': 'stacks in ' + region})
+    prefetched = set(r for r, count in regions.items() if count > INVENTORY_PREFETCH_MIN)
+    for item in plan_edges:
+        calls = []
+        for step in item['steps']:
+            calls += [c for c in STEP_CALLS[step][1]
+                      if not (c == 'cloudformation.DescribeStacks' and item['edge']['region'] in prefetched)]
+        item['calls'] = calls
+
+    return {'format': FORMAT, 'created': time.strftime('%Y-%m-%d %H:%M:%S'), 'inventory': inventory,
+            'run_id': run_id, 'options': options, 'enterprise_id': eid, 'profile_id': pid,
+            'run_calls': run_calls, 'edges': plan_edges, 'order': [e['name'] for e in edges],
+            'rejected': [rejected[e['name']] for e in edges if e['name'] in rejected]}
+
+
+def call_totals(plan):
+    totals = {}
+    for c in plan['run_calls']:
+        totals[c['call']] = totals.get(c['call'], 0) + 1
+    for item in plan['edges']:
+        for c in item['calls']:
+            totals[c] = totals.get(c, 0) + 1
+    return totals
+
+
+######## ESTIMATE
+def load_latency_profile(path):
+    # {call: (mean s, p95 s)} from a --metrics-json file
+    with open(path) as f:
+        calls = json.load(f).get('calls', [])
+    return dict((c['call'], (c['total_s'] / c['count'], c['p95_s'])) for c in calls if c.get('count'))
+
+
+def _latency(profile, call, sources):
+    if call in profile:
+        sources[call] = 'profile'
+        return profile[call]
+    # a batch costs about one round trip of its method
+    base = call.split('[', 1)[0]
+    if base in profile:
+        sources[call] = 'profile (' + base + ')'
+        return profile[base]
+    sources[call] = 'default'
+    seconds = DEFAULT_LATENCY.get(call.split('.', 1)[0], 0.3)
+    return seconds, seconds
+
+
+def _pool(durations, workers, ready=None):
+    # finish time of each item on a FIFO pool of workers, items queued in order (or when ready)
+    free = [0.0] * max(1, workers)
+    order = sorted(range(len(durations)), key=lambda n: ready[n]) if ready else range(len(durations))
+    result = [0.0] * len(durations)
+    for n in order:
+        start = max(heapq.heappop(free), ready[n] if ready else 0.0)
+        result[n] = start + durations[n]
+        heapq.heappush(free, result[n])
+    return result
+
+
+def estimate(plan, profile=None, concurrency=None, aws_concurrency=None):
+    profile = profile or {}
+    options = plan['options']
+    concurrency = concurrency or options.get('concurrency') or 1
+    aws_concurrency = aws_concurrency if aws_concurrency is not None else options.get('aws_concurrency')
+    sources = {}
+    out = {'concurrency': concurrency, 'aws_concurrency': aws_concurrency}
+    for case, k in (('expected_s', 0), ('slow_s', 1)):
+        lat = lambda call: _latency(profile, call, sources)[k]
+        run_level = sum(lat(c['call']) for c in plan['run_calls'])
+        vco_t = [sum(lat(c) for c in item['calls'] if c.startswith('vco.')) for item in plan['edges']]
+        aws_t = [sum(lat(c) for c in item['calls'] if not c.startswith('vco.')) for item in plan['edges']]
+        if not plan['edges']:
+            edges_s = 0.0
+        elif options.get('bulk'):
+            # each VCO method in batches spread over the workers, then the AWS steps on their pool
+            vco_s = 0.0
+            for step in VCO_STEPS:
+                for call in STEP_CALLS[step][1]:
+                    count = sum(1 for item in plan['edges'] if call in item['calls'])
+                    if count:
+                        batches = int(math.ceil(count / float(options.get('batch_size') or 50)))
+                        vco_s += int(math.ceil(batches / float(concurrency))) * lat(call + '[batch]')
+            edges_s = vco_s + max(_pool(aws_t, aws_concurrency or concurrency))
+        elif aws_concurrency:
+            # VCO stage feeding the AWS stage as edges come out of it
+            edges_s = max(_pool(aws_t, aws_concurrency, _pool(vco_t, concurrency)))
+        else:
+            edges_s = max(_pool([v + a for v, a in zip(vco_t, aws_t)], concurrency))
+        if not k:
+            out['run_level_s'] = run_level
+        out[case] = run_level + edges_s
+    out['latency_source'] = dict(sorted(sources.items()))
+    return out
+
+
+######## SAVE / LOAD / APPLY
+def save_plan(plan, path):
+    with open(path, 'w') as f:
+        json.dump(plan, f, indent=1)
+
+
+def load_plan(path):
+    with open(path) as f:
+        plan = json.load(f)
+    if plan.get('format') != FORMAT:
+        raise SystemExit('%s: unsupported plan format %r' % (path, plan.get('format')))
+    return plan
+
+
+def print_plan(plan, est=None):
+    options = plan['options']
+    edges = plan['edges']
+    print('Plan for %s, run %s: %d edges to run, %d rejected, %d already done'
+          % (plan['inventory'], plan['run_id'], sum(1 for e in edges if e['steps']), len(plan['rejected']),
+             sum(1 for e in edges if not e['steps'])))
+    for r in plan['rejected']:
+        print('  rejected %s: %s' % (r['name'], r['error']))
+    totals = call_totals(plan)
+    run_level = {}
+    for c in plan['run_calls']:
+        run_level[c['call']] = run_level.get(c['call'], 0) + 1
+    sources = (est or {}).get('latency_source', {})
+    width = max([len(c) for c in totals] + [4])
+    print('%s %6s %9s  %s' % ('CALL'.ljust(width), 'COUNT', 'RUN-LEVEL', 'LATENCY FROM'))
+    for call in sorted(totals):
+        print('%s %6d %9d  %s' % (call.ljust(width), totals[call], run_level.get(call, 0), sources.get(call, '')))
+    print('%d calls in total, shared lookups and uploads made once: %s'
+          % (sum(totals.values()), ', '.join(sorted(set(c['for'] for c in plan['run_calls']))) or 'none'))
+    if options.get('bulk'):
+        batches = sum(int(math.ceil(count / float(options.get('batch_size') or 50)))
+                      for call, count in totals.items() if call.startswith('vco.') and call not in run_level)
+        print('Bulk: the per-edge VCO calls go in %d JSON-RPC batches if the VCO takes them' % batches)
+    if est:
+        mode = 'bulk' if options.get('bulk') else 'pipelined' if est['aws_concurrency'] else 'fleet'
+        print('Estimated wall clock (%s, -c %d%s): %.1fs expected, %.1fs slow (p95), %.1fs of it run level'
+              % (mode, est['concurrency'], ' -p %d' % est['aws_concurrency'] if est['aws_concurrency'] else '',
+                 est['expected_s'], est['slow_s'], est['run_level_s']))
+        if 'default' in sources.values():
+            print('Latencies marked default are guesses, record a run with --metrics-json for real ones')
+        if options.get('wait'):
+            print('Waiting for the stacks (-w) comes on top of the estimate')
+
+
+def apply_plan(plan, journal=None):
+    options = plan['options']
+    bulk = None
+    if options.get('bulk'):
+        from .vco_bulk import BulkVco
+        bulk = BulkVco(batch_size=options.get('batch_size') or 50, workers=options.get('concurrency') or 1)
+    # rejected edges only need their name, run_fleet_edges puts their row back in inventory order
+    edges = dict((item['edge']['name'], item['edge']) for item in plan['edges'])
+    rejected = dict((r['name'], r) for r in plan['rejected'])
+    print('Applying plan of %s (%s), run %s' % (plan['inventory'], plan['created'], plan['run_id']))
+    return run_fleet_edges([edges.get(name, {'name': name}) for name in plan['order']], rejected,
+                           options.get('concurrency') or 1,
+                           options.get('aws'), options.get('wait'), options.get('shared'), journal, plan['run_id'],
+                           options.get('aws_concurrency'), bulk)
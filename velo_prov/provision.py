@@ -0,0 +1,206 @@
+#
+# Per-edge provisioning steps, single edge and fleet mode
+#
+# Each completed step is recorded in the journal with its outputs, and skipped
+# when a previous run with the same run id already completed it.
+
+import json
+import time
+
+from . import aws
+from . import config
+from . import fleet
+from . import runlog
+from . import vco_bulk
+from .cf_inventory import stack_inventory
+from .pipeline import Stage
+from .template import edge_stack_parameters, render_cf_template, validate_target
+from .vco import adopt_velo_edge, change_edge_config, create_velo_profile, existing_velo_edges, find_velo_enterpriseId, provision_velo_edge
+
+def edge_state(edge,journal=None,run_id=None):
+	return {'edge': edge, 'journal': journal, 'run_id': run_id,
+		'done': journal.steps(run_id,edge['name']) if journal else {}, 'since': time.monotonic()}
+
+#### called when a worker picks up the edge: run log context of the thread, and the step clock
+def start_steps(state):
+	runlog.bind(run_id=state['run_id'],edge=state['edge']['name'])
+	state['since'] = time.monotonic()
+
+def record_step(state,step,**outputs):
+	state['done'][step] = outputs
+	if state['journal']:
+		state['journal'].record(state['run_id'],state['edge']['name'],step,**outputs)
+	now = time.monotonic()
+	runlog.event(runlog.steps,runlog.INFO,'step done',run_id=state['run_id'],edge=state['edge']['name'],step=step,duration_s=round(now-state['since'],4))
+	state['since'] = now
+
+#### VCO side: provision the edge and fix its device settings
+#### existing is {name: edge row} of the VCO edge list (fetched here when not given)
+def vco_edge_steps(eid,pid,state,existing=None):
+	edge,done = state['edge'],state['done']
+	start_steps(state)
+	if 'provision' in done:
+		print('Edge '+edge['name']+' already provisioned with Id '+str(done['provision']['edge_id'])+', resuming')
+	else:
+		#### a run killed between edgeProvision and the journal left the edge on the VCO: adopt it, no duplicate
+		if existing is None:
+			existing = existing_velo_edges(eid)
+		if edge['name'] in existing:
+			edid,activationkey = adopt_velo_edge(eid,existing[edge['name']])
+		else:
+			edge_site = dict(config.site, contactName=edge['contact_name'], contactEmail=edge['contact_email'])
+			edid,activationkey = provision_velo_edge(eid,pid,edge['name'],edge_site)
+		record_step(state,'provision',edge_id=edid,activation_key=activationkey)
+	if 'config' not in done:
+		moduleId = change_edge_config(eid,done['provision']['edge_id'],edge['instance_type'],pid)
+		record_step(state,'config',module_id=moduleId)
+	return state
+
+#### AWS side: cf template, S3 upload and stack
+def aws_edge_steps(state,runaws,shared=False):
+	edge,done = state['edge'],state['done']
+	start_steps(state)
+	name = edge['name']
+	activationkey = done['provision']['activation_key']
+	result = {'edge_id': done['provision']['edge_id'], 'stack_name': ''}
+	cf_file = edge.get('cf_file') or 'new-velo-cf-%s.json' %(name)
+	if not shared and (not runaws or 'template' not in done):
+		with open(cf_file, 'w') as outfile:
+			outfile.write(json.dumps(render_cf_template(name,activationkey,edge['key_name'],edge['az'],edge['instance_type'],edge.get('software_version'))))
+	if not runaws:
+		return result
+	if 'template' not in done:
+		s3url = aws.upload_shared_template(config.BucketName) if shared else aws.upload_file_to_s3(config.BucketName,cf_file)
+		record_step(state,'template',template_url=s3url)
+	if 'stack' in done:
+		print('Stack '+edge['stack_name']+' already created for edge '+name)
+	else:
+		parameters = edge_stack_parameters(name,activationkey,edge['key_name'],edge['az'],edge['instance_type'],edge.get('software_version')) if shared else None
+		apiresult = aws.deploy_aws_cf_stack(edge['stack_name'],edge['region'],done['template']['template_url'],parameters,name)
+		record_step(state,'stack',stack_id=apiresult['StackId'],stack_name=edge['stack_name'],region=edge['region'])
+	result['stack_name'] = edge['stack_name']
+	return result
+
+def provision_edge_steps(eid,pid,edge,runaws,shared=False,journal=None,run_id=None,existing=None):
+	return aws_edge_steps(vco_edge_steps(eid,pid,edge_state(edge,journal,run_id),existing),runaws,shared)
+
+#### VCO side of many edges at once, each call sent for all edges in batches (vco_bulk.py); returns {name: error}
+def bulk_vco_steps(eid,pid,states,bulk,existing=None):
+	failed = {}
+	existing = existing or {}
+	for state in [s for s in states if 'provision' not in s['done'] and s['edge']['name'] in existing]:
+		try:
+			edid,activationkey = adopt_velo_edge(eid,existing[state['edge']['name']])
+			record_step(state,'provision',edge_id=edid,activation_key=activationkey)
+		except Exception as e:
+			failed[state['edge']['name']] = 'provision: '+str(e)
+	todo = [s for s in states if 'provision' not in s['done'] and s['edge']['name'] not in failed]
+	for state,(outputs,error) in zip(todo, vco_bulk.provision_edges(bulk,eid,pid,[s['edge'] for s in todo])):
+		if error is None:
+			record_step(state,'provision',**outputs)
+		else:
+			failed[state['edge']['name']] = 'provision: '+error
+	todo = [s for s in states if 'provision' in s['done'] and 'config' not in s['done']]
+	edge_ids = [s['done']['provision']['edge_id'] for s in todo]
+	for state,(outputs,error) in zip(todo, vco_bulk.configure_edges(bulk,edge_ids,[s['edge']['instance_type'] for s in todo],pid)):
+		if error is None:
+			record_step(state,'config',**outputs)
+		else:
+			failed[state['edge']['name']] = 'config: '+error
+	return failed
+
+##############################   /////   #######################
+####                          FLEET MODE
+##############################   /////   #######################
+INVENTORY_PREFETCH_MIN = 20
+
+#### inventory entries with the script defaults filled in, and {name: failed result row} of the invalid ones
+def load_fleet(inventory):
+	defaults = {'contact_name': config.EdgeContactName, 'contact_email': config.EdgeContactEmail,
+		'key_name': config.KeyName, 'region': config.CfRegion, 'az': config.region, 'instance_type': config.DefaultInstanceType}
+	inventory_edges = fleet.load_inventory(inventory, defaults)
+	#### region / AZ / version / instance type are checked locally first, a bad target fails before any api call
+	rejected = {}
+	for e in inventory_edges:
+		errors = validate_target(e['region'],e['az'],e['software_version'],e['instance_type'])
+		if errors:
+			rejected[e['name']] = {'name': e['name'], 'status': 'failed', 'error': 'invalid target: '+'; '.join(errors), 'seconds': 0.0}
+	return inventory_edges,rejected
+
+def run_fleet_mode(inventory,concurrency,runaws,wait=False,shared=False,journal=None,run_id=None,aws_concurrency=None,bulk=None):
+	inventory_edges,rejected = load_fleet(inventory)
+	return run_fleet_edges(inventory_edges,rejected,concurrency,runaws,wait,shared,journal,run_id,aws_concurrency,bulk)
+
+#### also run by plan.apply_plan with the edges of a saved plan
+def run_fleet_edges(inventory_edges,rejected,concurrency,runaws,wait=False,shared=False,journal=None,run_id=None,aws_concurrency=None,bulk=None):
+	rejected = dict(rejected)
+	edges = [e for e in inventory_edges if e['name'] not in rejected]
+	runlog.bind(run_id=run_id)
+	if rejected:
+		print('%d edges have an invalid launch target and are skipped' %(len(rejected)))
+	print('Provisioning %d edges with concurrency %d' %(len(edges),concurrency))
+	if not edges:
+		results = [rejected[e['name']] for e in inventory_edges]
+		fleet.print_results_table(results)
+		return results
+	#### enterprise and profile are shared by every edge, look them up once per run
+	eid = find_velo_enterpriseId()
+	pid = create_velo_profile(eid,config.ProfileName)
+	#### edges a killed run provisioned without journaling them are adopted instead of created twice,
+	#### listed only when some edge still has to be provisioned; if the listing fails they are provisioned as usual
+	existing = {}
+	if journal is None or any('provision' not in journal.steps(run_id,e['name']) for e in edges):
+		try:
+			existing = existing_velo_edges(eid)
+		except Exception as e:
+			print('Could not list the edges on the VCO, provisioning without adopting: '+str(e))
+	if runaws:
+		#### with many stacks per region one paginated listing beats a describe per stack
+		per_region = {}
+		for e in edges:
+			per_region[e['region']] = per_region.get(e['region'],0) + 1
+		for awsregion,count in per_region.items():
+			if count > INVENTORY_PREFETCH_MIN:
+				stack_inventory(awsregion).prefetch()
+		if shared:
+			aws.upload_shared_template(config.BucketName)
+	if bulk and not bulk.supports_batch():
+		#### per-edge chains keep the three VCO endpoints busy together, one method at a time would sit on its rate limit
+		print('Running the VCO steps per edge on the shared session')
+		bulk = None
+	if bulk:
+		#### bulk: the VCO steps of the whole fleet in a few batched round trips, then the AWS steps per edge
+		states = dict((e['name'],edge_state(e,journal,run_id)) for e in edges)
+		start = time.monotonic()
+		vco_failed = bulk_vco_steps(eid,pid,[states[e['name']] for e in edges],bulk,existing)
+		print('VCO steps of %d edges done in %.2fs with %d requests, %d failed' %(len(edges),time.monotonic()-start,bulk.requests,len(vco_failed)))
+		for name,error in vco_failed.items():
+			rejected[name] = {'name': name, 'status': 'failed', 'error': 'vco: '+error, 'seconds': 0.0}
+		edges = [e for e in edges if e['name'] not in vco_failed]
+		results = fleet.run_fleet(edges, lambda edge: aws_edge_steps(states[edge['name']],runaws,shared), aws_concurrency or concurrency)
+	elif aws_concurrency:
+		#### pipelined: an edge's AWS steps start as soon as its VCO steps are done, each side has its own worker limit
+		print('Pipelined run, %d VCO workers and %d AWS workers' %(concurrency,aws_concurrency))
+		results = fleet.run_pipeline(edges, [
+			Stage('vco', lambda edge: vco_edge_steps(eid,pid,edge_state(edge,journal,run_id),existing), concurrency),
+			Stage('aws', lambda state: aws_edge_steps(state,runaws,shared), aws_concurrency)])
+	else:
+		results = fleet.run_fleet(edges, lambda edge: provision_edge_steps(eid,pid,edge,runaws,shared,journal,run_id,existing), concurrency)
+	if rejected:
+		by_name = {r['name']: r for r in results}
+		by_name.update(rejected)
+		results = [by_name[e['name']] for e in inventory_edges]
+	columns = ['name','status','edge_id','stack_name','seconds','error']
+	if aws_concurrency and not bulk:
+		columns[4:4] = ['vco_s','aws_s']
+	if runaws and wait:
+		#### one watcher for the whole fleet so describe calls are batched per region
+		by_name = {r['name']: r for r in results}
+		stacks = [(e['region'],e['stack_name']) for e in edges if by_name[e['name']].get('stack_name')]
+		status = aws.wait_for_stacks(stacks)
+		for e in edges:
+			if (e['region'],e['stack_name']) in status:
+				by_name[e['name']]['stack_status'] = status[(e['region'],e['stack_name'])]
+		columns.insert(4,'stack_status')
+	fleet.print_results_table(results, columns)
+	return results
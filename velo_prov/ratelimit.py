@@ -0,0 +1,161 @@
+#
+# Adaptive client side rate limiting, shared by every worker of the process
+#
+# One token bucket per endpoint (vco.<method>, cloudformation.<Operation>,
+# s3.<Operation>). Every attempt, retries included, takes a token before it is
+# sent, so a fleet of workers never goes faster than the bucket rate together.
+# The rate adapts AIMD style: each successful call adds increase / rate to it
+# (about +increase per second at full speed), each throttled answer (VCO 429,
+# AWS Throttling) halves it. Throttles within cooldown seconds of the last cut
+# are the in-flight echo of the same overload and do not cut it again. A
+# Retry-After pauses the whole bucket, so the waiting workers resume together
+# instead of retrying one by one into the same limit.
+
+import threading
+import time
+
+THROTTLE_CODES = ('Throttling', 'ThrottlingException', 'RequestLimitExceeded', 'TooManyRequestsException',
+                  'SlowDown')
+
+# initial and maximum calls per second of one endpoint, by service
+DEFAULT_RATES = {
+    'vco': (50.0, 200.0),
+    'cloudformation': (20.0, 50.0),
+    's3': (100.0, 300.0),
+}
+FALLBACK_RATE = (20.0, 100.0)
+
+
+class TokenBucket(object):
+
+    def __init__(self, rate, max_rate=None, min_rate=0.5, increase=2.0, decrease=0.5, cooldown=1.0):
+        self.rate = rate
+        self.max_rate = max_rate or rate
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.tokens = max(rate, 1.0)
+        self.updated = time.monotonic()
+        self.cut_at = 0.0
+        self.throttles = 0
+        self.cuts = 0
+        self.waited = 0.0
+        self.acquired = 0
+
+    def _refill(self, now):
+        # updated is in the future while a Retry-After pause is running
+        if now > self.updated:
+            self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def acquire(self):
+        # takes a token, or reserves the next one and sleeps until it is due; returns the wait
+        with self.lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.tokens -= 1
+            wait = max(self.updated - now, 0.0) + (-self.tokens / self.rate if self.tokens < 0 else 0.0)
+            self.acquired += 1
+            self.waited += wait
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def succeeded(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def throttled(self, retry_after=None):
+        with self.lock:
+            now = time.monotonic()
+            self.throttles += 1
+            if now - self.cut_at >= self.cooldown:
+                self.rate = max(self.min_rate, self.rate * self.decrease)
+                self.cut_at = now
+                self.cuts += 1
+                # drop the saved up burst, it is what overran the limit
+                self.tokens = min(self.tokens, 0.0)
+            if retry_after:
+                self._refill(now)
+                self.updated = max(self.updated, now + retry_after)
+
+
+class RateLimiter(object):
+
+    def __init__(self, rates=None):
+        self.rates = dict(DEFAULT_RATES, **(rates or {}))
+        self.lock = threading.Lock()
+        self.buckets = {}
+        self.enabled = True
+
+    def bucket(self, name):
+        bucket = self.buckets.get(name)
+        if bucket is None:
+            with self.lock:
+                bucket = self.buckets.get(name)
+                if bucket is None:
+                    rate, max_rate = self.rates.get(name.split('.', 1)[0], FALLBACK_RATE)
+                    bucket = self.buckets[name] = TokenBucket(rate, max_rate)
+        return bucket
+
+    def acquire(self, name):
+        return self.bucket(name).acquire() if self.enabled else 0.0
+
+    def succeeded(self, name):
+        if self.enabled:
+            self.bucket(name).succeeded()
+
+    def throttled(self, name, retry_after=None):
+        if self.enabled:
+            self.bucket(name).throttled(retry_after)
+
+    def reset(self):
+        with self.lock:
+            self.buckets = {}
+
+    #### boto3: a token per attempt, and the outcome of every attempt, through botocore's event hooks
+    def instrument_boto3(self, client):
+        service = client.meta.service_model.service_name
+        events = client.meta.events
+
+        def before_send(request, event_name, **kw):
+            self.acquire('%s.%s' % (service, event_name.rsplit('.', 1)[-1]))
+
+        def needs_retry(response, operation, **kw):
+            # only observes, returning None leaves the retry decision to botocore
+            if response is None:
+                return None
+            http_response, parsed = response
+            name = '%s.%s' % (service, operation.name)
+            if (parsed or {}).get('Error', {}).get('Code') in THROTTLE_CODES:
+                self.throttled(name)
+            elif getattr(http_response, 'status_code', 200) < 400:
+                self.succeeded(name)
+            return None
+
+        events.register('before-send.*.*', before_send)
+        events.register('needs-retry.*.*', needs_retry)
+        return client
+
+    #### report
+    def summary(self):
+        with self.lock:
+            buckets = sorted(self.buckets.items())
+        return [{'endpoint': name, 'rate': b.rate, 'calls': b.acquired, 'throttles': b.throttles, 'cuts': b.cuts,
+                 'waited_s': b.waited} for name, b in buckets]
+
+    def print_summary(self):
+        rows = self.summary()
+        if not rows:
+            return
+        width = max(len(r['endpoint']) for r in rows)
+        print('%s %9s %6s %9s %5s %9s' % ('ENDPOINT'.ljust(width), 'RATE/s', 'CALLS', 'THROTTLES', 'CUTS', 'WAITED s'))
+        for r in rows:
+            print('%s %9.1f %6d %9d %5d %9.2f' % (r['endpoint'].ljust(width), r['rate'], r['calls'], r['throttles'],
+                                                 r['cuts'], r['waited_s']))
+
+
+#### process wide limiter used by the VCO client and the boto3 client factory
+limiter = RateLimiter()
@@ -0,0 +1,196 @@
+#
+# Drift between the VCO edge list and the edge CloudFormation stacks
+#
+# The enterprise edge list is fetched once with getEnterpriseEdgeList, paged and
+# without the site / configuration expansions, and every row is trimmed to
+# EDGE_FIELDS as its page arrives. The stacks of each region come from one
+# paginated describe_stacks listing (list_stacks has no tags) and are keyed by
+# their VeloCloudEdgeName tag, or by the VELO-STACK-<edge> name when untagged. Both sides are fetched concurrently and joined in
+# memory with dict lookups, there is no api call per edge.
+#
+# Drift found:
+#   missing_stack    virtual edge without a tagged stack
+#   orphan_stack     stack tagged with an edge name the VCO does not know
+#   duplicate_stack  more than one stack tagged with the same edge
+#   not_activated    edge that has a stack but never activated
+#
+# Fixed with --fix:
+#   orphan_stack                              stack deleted
+#   missing_stack of a never activated edge   stack created from the shared template, only when a
+#                                             single region was scanned (its AZ checked like a fleet row)
+#   not_activated with a failed stack         stack recreated
+# The rest is only reported, e.g. an activated edge without a stack runs somewhere else.
+
+from concurrent.futures import ThreadPoolExecutor
+
+from . import aws
+from . import config
+from . import fleet
+from . import vco
+from .cf_deploy import EDGE_TAG, cf_clients
+from .cf_watch import is_failed
+from .template import edge_stack_parameters, validate_target
+
+EDGE_FIELDS = ('id', 'name', 'edgeState', 'activationKey', 'modelNumber')
+EDGE_PAGE_SIZE = 500
+NEVER_ACTIVATED = 'NEVER_ACTIVATED'
+STACK_PREFIX = 'VELO-STACK-'
+DRIFT_COLUMNS = ('kind', 'name', 'edge_id', 'edge_state', 'region', 'stack_name', 'stack_status', 'action')
+
+
+######## FETCH
+def fetch_edges(eid, page_size=EDGE_PAGE_SIZE):
+    params = {'enterpriseId': eid, 'with': [], 'limit': page_size}
+    edges = []
+    while True:
+        body = vco.client().post(config.endpoint(config.get_edgelist), params, idempotent=True).json()
+        if isinstance(body, dict) and 'error' in body:
+            raise RuntimeError('getEnterpriseEdgeList failed: %s' % body['error'].get('message'))
+        if isinstance(body, list):
+            # orchestrator without edge list paging, everything came in one answer
+            rows, link = body, None
+        else:
+            rows = body['data']
+            link = body['metaData'].get('nextPageLink') if body['metaData'].get('more') else None
+        edges.extend({k: row.get(k) for k in EDGE_FIELDS} for row in rows)
+        if not link:
+            return edges
+        params['nextPageLink'] = link
+
+
+def fetch_stacks(region, clients=None):
+    # every live stack of the region, edge is None for stacks that belong to no edge
+    client = (clients or cf_clients).get(region)
+    stacks = []
+    kw = {}
+    while True:
+        resp = client.describe_stacks(**kw)
+        for s in resp['Stacks']:
+            tags = dict((t['Key'], t['Value']) for t in s.get('Tags') or [])
+            edge = tags.get(EDGE_TAG)
+            # stacks created before they were tagged are matched by the default stack name
+            if edge is None and s['StackName'].startswith(STACK_PREFIX):
+                edge = s['StackName'][len(STACK_PREFIX):]
+            stacks.append({'edge': edge, 'region': region, 'stack_name': s['StackName'],
+                           'status': s['StackStatus']})
+        if not resp.get('NextToken'):
+            return stacks
+        kw['NextToken'] = resp['NextToken']
+
+
+def stack_az(region):
+    # the configured AZ in its own region, the first AZ of any other
+    return config.region if config.region[:-1] == region else region + 'a'
+
+
+def create_target(regions):
+    # region missing stacks are created in, or None and why: with several regions
+    # scanned the edge may belong to any of them
+    if len(regions) != 1:
+        return None, 'stacks looked for in %d regions, scan a single --region to create missing ones' % len(regions)
+    region = regions[0]
+    errors = validate_target(region, stack_az(region))
+    if errors:
+        return None, 'no launch target for missing stacks in %s: %s' % (region, '; '.join(errors))
+    return region, None
+
+
+######## JOIN
+def _row(kind, edge, stack, action=''):
+    return {'kind': kind, 'name': edge['name'] if edge else stack['edge'],
+            'edge_id': edge['id'] if edge else '', 'edge_state': edge['edgeState'] if edge else '',
+            'activation_key': edge['activationKey'] if edge else None,
+            'region': stack['region'] if stack else '', 'stack_name': stack['stack_name'] if stack else '',
+            'stack_status': stack['status'] if stack else '', 'action': action}
+
+
+def find_drift(edges, stacks, prefix=None, target=None):
+    # only virtual edges run as stacks, and a prefix narrows both sides to one naming scheme;
+    # a missing stack only gets an action with a target region to create it in
+    def wanted(name):
+        return not prefix or name.startswith(prefix)
+
+    by_name = dict((e['name'], e) for e in edges)
+    by_edge = {}
+    for s in stacks:
+        if s['edge'] is not None:
+            by_edge.setdefault(s['edge'], []).append(s)
+
+    drift = []
+    for e in edges:
+        if e['modelNumber'] != 'virtual' or not wanted(e['name']):
+            continue
+        own = by_edge.get(e['name'])
+        never_activated = e['edgeState'] == NEVER_ACTIVATED
+        if not own:
+            row = _row('missing_stack', e, None, 'create_stack' if never_activated and target else '')
+            if row['action']:
+                row['region'] = target
+            drift.append(row)
+            continue
+        for s in own[1:]:
+            drift.append(_row('duplicate_stack', e, s))
+        if never_activated:
+            drift.append(_row('not_activated', e, own[0], 'recreate_stack' if is_failed(own[0]['status']) else ''))
+    for name, own in by_edge.items():
+        if name not in by_name and wanted(name):
+            drift.extend(_row('orphan_stack', None, s, 'delete_stack') for s in own)
+    return drift
+
+
+######## FIX
+def _fix(row):
+    if row['action'] == 'delete_stack':
+        cf_clients.get(row['region']).delete_stack(StackName=row['stack_name'])
+        return {'region': row['region'], 'stack_name': row['stack_name'], 'result': 'DELETE_IN_PROGRESS'}
+    if not row['activation_key']:
+        raise RuntimeError('no activation key for edge ' + row['name'])
+    # a recreate reuses the failed stack's name, deploy_aws_cf_stack deletes it first
+    region = row['region']
+    stack_name = row['stack_name'] or STACK_PREFIX + row['name']
+    parameters = edge_stack_parameters(row['name'], row['activation_key'], config.KeyName, stack_az(region),
+                                       config.DefaultInstanceType)
+    aws.deploy_aws_cf_stack(stack_name, region, aws.upload_shared_template(config.BucketName), parameters,
+                            row['name'])
+    return {'region': region, 'stack_name': stack_name, 'result': 'CREATE_IN_PROGRESS'}
+
+
+def fix_drift(drift, concurrency=fleet.DEFAULT_CONCURRENCY):
+    todo = [row for row in drift if row['action']]
+    if any(row['action'] != 'delete_stack' for row in todo):
+        aws.upload_shared_template(config.BucketName)
+    return fleet.run_fleet(todo, _fix, concurrency)
+
+
+def fetch_all(eid, regions):
+    # edge list and the stacks of every region, fetched side by side
+    with ThreadPoolExecutor(max_workers=len(regions) + 1) as pool:
+        edges = pool.submit(fetch_edges, eid)
+        stacks = [pool.submit(fetch_stacks, r) for r in regions]
+        return edges.result(), [s for f in stacks for s in f.result()]
+
+
+def run_reconcile(regions, prefix=None, fix=False, concurrency=fleet.DEFAULT_CONCURRENCY):
+    eid = vco.find_velo_enterpriseId()
+    edges, stacks = fetch_all(eid, regions)
+    print('%d edges on the VCO, %d edge stacks in %s' % (len(edges), sum(1 for s in stacks if s['edge']),
+                                                         ', '.join(regions)))
+    target, why = create_target(regions)
+    drift = find_drift(edges, stacks, prefix, target)
+    if not drift:
+        print('No drift')
+        return drift
+    fleet.print_table(drift, DRIFT_COLUMNS)
+    counts = {}
+    for row in drift:
+        counts[row['kind']] = counts.get(row['kind'], 0) + 1
+    print(', '.join('%d %s' % (n, kind) for kind, n in sorted(counts.items())))
+    if why and any(row['kind'] == 'missing_stack' and row['edge_state'] == NEVER_ACTIVATED for row in drift):
+        print('missing stacks are only reported, ' + why)
+    if fix:
+        results = fix_drift(drift, concurrency)
+        fleet.print_table(results, ('name', 'status', 'region', 'stack_name', 'result', 'seconds', 'error'))
+        print('%d/%d fixes applied' % (sum(1 for r in results if r['status'] == 'ok'), len(results)))
+    elif any(row['action'] for row in drift):
+        print('rerun with --fix to apply the actions')
+    return drift
@@ -0,0 +1,188 @@
+#
+# Structured run log: JSON lines through a background writer
+#
+# Off unless setup() is called (--log-json). Every record becomes one JSON object
+# per line with ts, level, logger and msg, the run_id / edge / step / duration_s
+# of what it is about, and any extra fields of the event:
+#   velo_prov.steps   a journal step completed for an edge, with its duration (INFO)
+#   velo_prov.edges   an edge finished in fleet mode, status and time (INFO / WARNING)
+#   velo_prov.calls   every VCO and AWS call, latency and retries (DEBUG, WARNING on error)
+#   velo_prov.out     what worker threads print, with -q (INFO)
+# Workers only put the record on an unbounded queue (QueueHandler); formatting and
+# writing happen on the QueueListener thread, so a slow terminal or disk never
+# holds up a provisioning worker. shutdown() drains the queue at the end of the run.
+#
+# The run id and edge come from the thread: the per-edge steps bind() them when
+# they start on a worker, so every call made on that worker carries them.
+# Per-call events can be sampled per level (sample={'DEBUG': 0.1} keeps every
+# tenth), evenly and before they are queued; warnings and errors are kept unless
+# sampled explicitly.
+
+import itertools
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+from logging import DEBUG, INFO, WARNING
+
+_context = threading.local()
+_listener = None
+_stdout = None
+
+steps = logging.getLogger('velo_prov.steps')
+edges = logging.getLogger('velo_prov.edges')
+calls = logging.getLogger('velo_prov.calls')
+out = logging.getLogger('velo_prov.out')
+# nothing is written (not even warnings, through logging's last resort) until setup()
+logging.getLogger('velo_prov').addHandler(logging.NullHandler())
+
+
+def _level(name):
+    level = logging.getLevelName(name)
+    if not isinstance(level, int):
+        raise ValueError('unknown log level %r' % name)
+    return level
+
+
+def bind(**fields):
+    # run_id / edge of the work the current thread is doing, until the next bind()
+    _context.__dict__.update(fields)
+
+
+def event(logger, level, msg, **fields):
+    if logger.isEnabledFor(level):
+        logger.log(level, msg, extra={'fields': fields})
+
+
+class JsonFormatter(logging.Formatter):
+
+    def format(self, record):
+        line = {'ts': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)) + '.%03dZ' % record.msecs,
+                'level': record.levelname, 'logger': record.name, 'msg': record.getMessage()}
+        line.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            line['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            line['exc'] = record.exc_text
+        return json.dumps(line, separators=(',', ':'), default=str)
+
+
+class SamplingFilter(logging.Filter):
+    # keeps rate of the records of each level, evenly spread: with 0.25 every fourth one
+
+    def __init__(self, rates):
+        logging.Filter.__init__(self)
+        self.rates = dict((_level(level), float(rate)) for level, rate in rates.items())
+        self.counters = dict((level, itertools.count()) for level in self.rates)
+        self.lock = threading.Lock()
+        self.dropped = 0
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno)
+        if rate is None or rate >= 1:
+            return True
+        # next() on itertools.count is atomic, no lock needed across workers
+        n = next(self.counters[record.levelno])
+        if int((n + 1) * rate) > int(n * rate):
+            return True
+        with self.lock:
+            self.dropped += 1
+        return False
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    # the worker side: attach the thread's run_id / edge and queue the record unformatted
+
+    def prepare(self, record):
+        fields = dict(_context.__dict__)
+        fields.update(getattr(record, 'fields', None) or {})
+        record.fields = fields
+        if record.args:
+            record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class _WorkerOutput(object):
+    # stdout for -q: the main thread still prints, worker threads' lines go to the log
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lines = threading.local()
+
+    def write(self, text):
+        if threading.current_thread() is threading.main_thread():
+            return self.stream.write(text)
+        buf = getattr(self.lines, 'buf', '') + text
+        *done, self.lines.buf = buf.split('\n')
+        for line in done:
+            if line:
+                out.info(line)
+        return len(text)
+
+    def flush(self):
+        self.stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.stream, name)
+
+
+def setup(path, level='INFO', sample=None, quiet=False):
+    """Start the background writer, path '-' is stderr."""
+    global _listener, _stdout
+    shutdown()
+    if path == '-':
+        target = logging.StreamHandler(sys.stderr)
+    else:
+        target = logging.FileHandler(path)
+    target.setFormatter(JsonFormatter())
+    records = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    root = logging.getLogger('velo_prov')
+    root.handlers = [handler]
+    root.setLevel(level)
+    root.propagate = False
+    calls.filters = [SamplingFilter(sample)] if sample else []
+    _listener = logging.handlers.QueueListener(records, target)
+    _listener.start()
+    if quiet:
+        _stdout = sys.stdout
+        sys.stdout = _WorkerOutput(sys.stdout)
+
+
+def sampled_out():
+    return sum(f.dropped for f in calls.filters if isinstance(f, SamplingFilter))
+
+
+def shutdown():
+    """Write what is still queued and stop the writer."""
+    global _listener, _stdout
+    if _stdout is not None:
+        sys.stdout, _stdout = _stdout, None
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+        logging.getLogger('velo_prov').handlers = [logging.NullHandler()]
+
+
+def parse_sample(specs):
+    # ['DEBUG=0.1', 'info=0.5'] -> {'DEBUG': 0.1, 'INFO': 0.5}
+    rates = {}
+    for spec in specs or []:
+        level, _, rate = spec.partition('=')
+        level = level.strip().upper()
+        try:
+            _level(level)
+            rates[level] = float(rate)
+        except ValueError:
+            raise SystemExit('--log-sample wants LEVEL=RATE, e.g. DEBUG=0.1, not %r' % spec)
+        if not 0 <= rates[level] <= 1:
+            raise SystemExit('--log-sample rate must be between 0 and 1: %r' % spec)
+    return rates
@@ -0,0 +1,96 @@
+#
+# Content addressed store for the CloudFormation templates uploaded to S3
+#
+# The bucket is checked with a single head_bucket call (once per process) instead of
+# listing every bucket in the account, and templates are stored under a key derived
+# from the sha256 of their content. An identical template that is already in the
+# bucket is not uploaded again, so one parameterized template can serve many stacks.
+
+import hashlib
+import os
+import threading
+
+from .cf_deploy import RegionClients
+
+TEMPLATE_PREFIX = 'templates/'
+
+s3_clients = RegionClients('s3')
+
+
+def _error_code(e):
+    return str(getattr(e, 'response', {}).get('Error', {}).get('Code', ''))
+
+
+class TemplateStore(object):
+
+    def __init__(self, bucket, client=None, region=None, acl='public-read'):
+        self.bucket = bucket
+        self.client = client or s3_clients.get(region)
+        self.region = region
+        self.acl = acl
+        self.lock = threading.Lock()
+        self.bucket_ready = False
+        self.known_keys = set()
+
+    def ensure_bucket(self):
+        with self.lock:
+            if self.bucket_ready:
+                return
+            try:
+                self.client.head_bucket(Bucket=self.bucket)
+                print('Bucket '+self.bucket+' Found')
+            except Exception as e:
+                # 403 means the name is taken by another account, only a missing bucket is created
+                if _error_code(e) not in ('404', 'NoSuchBucket', 'NotFound'):
+                    raise
+                print('Creating new S3 bucket - '+self.bucket)
+                kw = {'Bucket': self.bucket}
+                if self.region and self.region != 'us-east-1':
+                    kw['CreateBucketConfiguration'] = {'LocationConstraint': self.region}
+                self.client.create_bucket(**kw)
+            self.bucket_ready = True
+
+    def url(self, key):
+        return "https://%s.s3.amazonaws.com/%s" % (self.bucket, key)
+
+    def _exists(self, key):
+        if key in self.known_keys:
+            return True
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+        except Exception as e:
+            if _error_code(e) in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+        self.known_keys.add(key)
+        return True
+
+    def put(self, body, name='velo-cf.json'):
+        # returns (url, uploaded), the key embeds the content hash so an existing key is identical content
+        self.ensure_bucket()
+        if isinstance(body, str):
+            body = body.encode()
+        key = '%s%s-%s' % (TEMPLATE_PREFIX, hashlib.sha256(body).hexdigest()[:32], name)
+        if self._exists(key):
+            return self.url(key), False
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=body, ACL=self.acl,
+                               ContentType='application/json')
+        self.known_keys.add(key)
+        return self.url(key), True
+
+    def put_file(self, path):
+        with open(path, 'rb') as f:
+            return self.put(f.read(), os.path.basename(path))
+
+
+#### one store per bucket, so the bucket check and the key memo are shared by all workers
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def template_store(bucket, region=None):
+    with _stores_lock:
+        store = _stores.get(bucket)
+        if store is None:
+            store = _stores[bucket] = TemplateStore(bucket, region=region)
+        return store
@@ -0,0 +1,85 @@
+#
+# Precomputed target deviceSettings, per profile and instance type
+#
+# Every edge created under a profile starts from the deviceSettings the profile
+# hands down, so the iface_map transform and the config_patch diff give the same
+# target data and the same changes for every edge of one instance type. They are
+# computed for the first edge only: the entry keeps the data it was computed
+# from (the config version) next to the updateConfigurationModule params built by
+# config_patch.module_update_params, and later edges whose fetched module carries
+# that same data reuse the params, with their own module id as the only per-edge
+# override. No deepcopy, transform or diff runs on a hit.
+#
+# An edge whose fetched data differs (the profile was edited, or the edge has its
+# own overrides) is a miss: the target is recomputed and replaces the entry, which
+# counts as stale. invalidate() drops the entries of a profile, or all of them.
+
+import threading
+from copy import deepcopy
+
+from . import config_patch
+from . import iface_map
+
+
+class DeviceSettingsCache(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+
+    def _compute(self, module, instance_type):
+        target = deepcopy(module['data'])
+        iface_map.transform_for_instance(instance_type).apply(target)
+        return config_patch.module_update_params(module['id'], module['data'], target,
+                                                 module.get('name', 'deviceSettings'))
+
+    def update_params(self, module, instance_type, profile_id=None):
+        # (params or None, changes) of the updateConfigurationModule call for this edge module
+        key = (profile_id, instance_type)
+        data = module['data']
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and entry['source'] == data:
+            with self.lock:
+                self.hits += 1
+        else:
+            params, changes = self._compute(module, instance_type)
+            # source is kept as fetched, nothing below mutates it or the shared target data
+            entry = {'source': data, 'params': params, 'changes': changes}
+            with self.lock:
+                self.misses += 1
+                if key in self.entries:
+                    self.stale += 1
+                self.entries[key] = entry
+        if entry['params'] is None:
+            return None, entry['changes']
+        return dict(entry['params'], id=module['id']), entry['changes']
+
+    def invalidate(self, profile_id=None):
+        with self.lock:
+            if profile_id is None:
+                self.entries.clear()
+            else:
+                for key in [k for k in self.entries if k[0] == profile_id]:
+                    del self.entries[key]
+
+    def reset(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.stale = 0
+
+    def summary(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses, 'stale': self.stale}
+
+    def print_summary(self):
+        s = self.summary()
+        if s['hits'] or s['misses']:
+            print('deviceSettings cache: %(hits)d hits, %(misses)d misses (%(stale)d stale), %(entries)d entries' % s)
+
+
+#### process wide cache used by change_edge_config and the bulk configure step
+settings_cache = DeviceSettingsCache()
@@ -0,0 +1,125 @@
+#
+# Fleet teardown: delete the edge stacks and the VCO edges of a selection
+#
+# A selection is an edge name prefix, a stack name prefix or a journal run id.
+# Prefixes are resolved with the single edge list / stack listing of reconcile.py,
+# a run id straight from the journal without any listing call. Stacks and edges
+# are deleted by two worker pools running side by side, each bounded by the
+# concurrency, then one StackWatcher waits for the stack deletes, polling each
+# region with batched describe calls.
+#
+# A failed delete only fails that stack or edge, the rest carries on and the run
+# exits non-zero. Rerunning the same teardown retries what is left: stacks and
+# edges that are already gone count as deleted.
+
+from concurrent.futures import ThreadPoolExecutor
+
+from . import aws
+from . import fleet
+from . import vco
+from .cf_watch import StackWatcher
+from .reconcile import fetch_all
+
+DELETE_TIMEOUT = 3600
+COLUMNS = ('kind', 'name', 'edge_id', 'region', 'stack_name', 'status', 'result', 'seconds', 'error')
+
+
+######## SELECTION
+def select_by_prefix(eid, regions, prefix=None, stack_prefix=None):
+    # returns (edges, stacks): [{name, edge_id}], [{name, region, stack_name}]
+    edges, stacks = fetch_all(eid, regions)
+    if stack_prefix:
+        stacks = [s for s in stacks if s['stack_name'].startswith(stack_prefix)]
+        owners = set(s['edge'] for s in stacks)
+        edges = [e for e in edges if e['name'] in owners]
+    else:
+        stacks = [s for s in stacks if s['edge'] and s['edge'].startswith(prefix)]
+        edges = [e for e in edges if e['name'].startswith(prefix)]
+    return ([{'name': e['name'], 'edge_id': e['id']} for e in edges],
+            [{'name': s['edge'] or s['stack_name'], 'region': s['region'], 'stack_name': s['stack_name']}
+             for s in stacks])
+
+
+def select_by_run(journal, run_id):
+    edges, stacks = [], []
+    for name, outputs in sorted(journal.edges(run_id).items()):
+        if outputs.get('edge_id'):
+            edges.append({'name': name, 'edge_id': outputs['edge_id']})
+        if outputs.get('stack_name'):
+            stacks.append({'name': name, 'region': outputs['region'], 'stack_name': outputs['stack_name']})
+    return edges, stacks
+
+
+######## DELETE
+def _delete_stack(item):
+    aws.delete_aws_cf_stack(item['stack_name'], item['region'])
+    return {'result': 'DELETE_IN_PROGRESS'}
+
+
+def _delete_edge(eid):
+    def worker(item):
+        existed = vco.delete_velo_edge(eid, item['edge_id'])
+        return {'result': 'deleted' if existed else 'not found'}
+    return worker
+
+
+def _wait_deleted(results, timeout):
+    watcher = StackWatcher()
+    pending = [r for r in results if r['status'] == 'ok']
+    for r in pending:
+        watcher.watch(r['region'], r['stack_name'], 'DELETE_IN_PROGRESS')
+    try:
+        watcher.wait(timeout)
+    except RuntimeError as e:
+        # timed out, whatever is still in progress is reported as failed below
+        print(e)
+    for r in pending:
+        r['result'] = watcher.status[(r['region'], r['stack_name'])]
+        if r['result'] != 'DELETE_COMPLETE':
+            r['status'] = 'failed'
+            r['error'] = 'stack delete ended in ' + r['result']
+
+
+def delete_selection(eid, edges, stacks, concurrency=fleet.DEFAULT_CONCURRENCY, timeout=DELETE_TIMEOUT):
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        stack_results = pool.submit(fleet.run_fleet, stacks, _delete_stack, concurrency)
+        edge_results = pool.submit(fleet.run_fleet, edges, _delete_edge(eid), concurrency)
+        stack_results, edge_results = stack_results.result(), edge_results.result()
+    # failed rows only carry the name, give every row the columns of what it deleted
+    for kind, items, results in (('stack', stacks, stack_results), ('edge', edges, edge_results)):
+        for item, r in zip(items, results):
+            r.update(item, kind=kind)
+    if stack_results:
+        _wait_deleted(stack_results, timeout)
+    return stack_results + edge_results
+
+
+def run_teardown(regions, prefix=None, stack_prefix=None, journal=None, run_id=None, yes=False,
+                 concurrency=fleet.DEFAULT_CONCURRENCY):
+    eid = vco.find_velo_enterpriseId()
+    if run_id:
+        edges, stacks = select_by_run(journal, run_id)
+        selector = 'run ' + run_id
+    else:
+        edges, stacks = select_by_prefix(eid, regions, prefix, stack_prefix)
+        selector = 'stack prefix ' + stack_prefix if stack_prefix else 'edge prefix ' + prefix
+    print('%s selects %d stacks and %d edges' % (selector, len(stacks), len(edges)))
+    if not edges and not stacks:
+        return []
+    if not yes:
+        fleet.print_table([dict(s, kind='stack') for s in stacks] + [dict(e, kind='edge') for e in edges],
+                          ('kind', 'name', 'edge_id', 'region', 'stack_name'))
+        print('rerun with --yes to delete them')
+        return []
+    results = delete_selection(eid, edges, stacks, concurrency)
+    fleet.print_table(results, COLUMNS)
+    failed = [r for r in results if r['status'] != 'ok']
+    if run_id:
+        # an edge leaves the journal once its edge and stack are both gone, a rerun then provisions it anew
+        failed_names = set(r['name'] for r in failed)
+        for name in set(r['name'] for r in results) - failed_names:
+            journal.forget(run_id, name)
+    print('%d/%d deletes done' % (len(results) - len(failed), len(results)))
+    if failed:
+        raise SystemExit('%d deletes failed, rerun the teardown to retry them' % len(failed))
+    return results
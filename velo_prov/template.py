@@ -0,0 +1,357 @@
+#
+# AWS CloudFormation template of the virtual edge
+#
+# Modified green field template, built on first use and kept for the run. Every
+# edge gets its own deep copy (render_cf_template) when the values are baked in,
+# or shares the unmodified template with per-stack parameters (edge_stack_parameters).
+
+from copy import deepcopy
+
+from . import ami_index
+from . import config
+from . import iface_map
+
+_velocf = None
+
+
+### modified AWS Cloud Formation GREEN  FIELD TEMPLATE
+def _build_velocf():
+    index = ami_index.load()
+    return {
+     "AWSTemplateFormatVersion": "2010-09-09",
+     "Mappings" : {
+        "RegionMap" : index.region_map() ### AMI per region and version, data/ami_index.json
+      },
+     "Parameters": {
+        "SoftwareVersion": {
+          "Description": "VeloCloud Virtual Edge Software Version",
+          "Type": "String",
+          "Default": index.default_version,
+          "AllowedValues": list(index.versions),
+          "ConstraintDescription": "Must be one of the following: " + ", ".join(index.versions)
+        },
+        "EC2InstanceType": {
+          "Description": "Throughput and number of NICs dictate instance type",
+          "Type": "String",
+          "Default": config.DefaultInstanceType,
+          "AllowedValues": [
+            "c4.large", "c4.xlarge", "c4.2xlarge", "c4.4xlarge",
+            "c5.large", "c5.xlarge", "c5.2xlarge", "c5.4xlarge"
+          ]
+        },
+        "ResourcePrefix" : {
+         "Description" : "Prefix used for naming all resources created by this template",
+         "Type" : "String",
+         "Default" : "velocloud"
+        },
+        "AvailabilityZone" : {
+          "Description" : "Availability zone to deploy in",
+          "Type" : "String",
+          "Default" : config.region ### CHANGE AS NEEDED
+        },
+        "VeloCloudEdgeName" : {
+          "Description" : "Name of Edge to be deployed",
+          "Type" : "String",
+          "Default" : "VVCE"
+       },
+       "ActivationKey" : {
+         "Description" : "Edge Activation Key",
+         "Type" : "String",
+         "AllowedPattern": "^[A-Z0-9-]+$",
+         "Default" : "AAAA-BBBB-CCCC-DDDD"
+       },
+       "IgnoreCertificateValidation" : {
+         "Description" : "Set to true if using private or self signed certificate on the VCO",
+         "Type" : "String",
+         "Default" : "false",
+         "AllowedValues" : ["true", "false"]
+       },
+       "VCO" : {
+         "Description" : "Orchestrator IP address or hostname (fqdn)",
+         "Type" : "String",
+         "Default" : "vco58-usvi1.velocloud.net"
+       },
+       "VpcCidrBlockValue" : {
+         "Description" : "CIDR block for the VPC",
+         "Type" : "String",
+         "Default" : "10.1.0.0/16"
+       },
+       "PrivateCidrBlockValue" : {
+         "Description" : "CIDR block for the LAN side of the Edge",
+         "Type" : "String",
+         "Default" : "10.1.1.0/24"
+       },
+       "PublicCidrBlockValue" : {
+         "Description" : "CIDR block for the WAN side of the Edge",
+         "Type" : "String",
+         "Default" : "10.1.0.0/24"
+       },
+       "VeloCloudKeyPairName" : {
+         "Description" : "Public/Private Key Name of Edge to be deployed",
+         "Type" : "AWS::EC2::KeyPair::KeyName",
+         "Default" : "AWS-VIRG-KEY"
+       }
+     },
+     "Resources": {
+       "VelocloudVPC": {
+         "Type": "AWS::EC2::VPC",
+         "Properties": {
+           "CidrBlock": { "Ref": "VpcCidrBlockValue" },
+           "Tags": [ { "Key": "Name", "Value": { "Fn::Join": [ "-", [ { "Ref" : "ResourcePrefix" }, "VPC"] ] } } ]
+         }
+       },
+       "PublicCidrBlock": {
+         "Type": "AWS::EC2::Subnet",
+         "Properties": {
+           "CidrBlock": { "Ref": "PublicCidrBlockValue" },
+           "AvailabilityZone": { "Ref": "AvailabilityZone" },
+           "VpcId": { "Ref": "VelocloudVPC" },
+           "Tags": [ { "Key": "Name", "Value": { "Fn::Join": [ "-", [ { "Ref" : "ResourcePrefix" }, "Public-SN"] ] } } ]
+         }
+       },
+       "PrivateCidrBlock": {
+         "Type": "AWS::EC2::Subnet",
+         "Properties": {
+           "CidrBlock": { "Ref": "PrivateCidrBlockValue" },
+           "AvailabilityZone": { "Ref": "AvailabilityZone" },
+           "VpcId": { "Ref": "VelocloudVPC" },
+           "Tags": [ { "Key": "Name", "Value": { "Fn::Join": [ "-", [ { "Ref" : "ResourcePrefix" }, "Private-SN"] ] } } ]
+         }
+       },
+       "InternetGateway": {
+         "Type": "AWS::EC2::InternetGateway",
+         "Properties": {
+           "Tags": [ { "Key": "Name", "Value": { "Fn::Join": [ "-", [ { "Ref" : "ResourcePrefix" }, "IGW"] ] } } ]
+         }
+       },
+       "PrivateRouteTable": {
+         "Type": "AWS::EC2::RouteTable",
+         "Properties": {
+           "VpcId": { "Ref": "VelocloudVPC" },
+           "Tags": [ { "Key": "Name", "Value": { "Fn::Join": [ "-", [ { "Ref" : "ResourcePrefix" }, "Private-RT"] ] } } ]
+         }
+       },
+       "PublicRouteTable": {
+         "Type": "AWS::EC2::RouteTable",
+         "Properties": {
+           "VpcId": { "Ref": "VelocloudVPC" },
+           "Tags": [ { "Key": "Name", "Value": { "Fn::Join": [ "-", [ { "Ref" : "ResourcePrefix" }, "Public-RT"] ] } } ]
+         }
+       },
+       "PublicIpAddress": {
+         "Type": "AWS::EC2::EIP",
+         "DependsOn": [ "VpcGatewayAttachment" ],
+         "Properties": {
+          "Domain": "vpc"
+         }
+       },
+       "VceInterfaceGe1": {
+         "Type": "AWS::EC2::NetworkInterface",
+         "Properties": {
+           "Description": "Management Interface",
+           "SourceDestCheck": "false",
+           "SubnetId": { "Ref": "PublicCidrBlock" },
+           "GroupSet": [ { "Ref": "VelocloudWANSecurityGroup" } ]
+         }
+       },
+       "VceInterfaceGe2": {
+         "Type": "AWS::EC2::NetworkInterface",
+         "Properties": {
+           "Description": "WAN Interface",
+           "SourceDestCheck": "false",
+           "SubnetId": { "Ref": "PublicCidrBlock" },
+           "GroupSet": [ { "Ref": "VelocloudWANSecurityGroup" } ]
+         }
+       },
+       "VceInterfaceGe3": {
+         "Type": "AWS::EC2::NetworkInterface",
+         "Properties": {
+           "Description": "LAN Interface",
+           "SourceDestCheck": "false",
+           "SubnetId": { "Ref": "PrivateCidrBlock" },
+           "GroupSet": [ { "Ref": "VelocloudLANSecurityGroup" } ]
+         }
+       },
+       "VeloCloudEdge": {
+         "Type": "AWS::EC2::Instance",
+         "Properties": {
+           "ImageId": { "Fn::FindInMap" : [ "RegionMap", { "Ref" : "AWS::Region" }, { "Ref": "SoftwareVersion" }] },
+           "InstanceType": { "Ref" : "EC2InstanceType" },
+           "KeyName": {"Ref": "VeloCloudKeyPairName"},
+           "Tags": [
+             { "Key": "Name", "Value": { "Ref" : "VeloCloudEdgeName" } },
+             { "Key": "Owner", "Value": "Generated with VeloClouds Greenfield CloudFormation Template" }
+           ],
+           "UserData" : { "Fn::Base64" : { "Fn::Join" : ["", [
+             "#cloud-config\n",
+             "velocloud:\n",
+             "  vce:\n",
+             "    vco: ", { "Ref": "VCO" }, "\n",
+             "    activation_code: ", { "Ref": "ActivationKey" }, "\n",
+             "    vco_ignore_cert_errors: ", { "Ref": "IgnoreCertificateValidation" }, "\n"
+           ]]}},
+           "NetworkInterfaces": [
+             {
+               "DeleteOnTermination": "false",
+               "NetworkInterfaceId":  { "Ref": "VceInterfaceGe1"},
+               "DeviceIndex": 0
+             },
+             {
+               "DeleteOnTermination": "false",
+               "NetworkInterfaceId":  { "Ref": "VceInterfaceGe2"},
+               "DeviceIndex": 1
+             },
+             {
+               "DeleteOnTermination": "false",
+               "NetworkInterfaceId":  { "Ref": "VceInterfaceGe3"},
+               "DeviceIndex": 2
+             }
+           ]
+         }
+       },
+       "VpcGatewayAttachment": {
+         "Type": "AWS::EC2::VPCGatewayAttachment",
+         "Properties": {
+           "VpcId": { "Ref": "VelocloudVPC" },
+           "InternetGatewayId": { "Ref": "InternetGateway" }
+         },
+         "DependsOn": [ "InternetGateway" ]
+       },
+       "PublicRouteTableAssociation": {
+         "Type": "AWS::EC2::SubnetRouteTableAssociation",
+         "Properties": {
+           "RouteTableId": { "Ref": "PublicRouteTable" },
+           "SubnetId": { "Ref": "PublicCidrBlock" }
+         }
+       },
+       "PrivateRouteTableAssociation": {
+         "Type": "AWS::EC2::SubnetRouteTableAssociation",
+         "Properties": {
+           "RouteTableId": { "Ref": "PrivateRouteTable" },
+           "SubnetId": { "Ref": "PrivateCidrBlock" }
+         }
+       },
+       "PublicDefaultRoute": {
+         "Type": "AWS::EC2::Route",
+         "Properties": {
+           "DestinationCidrBlock": "0.0.0.0/0",
+           "RouteTableId": { "Ref": "PublicRouteTable" },
+           "GatewayId": { "Ref": "InternetGateway" }
+         },
+         "DependsOn": [ "InternetGateway", "VpcGatewayAttachment", "PublicRouteTable" ]
+       },
+       "PrivateDefaultRoute": {
+         "Type": "AWS::EC2::Route",
+         "Properties": {
+           "DestinationCidrBlock": "0.0.0.0/0",
+           "RouteTableId": { "Ref": "PrivateRouteTable" },
+           "NetworkInterfaceId": { "Ref": "VceInterfaceGe3" }
+         },
+         "DependsOn": [ "VceInterfaceGe3", "PrivateRouteTable" ]
+       },
+       "ElasticIpAssociation": {
+         "Type": "AWS::EC2::EIPAssociation",
+         "Properties": {
+           "AllocationId": { "Fn::GetAtt": ["PublicIpAddress", "AllocationId"] },
+           "NetworkInterfaceId": { "Ref": "VceInterfaceGe2" }
+         }
+       },
+       "VelocloudWANSecurityGroup": {
+         "Type": "AWS::EC2::SecurityGroup",
+         "Properties": {
+           "GroupDescription": "WAN Facing Security Group",
+           "VpcId": { "Ref": "VelocloudVPC" },
+           "Tags": [ { "Key": "Name", "Value": { "Fn::Join": [ "-", [ { "Ref" : "ResourcePrefix" }, "WAN-SG"] ] } } ]
+         }
+       },
+       "AllowSNMP": {
+         "Type": "AWS::EC2::SecurityGroupIngress",
+         "Properties": {
+           "GroupId": { "Ref": "VelocloudWANSecurityGroup" },
+           "IpProtocol": "udp",
+           "FromPort": "161",
+           "ToPort": "161",
+           "CidrIp": "0.0.0.0/0"
+         }
+       },
+       "AllowSSH": {
+         "Type": "AWS::EC2::SecurityGroupIngress",
+         "Properties": {
+           "GroupId": { "Ref": "VelocloudWANSecurityGroup" },
+           "IpProtocol": "tcp",
+           "FromPort": "22",
+           "ToPort": "22",
+           "CidrIp": "0.0.0.0/0"
+         }
+       },
+       "AllowVCMP": {
+         "Type": "AWS::EC2::SecurityGroupIngress",
+         "Properties": {
+           "GroupId": { "Ref": "VelocloudWANSecurityGroup" },
+           "IpProtocol": "udp",
+           "FromPort": "2426",
+           "ToPort": "2426",
+           "CidrIp": "0.0.0.0/0"
+         }
+       },
+       "VelocloudLANSecurityGroup": {
+         "Type": "AWS::EC2::SecurityGroup",
+         "Properties": {
+           "GroupDescription": "LAN Facing Security Group - WARNING: Default is Allow ALL, adjust accordingly your security needs",
+           "VpcId": { "Ref": "VelocloudVPC" },
+           "Tags": [ { "Key": "Name", "Value": { "Fn::Join": [ "-", [ { "Ref" : "ResourcePrefix" }, "LAN-SG"] ] } } ]
+         }
+       },
+       "AllowLANTraffic": {
+         "Type": "AWS::EC2::SecurityGroupIngress",
+         "Properties": {
+           "GroupId": { "Ref": "VelocloudLANSecurityGroup" },
+           "IpProtocol": "-1",
+           "FromPort": "-1",
+           "ToPort": "-1",
+           "CidrIp": "0.0.0.0/0"
+         }
+       }
+     },
+     "Description": "VMware SD-WAN by VeloCloud CloudFormation Template (2021) - modified by vfrancadesou@vmware.com"
+    }
+
+
+def velocf():
+    global _velocf
+    if _velocf is None:
+        _velocf = _build_velocf()
+    return _velocf
+
+
+#### Build a per-edge copy of the cf template so concurrent workers never share velocf
+def render_cf_template(edgename,activationkey,keyname,az,instance_type=None,software_version=None):
+	data = deepcopy(velocf())
+	data['Parameters']['ActivationKey']['Default'] = activationkey
+	data['Parameters']['VeloCloudKeyPairName']['Default']=keyname
+	data['Parameters']['VCO']['Default']=config.vco_settings()['fqdn']
+	data['Parameters']['VeloCloudEdgeName']['Default']=edgename
+	data['Parameters']['AvailabilityZone']['Default']=az
+	data['Parameters']['EC2InstanceType']['Default']=instance_type or config.DefaultInstanceType
+	if software_version:
+		data['Parameters']['SoftwareVersion']['Default']=str(software_version)
+	return data
+
+#### Per-edge values passed as create_stack Parameters instead of being baked into the template
+def edge_stack_parameters(edgename,activationkey,keyname,az,instance_type=None,software_version=None):
+	parameters = {'ActivationKey': activationkey, 'VeloCloudKeyPairName': keyname, 'VCO': config.vco_settings()['fqdn'],
+		'VeloCloudEdgeName': edgename, 'AvailabilityZone': az,
+		'EC2InstanceType': instance_type or config.DefaultInstanceType}
+	if software_version:
+		parameters['SoftwareVersion'] = str(software_version)
+	return parameters
+
+#### Launch target check against the AMI index and the template's instance types, no api call involved
+def validate_target(region,az,version=None,instance_type=None):
+	errors = ami_index.load().check(region,az,version)
+	instance_type = instance_type or config.DefaultInstanceType
+	if instance_type not in velocf()['Parameters']['EC2InstanceType']['AllowedValues']:
+		errors.append('instance type %s is not supported by the edge template' %(instance_type))
+	elif instance_type not in iface_map.INSTANCE_LAYOUTS:
+		errors.append('instance type %s has no interface layout' %(instance_type))
+	return errors
@@ -0,0 +1,173 @@
+#
+# VCO side of the provisioning: enterprise, profile, edge and device settings
+#
+# The http client (requests) and the metadata cache are created on first use,
+# so importing this module neither reads the environment nor loads requests.
+
+import sys
+
+from . import config
+from . import config_patch
+from . import json_stream
+from .settings_cache import settings_cache
+from .vco_cache import VcoMetadataCache
+
+_client = None
+_meta_cache = None
+
+
+def client():
+    """Shared keep-alive session, timeouts and retries for every VCO call."""
+    global _client
+    if _client is None:
+        from .vco_client import VcoClient
+        _client = VcoClient(config.vco_settings()['token'])
+    return _client
+
+
+def metadata_cache():
+    """Enterprise id and profile name index, cached on disk between runs."""
+    global _meta_cache
+    if _meta_cache is None:
+        settings = config.vco_settings()
+        _meta_cache = VcoMetadataCache(settings['fqdn'], settings['token'])
+    return _meta_cache
+
+
+def set_metadata_cache(cache):
+    global _meta_cache
+    _meta_cache = cache
+
+
+########
+######## VCO FUNCTIONS
+#######
+
+#### RETRIEVE ENTERPRISE ID for this user
+def find_velo_enterpriseId():
+	#Fetch enterprise id convert to JSON
+	meta_cache=metadata_cache()
+	eid=meta_cache.enterprise_id()
+	if eid is not None:
+		print('Enterprise Id = %d (cached)'%(eid))
+		return eid
+	try:
+         enterprise = client().post(config.endpoint(config.get_enterprise), idempotent=True)
+
+	except Exception as e:
+	   print('Error while retrivieng Enterprise')
+	   print(e)
+	   sys.exit()
+	ent_j = enterprise.json()
+	eid=ent_j['id']
+	meta_cache.set_enterprise_id(eid)
+	print('Enterprise Id = %d'%(eid))
+	return eid
+
+#### CREATE NEW VMWARE SD-WAN CONFIGURATION PROFILE
+
+def create_velo_profile(eid,ProfileName):
+ pid=0
+ meta_cache=metadata_cache()
+ VCO_FQDN=config.vco_settings()['fqdn']
+### Confirm existing profile names, if "AWS-PROFILE" not found, create a new profile
+ cached_pid = meta_cache.profile_id(ProfileName)
+ if cached_pid is not None:
+     print ('Profile named '+ProfileName+' already found on VCO '+VCO_FQDN+' with Profile id: '+str(cached_pid)+' (cached)')
+     return cached_pid
+ params = {	}
+ try:
+         profile = client().post(config.endpoint(config.get_profiles), params, stream=True, idempotent=True)
+         ### only id / name of each profile are kept, the list is parsed one profile at a time
+         prof_pairs = json_stream.id_name_pairs(profile)
+ except Exception as e:
+	   print('error getting profiles')
+	   print(e)
+	   sys.exit()
+ found_pid = meta_cache.set_profiles(prof_pairs).get(ProfileName.lower())
+ if found_pid is not None:
+     print('found')
+     print ('Profile named '+ProfileName+' already found on VCO '+VCO_FQDN+' with Profile id: '+str(found_pid))
+     return found_pid
+
+ if(pid==0):
+		#Provision new Profile and grab its id
+		 params = {"id" : eid,"name":ProfileName}
+		 print('Profile not found, creating new one')
+		 profile_resp = client().post(config.endpoint(config.create_profile), params)
+		 prof_dict=profile_resp.json()
+
+		 pid = prof_dict['id']
+		 # profile list changed on the VCO, next lookup has to refetch it
+		 meta_cache.invalidate_profiles()
+		 settings_cache.invalidate(pid)
+		 print('New Profile named '+ProfileName+' created with Id = %d'%(pid))
+		 return pid
+
+#### PROVISION NEW VMWARE SD-WAN EDGE
+def provision_velo_edge(eid,pid,EdgeName,site):
+	#### Provision new virtual edge in the AWS Profile
+	#Provision new Profile and grab its id
+	rEdgeName=EdgeName
+	params = {'id' : eid,'name':rEdgeName,'modelNumber': 'virtual','configurationId': pid,'site': site}
+	try:
+		edid = client().post(config.endpoint(config.edge_prov), params)
+		edid_j = edid.json()
+		edid=edid_j['id']
+		activationkey=edid_j['activationKey']
+		print('New Edge named '+rEdgeName+' created with Id '+str(edid)+' and activation key '+activationkey)
+		return [edid,activationkey]
+
+	except Exception as e:
+	     print(e)
+	     sys.exit()
+
+#### EDGES ALREADY ON THE VCO by name, one paged listing; lets a rerun adopt an edge whose provision was never journaled
+def existing_velo_edges(eid):
+	from .reconcile import fetch_edges
+	return dict((e['name'],e) for e in fetch_edges(eid))
+
+#### ADOPT AN EDGE PROVISIONED BY AN INTERRUPTED RUN, with the activation key the VCO lists for it
+def adopt_velo_edge(eid,edge):
+	if edge['edgeState'] != 'NEVER_ACTIVATED':
+		raise RuntimeError('edge '+edge['name']+' already exists on the VCO with Id '+str(edge['id'])+' ('+str(edge['edgeState'])+'), not provisioning it again')
+	if not edge.get('activationKey'):
+		raise RuntimeError('edge '+edge['name']+' already exists on the VCO with Id '+str(edge['id'])+' but no activation key is listed for it')
+	print('Edge named '+edge['name']+' already on the VCO with Id '+str(edge['id'])+', adopted with activation key '+str(edge['activationKey']))
+	return [edge['id'],edge['activationKey']]
+
+def change_edge_config(eid,edid,instance_type=None,profile_id=None):
+    ### Grab Edge Device Settings
+    params = {'edgeId': edid}
+    respj = client().post(config.endpoint(config.get_edgeconfig), params, stream=True, idempotent=True)
+    ### only the edge's own deviceSettings module is parsed out of the (large) configuration stack
+    moduleId,params3,changes = device_settings_update(json_stream.edge_module(respj,'deviceSettings'),instance_type,profile_id)
+    if params3 is None:
+        print('Devices Settings already match the AWS deployment, no update needed')
+        return moduleId
+    resp = client().post(config.endpoint(config.update_edgeconfig), params3, idempotent=True)
+    respo_j=resp.json()
+    print('Devices Settings updated ('+config_patch.describe(changes, 5)+') - these are needed for AWS deployment')
+    return moduleId
+
+#### deviceSettings update from the edge specific deviceSettings module: (moduleId, params or None, changes)
+def device_settings_update(edgeSpecificProfileDeviceSettings,instance_type=None,profile_id=None):
+    moduleId = edgeSpecificProfileDeviceSettings['id']
+    ### VLAN1 address and GE1/GE2/GE3 roles for the NIC layout of the instance type (iface_map.py), computed once
+    ### per profile and instance type (settings_cache.py); skipped when nothing differs, and the VCO is not asked
+    ### to echo the whole module back
+    params3,changes = settings_cache.update_params(edgeSpecificProfileDeviceSettings, instance_type or config.DefaultInstanceType, profile_id)
+    return moduleId,params3,changes
+
+#### DELETE A VMWARE SD-WAN EDGE, True when it existed
+def delete_velo_edge(eid,edid):
+    params = {'enterpriseId': eid, 'id': edid}
+    resp = client().post(config.endpoint(config.delete_edge), params, idempotent=True)
+    resp_j = resp.json()
+    ### one {id, rows, error} entry per deleted id, or a plain rpc error
+    if isinstance(resp_j, dict):
+        raise RuntimeError('deleteEdge %s failed: %s' % (edid, resp_j.get('error', {}).get('message', resp.status_code)))
+    row = resp_j[0] if resp_j else {}
+    if row.get('error'):
+        raise RuntimeError('deleteEdge %s failed: %s' % (edid, row['error']))
+    return bool(row.get('rows'))
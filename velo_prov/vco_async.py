@@ -0,0 +1,117 @@
+#
+# asyncio variant of the VCO rest calls used by the provisioning code
+#
+# Built on aiohttp. A single semaphore bounds the number of in-flight requests,
+# so one process can drive thousands of edge provisioning / config operations
+# without one thread per request. Same retry policy as vco_client.VcoClient: the
+# create calls are only retried on 429 and when the connection could not be opened.
+
+import asyncio
+import json
+import random
+
+from .vco_client import RETRY_STATUS
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+class VcoApiError(Exception):
+    pass
+
+
+class AsyncVcoClient(object):
+
+    def __init__(self, vco_url, token, concurrency=100, timeout=60, retries=4, backoff=0.5, max_backoff=20.0):
+        if aiohttp is None:
+            raise SystemExit('aiohttp is required for the asyncio VCO client (pip install aiohttp)')
+        self.vco_url = vco_url
+        self.token = token
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = None
+        self._sem = None
+
+    async def __aenter__(self):
+        # the semaphore has to be created inside the running loop
+        self._sem = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(
+            connector=connector, timeout=aiohttp.ClientTimeout(total=self.timeout),
+            headers={"Content-Type": "application/json", "Authorization": self.token})
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def call(self, method, params=None, idempotent=False):
+        data = json.dumps(params) if params is not None else ''
+        url = self.vco_url + method
+        attempt = 0
+        while True:
+            async with self._sem:
+                try:
+                    async with self.session.post(url, data=data) as resp:
+                        status = resp.status
+                        body = await resp.json(content_type=None)
+                    error = 'HTTP %d' % status
+                except aiohttp.ClientConnectionError as e:
+                    if not (idempotent or isinstance(e, aiohttp.ClientConnectorError)):
+                        raise VcoApiError('%s: %s' % (method, str(e) or e.__class__.__name__))
+                    status, body, error = None, None, str(e) or e.__class__.__name__
+            if status is not None and status != 429 and not (idempotent and status in RETRY_STATUS):
+                if status >= 400 or (isinstance(body, dict) and 'error' in body):
+                    raise VcoApiError('%s: %s' % (method, (body or {}).get('error', error)))
+                return body
+            if attempt >= self.retries:
+                raise VcoApiError('%s failed after %d attempts: %s' % (method, attempt + 1, error))
+            delay = min(self.backoff * (2 ** attempt), self.max_backoff)
+            # sleep outside the semaphore so a backing-off call does not hold a slot
+            await asyncio.sleep(delay / 2 + random.uniform(0, delay / 2))
+            attempt += 1
+
+    #### the VCO methods used by the provisioning script
+    async def get_enterprise(self):
+        return await self.call('enterprise/getEnterprise', idempotent=True)
+
+    async def get_profiles(self):
+        return await self.call('enterprise/getEnterpriseConfigurationsPolicies', {}, True)
+
+    async def clone_enterprise_template(self, eid, name):
+        return await self.call('configuration/cloneEnterpriseTemplate', {"id": eid, "name": name})
+
+    async def edge_provision(self, eid, pid, name, site):
+        return await self.call('edge/edgeProvision', {'id': eid, 'name': name, 'modelNumber': 'virtual',
+                                                      'configurationId': pid, 'site': site})
+
+    async def get_edge_config_stack(self, edid):
+        return await self.call('edge/getEdgeConfigurationStack', {'edgeId': edid}, True)
+
+    async def update_configuration_module(self, module_id, data, name='deviceSettings'):
+        return await self.call('configuration/updateConfigurationModule',
+                               {"id": module_id, "_update": {"data": data}, "name": name}, True)
+
+
+#### provision and reconfigure many edges, one coroutine per edge
+async def provision_edge(client, eid, pid, name, site, transform=None):
+    edge = await client.edge_provision(eid, pid, name, site)
+    result = {'name': name, 'edge_id': edge['id'], 'activation_key': edge['activationKey']}
+    if transform is not None:
+        stack = await client.get_edge_config_stack(edge['id'])
+        module = [m for m in stack[0]['modules'] if m['name'] == 'deviceSettings'][0]
+        await client.update_configuration_module(module['id'], transform(module['data']))
+        result['module_id'] = module['id']
+    return result
+
+
+async def provision_edges(client, eid, pid, names, site, transform=None):
+    # return_exceptions keeps one failed edge from cancelling the others
+    results = await asyncio.gather(*[provision_edge(client, eid, pid, n, site, transform) for n in names],
+                                   return_exceptions=True)
+    return [r if not isinstance(r, BaseException) else {'name': n, 'error': str(r)}
+            for n, r in zip(names, results)]
@@ -0,0 +1,158 @@
+#
+# Bulk VCO calls: the VCO steps of many edges in a few round trips
+#
+# Per edge the VCO side is three serialized calls (edgeProvision,
+# getEdgeConfigurationStack, updateConfigurationModule). Here each of them is
+# sent for all edges at once, as JSON-RPC 2.0 batches on the portal endpoint
+# (/portal/, batch_size calls per http request) when the VCO takes batches, or
+# else as parallel single calls on the shared keep-alive session of vco.client().
+# Batch support is probed once with a one-call getEnterprise batch. Fleet mode
+# only uses bulk calls with batches: without them, per-edge chains on the shared
+# session interleave the three methods and each method's rate limit bucket
+# (ratelimit.py), where a whole fleet of one method waits on a single bucket.
+#
+# The rate limiter (ratelimit.py) counts http requests: a batch takes one token
+# of its vco.<method>[batch] bucket however many calls it carries, so the VCO
+# method calls of a bulk run are not limited per call; --batch-size bounds them.
+#
+# Results come back in input order, one (result, error) pair per call, so an
+# error only fails its own edge. A rejected or failed http request fails every
+# call of its batch.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import config
+from . import vco
+
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_WORKERS = 16
+
+
+def _error_message(body, status):
+    if isinstance(body, dict) and body.get('error'):
+        error = body['error']
+        return error.get('message', str(error)) if isinstance(error, dict) else str(error)
+    return 'HTTP %d' % status
+
+
+class BulkVco(object):
+
+    def __init__(self, client=None, batch_size=DEFAULT_BATCH_SIZE, workers=DEFAULT_WORKERS, batch=None):
+        # batch None probes the VCO, True / False forces batches or parallel single calls
+        self.client = client
+        self.batch_size = batch_size
+        self.workers = workers
+        self.batch = batch
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    def _post(self, url, params, name=None, idempotent=False):
+        with self.lock:
+            self.requests += 1
+        return (self.client or vco.client()).post(url, params, name=name, idempotent=idempotent)
+
+    def supports_batch(self):
+        if self.batch is None:
+            try:
+                resp = self._post(config.portal_url(), [{'jsonrpc': '2.0', 'method': config.get_enterprise,
+                                                         'params': {}, 'id': 0}], 'vco.jsonrpc[probe]', True)
+                self.batch = resp.status_code == 200 and isinstance(resp.json(), list)
+            except Exception:
+                self.batch = False
+            print('VCO %s JSON-RPC batches' % ('takes' if self.batch else 'does not take'))
+        return self.batch
+
+    #### one http request per batch_size calls
+    def _batch(self, method, chunk):
+        # chunk is [(index, params)], the index doubles as the JSON-RPC id
+        body = [{'jsonrpc': '2.0', 'method': method, 'params': params, 'id': n} for n, params in chunk]
+        try:
+            # a batch of creates is not sent again on a 5xx, part of it may have been applied
+            resp = self._post(config.portal_url(), body, 'vco.%s[batch]' % method, method in config.idempotent_methods)
+            answers = resp.json()
+        except Exception as e:
+            return [(n, (None, str(e) or e.__class__.__name__)) for n, _ in chunk]
+        if resp.status_code != 200 or not isinstance(answers, list):
+            error = _error_message(answers, resp.status_code)
+            return [(n, (None, error)) for n, _ in chunk]
+        by_id = dict((a.get('id'), a) for a in answers if isinstance(a, dict))
+        results = []
+        for n, _ in chunk:
+            answer = by_id.get(n)
+            if answer is None:
+                results.append((n, (None, 'no answer in the batch')))
+            elif answer.get('error'):
+                results.append((n, (None, _error_message(answer, resp.status_code))))
+            else:
+                results.append((n, (answer.get('result'), None)))
+        return results
+
+    #### one rest call per item, in parallel on the pooled session
+    def _single(self, method, item):
+        n, params = item
+        try:
+            resp = self._post(config.endpoint(method), params, idempotent=method in config.idempotent_methods)
+            body = resp.json()
+        except Exception as e:
+            return n, (None, str(e) or e.__class__.__name__)
+        if resp.status_code >= 400 or (isinstance(body, dict) and body.get('error')):
+            return n, (None, _error_message(body, resp.status_code))
+        return n, (body, None)
+
+    def call_many(self, method, params_list):
+        # [(result, error)] in the order of params_list
+        items = list(enumerate(params_list))
+        if not items:
+            return []
+        if self.supports_batch():
+            chunks = [items[i:i + self.batch_size] for i in range(0, len(items), self.batch_size)]
+            work, fn = chunks, lambda chunk: self._batch(method, chunk)
+        else:
+            work, fn = items, lambda item: [self._single(method, item)]
+        results = [None] * len(items)
+        with ThreadPoolExecutor(max_workers=max(1, min(self.workers, len(work)))) as pool:
+            for answers in pool.map(fn, work):
+                for n, answer in answers:
+                    results[n] = answer
+        return results
+
+
+######## EDGE STEPS
+def provision_edges(bulk, eid, pid, edges):
+    # edgeProvision for every inventory edge: [({'edge_id', 'activation_key'}, error)]
+    params = [{'id': eid, 'name': e['name'], 'modelNumber': 'virtual', 'configurationId': pid,
+               'site': dict(config.site, contactName=e['contact_name'], contactEmail=e['contact_email'])}
+              for e in edges]
+    results = []
+    for result, error in bulk.call_many(config.edge_prov, params):
+        if error is None and not (isinstance(result, dict) and 'id' in result and 'activationKey' in result):
+            error = 'unexpected edgeProvision answer'
+        results.append(({'edge_id': result['id'], 'activation_key': result['activationKey']}, None)
+                       if error is None else (None, error))
+    return results
+
+
+def configure_edges(bulk, edge_ids, instance_types, profile_id=None):
+    # deviceSettings of every edge for its instance type: [({'module_id'}, error)]
+    stacks = bulk.call_many(config.get_edgeconfig, [{'edgeId': edid} for edid in edge_ids])
+    results = [None] * len(edge_ids)
+    updates = []
+    for n, (stack, error) in enumerate(stacks):
+        if error is not None:
+            results[n] = (None, 'getEdgeConfigurationStack: ' + error)
+            continue
+        try:
+            module = [m for m in stack[0]['modules'] if m['name'] == 'deviceSettings'][0]
+            module_id, params, _ = vco.device_settings_update(module, instance_types[n], profile_id)
+        except Exception as e:
+            results[n] = (None, 'deviceSettings: %s' % (str(e) or e.__class__.__name__))
+            continue
+        results[n] = ({'module_id': module_id}, None)
+        if params is not None:
+            updates.append((n, params))
+    answers = bulk.call_many(config.update_edgeconfig, [params for _, params in updates])
+    for (n, _), (_, error) in zip(updates, answers):
+        if error is not None:
+            results[n] = (None, 'updateConfigurationModule: ' + error)
+    return results
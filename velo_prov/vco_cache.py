@@ -0,0 +1,87 @@
+#
+# On-disk cache of VCO enterprise / profile metadata
+#
+# Saves the getEnterprise and getEnterpriseConfigurationsPolicies round-trips on
+# repeated and batched runs. Profiles are kept as a lowercase name -> id index.
+# Entries expire after a TTL, and the profile index is dropped whenever the
+# script clones a new profile. Only hits are trusted: a name that is not in the
+# index is always looked up on the VCO again, so a stale index can never cause
+# a duplicate profile to be created.
+#
+# The cache is keyed by VCO hostname and a hash of the api token (the token
+# itself is never written to disk), since the enterprise depends on the user.
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+DEFAULT_CACHE_FILE = os.path.join(os.path.expanduser('~'), '.velo-aws-prov-cache.json')
+DEFAULT_TTL = 3600
+
+
+class VcoMetadataCache(object):
+
+    def __init__(self, vco_host, token, path=DEFAULT_CACHE_FILE, ttl=DEFAULT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.key = vco_host + ':' + hashlib.sha256(token.encode()).hexdigest()[:16]
+        self.lock = threading.Lock()
+        self._all = self._load()
+        self.entry = self._all.setdefault(self.key, {})
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _fresh(self, name):
+        item = self.entry.get(name)
+        if item and time.time() - item['ts'] < self.ttl:
+            return item
+        return None
+
+    def save(self):
+        # write to a temp file and rename so concurrent runs never read a half written cache
+        with self.lock:
+            tmp = '%s.%d.tmp' % (self.path, os.getpid())
+            with open(tmp, 'w') as f:
+                json.dump(self._all, f)
+            os.replace(tmp, self.path)
+
+    def clear(self):
+        with self.lock:
+            self.entry.clear()
+        self.save()
+
+    #### enterprise id
+    def enterprise_id(self):
+        item = self._fresh('enterprise')
+        return item['id'] if item else None
+
+    def set_enterprise_id(self, eid):
+        with self.lock:
+            self.entry['enterprise'] = {'id': eid, 'ts': time.time()}
+        self.save()
+
+    #### profile name index
+    def profile_id(self, name):
+        item = self._fresh('profiles')
+        return item['by_name'].get(name.lower()) if item else None
+
+    def set_profiles(self, profiles):
+        by_name = {}
+        for p in profiles:
+            by_name.setdefault(p['name'].lower(), p['id'])
+        with self.lock:
+            self.entry['profiles'] = {'by_name': by_name, 'ts': time.time()}
+        self.save()
+        return by_name
+
+    def invalidate_profiles(self):
+        with self.lock:
+            self.entry.pop('profiles', None)
+        self.save()
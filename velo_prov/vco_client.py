@@ -0,0 +1,110 @@
+#
+# Pooled keep-alive client for the VCO rest api
+#
+# One requests.Session is shared by every call (and every fleet worker) so the
+# TCP+TLS handshake to the orchestrator is paid once per pooled connection instead
+# of once per api call. Every call gets a timeout and is retried with exponential
+# backoff on 429 answers and on connections that could not be opened. Only calls
+# marked idempotent (lookups, module updates, deletes) are also retried on 5xx
+# answers and dropped connections: a create (edgeProvision, cloneEnterpriseTemplate)
+# the VCO may already have applied is never sent twice. Every attempt goes through
+# the process wide rate limiter (ratelimit.py), which slows the endpoint down on
+# 429 answers.
+
+import json
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from .metrics import metrics
+from .ratelimit import limiter
+
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+
+def connect_error(e):
+    # the request never reached the VCO: refused, name resolution or connect timeout
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    reason = getattr(e.args[0], 'reason', None) if e.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class VcoClient(object):
+
+    def __init__(self, token, timeout=(5, 60), retries=4, backoff=0.5, max_backoff=20.0, pool_size=32):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json", "Authorization": token})
+        # pool_maxsize bounds the keep-alive connections kept per host, size it to the worker count
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _retry_after(self, resp):
+        if resp is not None and resp.headers.get('Retry-After', '').isdigit():
+            return min(float(resp.headers['Retry-After']), self.max_backoff)
+        return None
+
+    def _sleep_time(self, attempt, resp):
+        # honour Retry-After on throttled answers, otherwise exponential backoff with jitter
+        retry_after = self._retry_after(resp)
+        if retry_after is not None:
+            return retry_after
+        delay = min(self.backoff * (2 ** attempt), self.max_backoff)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def post(self, url, params=None, timeout=None, name=None, stream=False, idempotent=False):
+        # name is the metrics / rate limit endpoint, by default the rest method of the url;
+        # with stream the body is left unread for json_stream.py; idempotent calls are
+        # also retried on 5xx and after the request may have been sent
+        data = json.dumps(params, separators=(',', ':')) if params is not None else ''
+        name = name or 'vco.' + url.rsplit('/rest/', 1)[-1]
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            resp = None
+            limiter.acquire(name)
+            try:
+                resp = self.session.post(url, data=data, timeout=timeout or self.timeout, stream=stream)
+                if resp.status_code == 429:
+                    limiter.throttled(name, self._retry_after(resp))
+                elif resp.status_code < 500:
+                    limiter.succeeded(name)
+                if resp.status_code != 429 and not (idempotent and resp.status_code in RETRY_STATUS):
+                    self._observe(name, start, attempt, data, resp)
+                    return resp
+                error = 'HTTP %d' % resp.status_code
+            # read timeouts are never retried, the VCO may already have applied the change
+            except requests.ConnectionError as e:
+                if not (idempotent or connect_error(e)):
+                    self._observe(name, start, attempt, data, None)
+                    raise
+                error = str(e)
+            if attempt >= self.retries:
+                self._observe(name, start, attempt, data, resp)
+                if resp is not None:
+                    return resp
+                raise requests.ConnectionError('%s failed after %d attempts: %s' % (url, attempt + 1, error))
+            if resp is not None:
+                # an unread streamed body would keep its connection out of the pool
+                resp.close()
+            delay = self._sleep_time(attempt, resp)
+            print('VCO call %s failed (%s), retrying in %.1fs' % (name[4:], error, delay))
+            time.sleep(delay)
+            attempt += 1
+
+    def _observe(self, name, start, attempt, data, resp):
+        # whole call including retries and backoff, which is what a provisioning worker waits for
+        metrics.observe(name, time.monotonic() - start, retries=attempt, request_bytes=len(data),
+                        response_bytes=int(resp.headers.get('Content-Length') or 0) if resp is not None else 0,
+                        error=resp is None or resp.status_code >= 400)
+
+    def close(self):
+        self.session.close()